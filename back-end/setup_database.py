@@ -8,7 +8,7 @@ import sys
 # Add the src directory to the path so we can import our modules
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from database.config import init_database, reset_database
+from database.config import init_database, reset_database, vacuum_database
 from database.sample_data import load_sample_data, reset_and_load_sample_data
 
 def main():
@@ -20,9 +20,10 @@ def main():
         print("1. Initialize database (create tables)")
         print("2. Reset database and load sample data")
         print("3. Load sample data (preserve existing)")
-        print("4. Exit")
+        print("4. Compact database (VACUUM and rebuild search indexes)")
+        print("5. Exit")
         
-        choice = input("\nEnter your choice (1-4): ").strip()
+        choice = input("\nEnter your choice (1-5): ").strip()
         
         if choice == '1':
             print("\n🔧 Initializing database...")
@@ -42,11 +43,15 @@ def main():
             print(f"📊 Loaded: {stats}")
             
         elif choice == '4':
+            print("\n🧹 Compacting database...")
+            vacuum_database()
+            
+        elif choice == '5':
             print("\n👋 Goodbye!")
             break
             
         else:
-            print("\n❌ Invalid choice. Please select 1-4.")
+            print("\n❌ Invalid choice. Please select 1-5.")
 
 if __name__ == '__main__':
     main()
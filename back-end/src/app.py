@@ -1,21 +1,52 @@
-from flask import Flask, request, jsonify
+import time
+# Taken before the heavier imports, so the ready time printed at startup includes them
+STARTED_AT = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import uuid
 from datetime import datetime
 import json
+import os
+import threading
 
 # Import database layer
-from database.config import init_database
+from database.config import init_database, EFFECTIVE_PERMISSIONS_ENABLED, STARTUP_STATS_ENABLED
 from database.user_dal import UserDAL
 from database.resource_dal import ResourceDAL  
 from database.resource_group_dal import ResourceGroupDAL
 from database.user_group_dal import UserGroupDAL
-from database.relationship_dal import RelationshipDAL
+from database.relationship_dal import RelationshipDAL, RelationshipExistsError
+from database.matrix_dal import PermissionMatrixDAL
+from database.stats_dal import StatsDAL
+from database.search_dal import SearchDAL, SEARCH_KINDS
+from database.deletion_dal import DeletionDAL, DELETION_KINDS
+from database.effective_permission_dal import EffectivePermissionDAL
+from database.openfga_outbox import OpenFGAOutbox
+from database.cleanup_jobs import CleanupJobs
+from database.membership_reconciler import MembershipReconciler
+from database.permission_index import IMPLIED_RELATIONS
 from database.sample_data import load_sample_data
+from database.versions import VERSIONED_TABLES
+from openfga import metrics as openfga_metrics
+from openfga.resilience import OpenFGAUnavailableError, breaker as openfga_breaker
+from openfga.config import CONSISTENCY_MODES
+from http_cache import conditional
+from http_compression import compress_response
 
 app = Flask(__name__)
 CORS(app)
 
+# Seconds a computed /stats summary is served before being recomputed
+STATS_CACHE_TTL = float(os.environ.get('STATS_CACHE_TTL', 5))
+_stats_cache = {}
+_stats_cache_lock = threading.Lock()
+
+# Maximum number of records accepted by a bulk create request
+BULK_MAX_RECORDS = int(os.environ.get('BULK_MAX_RECORDS', 10000))
+
+RESOURCE_TYPES = ['document', 'project', 'organization', 'folder', 'file']
+
 # Helper function to generate UUID
 def generate_id():
     return str(uuid.uuid4())
@@ -28,59 +59,85 @@ def get_timestamp():
 def error_response(message, status_code=400):
     return jsonify({"error": message}), status_code
 
-# Helper function to create OpenFGA member relationships for user groups
-def create_member_relationships(group_id, user_ids):
-    """Create 'member' relationships for users in a group"""
-    created_relationships = []
-    
-    for user_id in user_ids:
-        # Check if relationship already exists
-        if not RelationshipDAL.relationship_exists(f"user:{user_id}", "member", f"group:{group_id}"):
-            relationship = RelationshipDAL.create(
-                f"user:{user_id}",
-                "member", 
-                f"group:{group_id}"
-            )
-            created_relationships.append(relationship)
-    
-    return created_relationships
-
-# Helper function to remove OpenFGA member relationships for user groups
-def remove_member_relationships(group_id, user_ids=None):
-    """Remove 'member' relationships for users in a group"""
-    if user_ids is None:
-        # Remove all member relationships for the group
-        return RelationshipDAL.delete_by_criteria(relation="member", object_ref=f"group:{group_id}")
-    else:
-        # Remove relationships for specific users
-        removed_count = 0
-        for user_id in user_ids:
-            removed_count += RelationshipDAL.delete_by_criteria(
-                user=f"user:{user_id}",
-                relation="member", 
-                object_ref=f"group:{group_id}"
-            )
-        return removed_count
-
-# Health check endpoint
+# Helper function to get the records of a bulk request, raising ValueError when the body is unusable
+def get_bulk_records(key):
+    data = request.get_json(silent=True)
+    records = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(records, list) or not records:
+        raise ValueError(f"A non-empty '{key}' list is required")
+    if len(records) > BULK_MAX_RECORDS:
+        raise ValueError(f"At most {BULK_MAX_RECORDS} {key} can be created per request")
+    return data, records
+
+# Helper function to build the summary of a bulk request
+def bulk_summary(key, created, errors):
+    return jsonify({
+        key: created,
+        "created": len(created),
+        "failed": len(errors),
+        "errors": sorted(errors, key=lambda error: error['index'])
+    }), 200
+
+# Helper function to parse limit/offset pagination query parameters
+def get_pagination_args(default_limit=100, max_limit=1000, prefix=''):
+    """Parse limit and offset query parameters, raising ValueError on invalid values"""
+    limit = int(request.args.get(f'{prefix}limit', default_limit))
+    offset = int(request.args.get(f'{prefix}offset', 0))
+    if limit < 1 or offset < 0:
+        raise ValueError("limit must be positive and offset must not be negative")
+    return min(limit, max_limit), offset
+
+def get_updated_since():
+    """Parse the updated_since query parameter (epoch milliseconds), raising ValueError on invalid values"""
+    updated_since = request.args.get('updated_since')
+    if updated_since is None:
+        return None
+    try:
+        return int(updated_since)
+    except ValueError:
+        raise ValueError("updated_since must be an integer timestamp in milliseconds since the epoch")
+
+# Compress large JSON bodies for clients that accept gzip or brotli
+@app.after_request
+def compress_large_responses(response):
+    return compress_response(response)
+
+# Return 503 rather than a misleading empty result or denial when OpenFGA cannot answer
+@app.errorhandler(OpenFGAUnavailableError)
+def handle_openfga_unavailable(error):
+    return error_response(f"OpenFGA is unavailable: {str(error)}", 503)
+
+# Health check endpoint (also used by the Docker health check)
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check and OpenFGA connection test"""
+    """Health check reporting the OpenFGA circuit breaker state"""
     return jsonify({
         "status": "success",
         "message": "Rebecca API is healthy",
-        "openfga_status": "connected",
+        "service": "rebecca-api",
+        "openfga_status": "unavailable" if openfga_breaker.state == 'open' else "connected",
+        "openfga_circuit": openfga_breaker.state,
         "timestamp": get_timestamp()
     }), 200
 
+# Prometheus metrics endpoint
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Expose OpenFGA client metrics in the Prometheus text format"""
+    return Response(openfga_metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # =============================================================================
 # USER ENDPOINTS
 # =============================================================================
 
 @app.route('/users', methods=['GET'])
+@conditional('users', cache=True)
 def get_users():
-    """Get all users"""
-    users = UserDAL.get_all()
+    """Get all users, or only those changed since updated_since"""
+    try:
+        users = UserDAL.get_all(updated_since=get_updated_since())
+    except ValueError as e:
+        return error_response(str(e), 400)
     return jsonify(users), 200
 
 @app.route('/users', methods=['POST'])
@@ -99,7 +156,32 @@ def create_user():
             return error_response("Email already exists", 409)
         return error_response("Failed to create user", 500)
 
+@app.route('/users/bulk', methods=['POST'])
+def bulk_create_users():
+    """Create many users in one transaction, reporting the records that could not be created"""
+    try:
+        _, records = get_bulk_records('users')
+    except ValueError as e:
+        return error_response(str(e), 400)
+    
+    valid, errors = [], []
+    for index, record in enumerate(records):
+        if not isinstance(record, dict) or not record.get('name') or not record.get('email'):
+            errors.append({"index": index, "error": "Name and email are required", "status": 400})
+        else:
+            valid.append((index, {'name': record['name'], 'email': record['email']}))
+    
+    try:
+        users, conflicts = UserDAL.bulk_create([user for _, user in valid])
+    except Exception as e:
+        return error_response("Failed to create users", 500)
+    
+    # Conflict indexes refer to the valid records; map them back to the request
+    errors += [{**conflict, "index": valid[conflict['index']][0]} for conflict in conflicts]
+    return bulk_summary('users', users, errors)
+
 @app.route('/users/<user_id>', methods=['GET'])
+@conditional('users')
 def get_user_by_id(user_id):
     """Get user by ID"""
     user = UserDAL.get_by_id(user_id)
@@ -129,20 +211,106 @@ def update_user(user_id):
 @app.route('/users/<user_id>', methods=['DELETE'])
 def delete_user(user_id):
     """Delete user"""
-    if not UserDAL.delete(user_id):
+    job_id = UserDAL.delete(user_id)
+    if not job_id:
         return error_response("User not found", 404)
     
-    return '', 204
+    return '', 204, {'X-Cleanup-Job-Id': job_id}
+
+@app.route('/users/<user_id>/accessible', methods=['GET'])
+@conditional('users', 'resources', 'resource_groups', 'tuples')
+def get_user_accessible_resources(user_id):
+    """Get the resources of a type a user can access with a given relation"""
+    relation = request.args.get('relation', 'viewer')
+    resource_type = request.args.get('type')
+    
+    if not resource_type:
+        return error_response("Resource type is required", 400)
+    if relation not in IMPLIED_RELATIONS:
+        return error_response(f"Invalid relation. Must be one of: {', '.join(IMPLIED_RELATIONS)}", 400)
+    
+    try:
+        limit, offset = get_pagination_args()
+    except ValueError:
+        return error_response("Invalid pagination parameters", 400)
+    
+    if not UserDAL.get_by_id(user_id):
+        return error_response("User not found", 404)
+    
+    # One ListObjects round trip per granting relation, then one SQLite query for the page
+    objects = RelationshipDAL.list_accessible_objects(f"user:{user_id}", relation, [resource_type])
+    resource_ids = [obj.split(':', 1)[1] for obj in objects]
+    resources, total = ResourceDAL.get_by_ids(resource_ids, resource_type=resource_type, limit=limit, offset=offset)
+    
+    return jsonify({
+        "user_id": user_id,
+        "relation": relation,
+        "type": resource_type,
+        "resources": resources,
+        "total": total,
+        "limit": limit,
+        "offset": offset
+    }), 200
 
 # =============================================================================
 # RESOURCE ENDPOINTS
 # =============================================================================
 
 @app.route('/resources', methods=['GET'])
+@conditional('resources', 'resource_groups', 'tuples', cache=True)
 def get_resources():
-    """Get all resources"""
-    resources = ResourceDAL.get_all()
-    return jsonify(resources), 200
+    """Get all resources, or only those a subject can access when subject is given"""
+    subject = request.args.get('subject')
+    # metadata.<key>=<value> filters, matched in SQLite
+    metadata = {name[len('metadata.'):]: value for name, value in request.args.items()
+                if name.startswith('metadata.')}
+    try:
+        updated_since = get_updated_since()
+    except ValueError as e:
+        return error_response(str(e), 400)
+    if not subject:
+        try:
+            resources = ResourceDAL.get_all(metadata=metadata, updated_since=updated_since)
+        except ValueError as e:
+            return error_response(str(e), 400)
+        return jsonify(resources), 200
+    
+    relation = request.args.get('relation', 'viewer')
+    if ':' not in subject:
+        return error_response("Subject must be an OpenFGA reference such as user:<id>", 400)
+    if relation not in IMPLIED_RELATIONS:
+        return error_response(f"Invalid relation. Must be one of: {', '.join(IMPLIED_RELATIONS)}", 400)
+    
+    try:
+        limit, _ = get_pagination_args()
+    except ValueError:
+        return error_response("Invalid pagination parameters", 400)
+    
+    resource_type = request.args.get('type')
+    cursor = request.args.get('cursor')
+    
+    try:
+        if EffectivePermissionDAL.is_enabled():
+            # Plain indexed join against the materialized table
+            resources, next_cursor = ResourceDAL.get_page_for_subject(subject, relation, resource_type, limit=limit,
+                                                                      cursor=cursor, metadata=metadata,
+                                                                      updated_since=updated_since)
+        else:
+            # Intersect the subject's accessible objects with SQLite, keyed on the primary key
+            resource_types = [resource_type] if resource_type else ResourceDAL.get_types()
+            objects = RelationshipDAL.list_accessible_objects(subject, relation, resource_types)
+            resource_ids = [obj.split(':', 1)[1] for obj in objects]
+            resources, next_cursor = ResourceDAL.get_page_by_ids(resource_ids, limit=limit, cursor=cursor,
+                                                                 metadata=metadata, updated_since=updated_since)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    
+    return jsonify({
+        "subject": subject,
+        "relation": relation,
+        "resources": resources,
+        "next_cursor": next_cursor
+    }), 200
 
 @app.route('/resources', methods=['POST'])
 def create_resource():
@@ -156,9 +324,8 @@ def create_resource():
     if not ResourceGroupDAL.get_by_id(data['resource_group_id']):
         return error_response("Resource group not found", 404)
     
-    valid_types = ['document', 'project', 'organization', 'folder', 'file']
-    if data['resource_type'] not in valid_types:
-        return error_response(f"Invalid resource type. Must be one of: {', '.join(valid_types)}", 400)
+    if data['resource_type'] not in RESOURCE_TYPES:
+        return error_response(f"Invalid resource type. Must be one of: {', '.join(RESOURCE_TYPES)}", 400)
     
     try:
         resource = ResourceDAL.create(
@@ -171,7 +338,42 @@ def create_resource():
     except Exception as e:
         return error_response("Failed to create resource", 500)
 
+@app.route('/resources/bulk', methods=['POST'])
+def bulk_create_resources():
+    """Create many resources in one transaction, optionally making a user or group their owner"""
+    try:
+        data, records = get_bulk_records('resources')
+    except ValueError as e:
+        return error_response(str(e), 400)
+    
+    valid, errors = [], []
+    for index, record in enumerate(records):
+        if (not isinstance(record, dict) or not record.get('resource_type') or not record.get('resource_name')
+                or not record.get('resource_group_id')):
+            errors.append({"index": index, "error": "Resource type, name, and resource group ID are required", "status": 400})
+            continue
+        if record['resource_type'] not in RESOURCE_TYPES:
+            errors.append({"index": index, "error": f"Invalid resource type. Must be one of: {', '.join(RESOURCE_TYPES)}", "status": 400})
+            continue
+        valid.append((index, {
+            'type': record['resource_type'],
+            'name': record['resource_name'],
+            'resource_group_id': record['resource_group_id'],
+            'metadata': record.get('metadata', {}),
+            # A record's owner overrides the request-wide one
+            'owner': record.get('owner', data.get('owner'))
+        }))
+    
+    try:
+        resources, conflicts = ResourceDAL.bulk_create([resource for _, resource in valid])
+    except Exception as e:
+        return error_response("Failed to create resources", 500)
+    
+    errors += [{**conflict, "index": valid[conflict['index']][0]} for conflict in conflicts]
+    return bulk_summary('resources', resources, errors)
+
 @app.route('/resources/<resource_id>', methods=['GET'])
+@conditional('resources', 'resource_groups')
 def get_resource_by_id(resource_id):
     """Get resource by ID"""
     resource = ResourceDAL.get_by_id(resource_id)
@@ -189,9 +391,8 @@ def update_resource(resource_id):
     
     # Validate resource type if provided
     if 'resource_type' in data:
-        valid_types = ['document', 'project', 'organization', 'folder', 'file']
-        if data['resource_type'] not in valid_types:
-            return error_response(f"Invalid resource type. Must be one of: {', '.join(valid_types)}", 400)
+        if data['resource_type'] not in RESOURCE_TYPES:
+            return error_response(f"Invalid resource type. Must be one of: {', '.join(RESOURCE_TYPES)}", 400)
     
     # Validate resource group if provided
     if 'resource_group_id' in data:
@@ -217,19 +418,59 @@ def update_resource(resource_id):
 @app.route('/resources/<resource_id>', methods=['DELETE'])
 def delete_resource(resource_id):
     """Delete resource"""
-    if not ResourceDAL.delete(resource_id):
+    job_id = ResourceDAL.delete(resource_id)
+    if not job_id:
         return error_response("Resource not found", 404)
     
-    return '', 204
+    return '', 204, {'X-Cleanup-Job-Id': job_id}
+
+@app.route('/resources/<resource_id>/principals', methods=['GET'])
+@conditional('resources', 'users', 'tuples')
+def get_resource_principals(resource_id):
+    """Get the users holding a relation on a resource, with group grants expanded"""
+    relation = request.args.get('relation', 'viewer')
+    if relation not in IMPLIED_RELATIONS:
+        return error_response(f"Invalid relation. Must be one of: {', '.join(IMPLIED_RELATIONS)}", 400)
+    
+    try:
+        limit, offset = get_pagination_args()
+    except ValueError:
+        return error_response("Invalid pagination parameters", 400)
+    
+    resource = ResourceDAL.get_by_id(resource_id)
+    if not resource:
+        return error_response("Resource not found", 404)
+    
+    principals = RelationshipDAL.list_principals(f"{resource['type']}:{resource_id}", relation)
+    page = principals[offset:offset + limit]
+    
+    # Hydrate only the requested page with a single batched user lookup
+    users = UserDAL.get_by_ids([p['user'].split(':', 1)[1] for p in page])
+    for principal in page:
+        user_id = principal['user'].split(':', 1)[1]
+        principal['user'] = users.get(user_id, {"id": user_id, "name": "Unknown", "email": "unknown@example.com"})
+    
+    return jsonify({
+        "resource_id": resource_id,
+        "relation": relation,
+        "principals": page,
+        "total": len(principals),
+        "limit": limit,
+        "offset": offset
+    }), 200
 
 # =============================================================================
 # USER GROUP ENDPOINTS
 # =============================================================================
 
 @app.route('/user-groups', methods=['GET'])
+@conditional('user_groups', 'users', cache=True)
 def get_user_groups():
-    """Get all user groups"""
-    user_groups = UserGroupDAL.get_all()
+    """Get all user groups, or only those changed since updated_since"""
+    try:
+        user_groups = UserGroupDAL.get_all(updated_since=get_updated_since())
+    except ValueError as e:
+        return error_response(str(e), 400)
     return jsonify(user_groups), 200
 
 @app.route('/user-groups', methods=['POST'])
@@ -247,16 +488,12 @@ def create_user_group():
             data.get('description', '')
         )
         
-        # Create OpenFGA member relationships for users in the group
-        if data['user_ids']:
-            created_relationships = create_member_relationships(group['id'], data['user_ids'])
-            print(f"🔗 Created {len(created_relationships)} member relationships for group '{data['name']}'")
-        
         return jsonify(group), 201
     except Exception as e:
         return error_response("Failed to create user group", 500)
 
 @app.route('/user-groups/<group_id>', methods=['GET'])
+@conditional('user_groups', 'users')
 def get_user_group_by_id(group_id):
     """Get user group by ID"""
     group = UserGroupDAL.get_by_id(group_id)
@@ -272,13 +509,6 @@ def update_user_group(group_id):
     if not data:
         return error_response("Invalid request data", 400)
     
-    # Get current group to compare user_ids for relationship management
-    current_group = UserGroupDAL.get_by_id(group_id)
-    if not current_group:
-        return error_response("User group not found", 404)
-    
-    old_user_ids = set(current_group.get('user_ids', []))
-    
     try:
         group = UserGroupDAL.update(
             group_id,
@@ -290,54 +520,44 @@ def update_user_group(group_id):
         if not group:
             return error_response("User group not found", 404)
         
-        # Handle relationship changes if user_ids were updated
-        if 'user_ids' in data:
-            new_user_ids = set(data['user_ids'])
-            
-            # Find users to add and remove
-            users_to_add = new_user_ids - old_user_ids
-            users_to_remove = old_user_ids - new_user_ids
-            
-            # Create relationships for new users
-            if users_to_add:
-                created_relationships = create_member_relationships(group_id, list(users_to_add))
-                print(f"🔗 Created {len(created_relationships)} new member relationships for group '{group['name']}'")
-            
-            # Remove relationships for users no longer in the group
-            if users_to_remove:
-                removed_count = remove_member_relationships(group_id, list(users_to_remove))
-                print(f"🔗 Removed {removed_count} member relationships from group '{group['name']}'")
-        
         return jsonify(group), 200
     except Exception as e:
         return error_response("Failed to update user group", 500)
 
 @app.route('/user-groups/<group_id>', methods=['DELETE'])
 def delete_user_group(group_id):
-    """Delete user group"""
-    # Get group before deletion for logging
-    group = UserGroupDAL.get_by_id(group_id)
-    if not group:
+    """Delete user group (member relationships are removed from OpenFGA by the outbox, grants by a cleanup job)"""
+    job_id = UserGroupDAL.delete(group_id)
+    if not job_id:
         return error_response("User group not found", 404)
     
-    # Remove all member relationships for this group
-    removed_count = remove_member_relationships(group_id)
-    if removed_count > 0:
-        print(f"🔗 Removed {removed_count} member relationships for deleted group '{group['name']}'")
+    return '', 204, {'X-Cleanup-Job-Id': job_id}
+
+@app.route('/user-groups/reconcile', methods=['POST'])
+@app.route('/user-groups/<group_id>/reconcile', methods=['POST'])
+def reconcile_user_groups(group_id=None):
+    """Repair drift between group memberships in SQLite and member tuples in OpenFGA"""
+    dry_run = request.args.get('dry_run', 'false').lower() in ('1', 'true', 'yes')
     
-    if not UserGroupDAL.delete(group_id):
-        return error_response("Failed to delete user group", 500)
+    try:
+        report = MembershipReconciler.reconcile(group_id, dry_run=dry_run)
+    except Exception as e:
+        return error_response(f"Failed to reconcile memberships: {str(e)}", 500)
     
-    return '', 204
+    return jsonify(report), 200
 
 # =============================================================================
 # RESOURCE GROUP ENDPOINTS
 # =============================================================================
 
 @app.route('/resource-groups', methods=['GET'])
+@conditional('resource_groups', 'resources', cache=True)
 def get_resource_groups():
-    """Get all resource groups"""
-    resource_groups = ResourceGroupDAL.get_all()
+    """Get all resource groups, or only those changed since updated_since"""
+    try:
+        resource_groups = ResourceGroupDAL.get_all(updated_since=get_updated_since())
+    except ValueError as e:
+        return error_response(str(e), 400)
     return jsonify(resource_groups), 200
 
 @app.route('/resource-groups', methods=['POST'])
@@ -360,6 +580,7 @@ def create_resource_group():
         return error_response("Failed to create resource group", 500)
 
 @app.route('/resource-groups/<group_id>', methods=['GET'])
+@conditional('resource_groups', 'resources')
 def get_resource_group_by_id(group_id):
     """Get resource group by ID"""
     group = ResourceGroupDAL.get_by_id(group_id)
@@ -390,19 +611,44 @@ def update_resource_group(group_id):
     except Exception as e:
         return error_response("Failed to update resource group", 500)
 
+@app.route('/resource-groups/<group_id>/resources/move', methods=['POST'])
+def move_resources_to_group(group_id):
+    """Move resources into a group in one transaction: the listed resource_ids, or every resource
+    of from_group_id. Returns counts rather than the group's resources"""
+    data = request.get_json(silent=True) or {}
+    resource_ids = data.get('resource_ids')
+    from_group_id = data.get('from_group_id')
+    
+    if resource_ids is None and not from_group_id:
+        return error_response("resource_ids or from_group_id is required", 400)
+    if resource_ids is not None and (not isinstance(resource_ids, list)
+                                     or not all(isinstance(r, str) for r in resource_ids)):
+        return error_response("resource_ids must be a list of resource IDs", 400)
+    
+    try:
+        summary = ResourceGroupDAL.move_resources(group_id, resource_ids=resource_ids, from_group_id=from_group_id)
+    except Exception as e:
+        return error_response("Failed to move resources", 500)
+    
+    if summary is None:
+        return error_response("Resource group not found", 404)
+    return jsonify(summary), 200
+
 @app.route('/resource-groups/<group_id>', methods=['DELETE'])
 def delete_resource_group(group_id):
     """Delete resource group"""
-    if not ResourceGroupDAL.delete(group_id):
+    job_id = ResourceGroupDAL.delete(group_id)
+    if not job_id:
         return error_response("Resource group not found", 404)
     
-    return '', 204
+    return '', 204, {'X-Cleanup-Job-Id': job_id}
 
 # =============================================================================
 # RELATIONSHIP ENDPOINTS
 # =============================================================================
 
 @app.route('/relationships', methods=['GET'])
+@conditional('tuples')
 def get_relationships():
     """Get all relationships with optional filtering"""
     user_filter = request.args.get('user')
@@ -429,6 +675,11 @@ def create_relationship():
     if not data or 'user' not in data or 'relation' not in data or 'object' not in data:
         return error_response("User, relation, and object are required", 400)
     
+    try:
+        RelationshipDAL.validate(data['user'], data['relation'], data['object'])
+    except ValueError as e:
+        return error_response(str(e), 400)
+    
     # Check if relationship already exists
     if RelationshipDAL.relationship_exists(data['user'], data['relation'], data['object']):
         return jsonify({
@@ -439,10 +690,43 @@ def create_relationship():
     try:
         relationship = RelationshipDAL.create(data['user'], data['relation'], data['object'])
         return jsonify(relationship), 201
+    except RelationshipExistsError:
+        return jsonify({
+            "error": "conflict",
+            "message": "Relationship already exists"
+        }), 409
+    except OpenFGAUnavailableError:
+        raise
     except Exception as e:
         return error_response("Failed to create relationship", 500)
 
+@app.route('/relationships/matrix', methods=['GET'])
+@conditional(*VERSIONED_TABLES)
+def get_relationship_matrix():
+    """Get a paged grid of direct and effective relations between subjects and objects"""
+    subjects = request.args.get('subjects')
+    objects = request.args.get('objects')
+    
+    try:
+        subject_limit, subject_offset = get_pagination_args(default_limit=50, max_limit=200, prefix='subject_')
+        object_limit, object_offset = get_pagination_args(default_limit=50, max_limit=200, prefix='object_')
+    except ValueError:
+        return error_response("Invalid pagination parameters", 400)
+    
+    matrix = PermissionMatrixDAL.get_matrix(
+        subjects=[s for s in subjects.split(',') if s] if subjects else None,
+        objects=[o for o in objects.split(',') if o] if objects else None,
+        resource_group_id=request.args.get('resource_group_id'),
+        subject_limit=subject_limit,
+        subject_offset=subject_offset,
+        object_limit=object_limit,
+        object_offset=object_offset
+    )
+    
+    return jsonify(matrix), 200
+
 @app.route('/relationships/<relationship_id>', methods=['GET'])
+@conditional('tuples')
 def get_relationship_by_id(relationship_id):
     """Get relationship by ID"""
     relationship = RelationshipDAL.get_by_id(relationship_id)
@@ -479,6 +763,15 @@ def update_relationship(relationship_id):
             }), 404
         
         return jsonify(relationship), 200
+    except RelationshipExistsError:
+        return jsonify({
+            "error": "conflict",
+            "message": "Relationship already exists"
+        }), 409
+    except ValueError as e:
+        return error_response(str(e), 400)
+    except OpenFGAUnavailableError:
+        raise
     except Exception as e:
         return jsonify({
             "error": "internal_error",
@@ -496,6 +789,22 @@ def delete_relationship(relationship_id):
     
     return '', 204
 
+@app.route('/relationships', methods=['DELETE'])
+def delete_relationships():
+    """Delete every relationship matching the user, relation and object filters"""
+    user = request.args.get('user')
+    relation = request.args.get('relation')
+    object_ref = request.args.get('object')
+    if not any([user, relation, object_ref]):
+        return error_response("At least one of user, relation or object is required", 400)
+    
+    try:
+        deleted = RelationshipDAL.delete_by_criteria(user=user, relation=relation, object_ref=object_ref)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    
+    return jsonify({"deleted": deleted}), 200
+
 @app.route('/relationships/check', methods=['POST'])
 def check_relationship():
     """Check if a user has a specific relationship to a resource"""
@@ -507,7 +816,12 @@ def check_relationship():
             "message": "User, relation, and object are required"
         }), 400
     
-    allowed = RelationshipDAL.check_relationship(data['user'], data['relation'], data['object'])
+    consistency = data.get('consistency')
+    if consistency is not None and consistency not in CONSISTENCY_MODES:
+        return error_response(f"Invalid consistency. Must be one of: {', '.join(CONSISTENCY_MODES)}", 400)
+    
+    allowed = RelationshipDAL.check_relationship(data['user'], data['relation'], data['object'],
+                                                 consistency=consistency)
     
     return jsonify({
         "allowed": allowed,
@@ -515,17 +829,120 @@ def check_relationship():
     }), 200
 
 # =============================================================================
-# HEALTH CHECK ENDPOINT
+# CLEANUP JOB ENDPOINTS
 # =============================================================================
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    """Health check endpoint for Docker"""
-    return jsonify({
-        "status": "healthy",
-        "timestamp": get_timestamp(),
-        "service": "rebecca-api"
-    }), 200
+@app.route('/cleanup-jobs/<job_id>', methods=['GET'])
+def get_cleanup_job(job_id):
+    """Get the progress of the OpenFGA tuple cleanup started by a delete"""
+    job = CleanupJobs.get(job_id)
+    if not job:
+        return error_response("Cleanup job not found", 404)
+    
+    return jsonify(job), 200
+
+# =============================================================================
+# SEARCH ENDPOINTS
+# =============================================================================
+
+@app.route('/search', methods=['GET'])
+@conditional('users', 'resources', 'user_groups', 'resource_groups', cache=True)
+def search():
+    """Full-text search over users, resources and groups, best matches first"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return error_response("Search query (q) is required", 400)
+    
+    kinds = request.args.get('kind')
+    kinds = [k for k in kinds.split(',') if k] if kinds else list(SEARCH_KINDS)
+    invalid = [k for k in kinds if k not in SEARCH_KINDS]
+    if invalid:
+        return error_response(f"Invalid kind. Must be one of: {', '.join(SEARCH_KINDS)}", 400)
+    
+    try:
+        limit, offset = get_pagination_args(default_limit=20, max_limit=100)
+    except ValueError:
+        return error_response("Invalid pagination parameters", 400)
+    
+    count = request.args.get('count', 'false').lower() in ('1', 'true', 'yes')
+    hits, has_more, total = SearchDAL.search(query, kinds=kinds, limit=limit, offset=offset, count=count)
+    
+    results = {
+        "query": query,
+        "hits": hits,
+        "has_more": has_more,
+        "limit": limit,
+        "offset": offset
+    }
+    if count:
+        results["total"] = total
+    return jsonify(results), 200
+
+# =============================================================================
+# SYNC ENDPOINTS
+# =============================================================================
+
+@app.route('/deletions', methods=['GET'])
+@conditional('users', 'resources', 'user_groups', 'resource_groups')
+def get_deletions():
+    """Get the records deleted since updated_since, for clients syncing the lists incrementally"""
+    try:
+        updated_since = get_updated_since()
+    except ValueError as e:
+        return error_response(str(e), 400)
+    if updated_since is None:
+        return error_response("updated_since is required", 400)
+    
+    kinds = request.args.get('kind')
+    kinds = [k for k in kinds.split(',') if k] if kinds else list(DELETION_KINDS)
+    invalid = [k for k in kinds if k not in DELETION_KINDS]
+    if invalid:
+        return error_response(f"Invalid kind. Must be one of: {', '.join(DELETION_KINDS)}", 400)
+    
+    return jsonify(DeletionDAL.get_since(updated_since, kinds=kinds)), 200
+
+# =============================================================================
+# STATS ENDPOINTS
+# =============================================================================
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    """Get aggregate counts, breakdowns and recent entities for the dashboard"""
+    try:
+        recent_limit = min(int(request.args.get('recent', 5)), 50)
+    except ValueError:
+        return error_response("Invalid recent parameter", 400)
+    
+    now = time.monotonic()
+    with _stats_cache_lock:
+        cached = _stats_cache.get(recent_limit)
+        if cached and cached[0] > now:
+            return jsonify(cached[1]), 200
+    
+    summary = StatsDAL.get_summary(recent_limit=max(recent_limit, 0))
+    summary['generated_at'] = get_timestamp()
+    
+    with _stats_cache_lock:
+        _stats_cache[recent_limit] = (now + STATS_CACHE_TTL, summary)
+    
+    return jsonify(summary), 200
+
+# =============================================================================
+# EFFECTIVE PERMISSIONS ENDPOINTS
+# =============================================================================
+
+@app.route('/effective-permissions/rebuild', methods=['POST'])
+def rebuild_effective_permissions():
+    """Rebuild the materialized effective_permissions table from OpenFGA"""
+    if not EFFECTIVE_PERMISSIONS_ENABLED:
+        return error_response("Effective permissions are not enabled", 409)
+    
+    try:
+        rows = EffectivePermissionDAL.rebuild()
+    except Exception as e:
+        return error_response(f"Failed to rebuild effective permissions: {str(e)}", 500)
+    
+    return jsonify({"message": "Effective permissions rebuilt", "rows": rows}), 200
 
 # =============================================================================
 # MAIN
@@ -537,19 +954,21 @@ if __name__ == '__main__':
     # Initialize database
     init_database()
     
-    # Load sample data
-    stats = load_sample_data()
+    # Send any OpenFGA changes left queued by a previous run, and resume unfinished cleanup jobs
+    OpenFGAOutbox.start_dispatcher()
+    CleanupJobs.start_dispatcher()
+    
+    # Load sample data; counting existing data is opt-in (STARTUP_STATS) as it scans every table
+    stats = load_sample_data(with_stats=STARTUP_STATS_ENABLED)
     
-    print("📊 Sample data loaded:")
-    print(f"   - {stats['users']} users")
-    print(f"   - {stats['resources']} resources") 
-    print(f"   - {stats['resource_groups']} resource groups")
-    print(f"   - {stats['user_groups']} user groups")
-    print(f"   - {stats['relationships']} relationships")
+    if stats:
+        print("📊 Sample data:")
+        for entity, count in stats.items():
+            print(f"   - {count} {entity.replace('_', ' ')}")
     
     # Get port from environment variable or use default
-    import os
     port = int(os.environ.get('PORT', 5000))
+    print(f"⏱️  Ready in {(time.perf_counter() - STARTED_AT) * 1000:.0f} ms")
     print(f"🌐 Server running on http://localhost:{port}")
     
     app.run(debug=False, host='0.0.0.0', port=port)
@@ -0,0 +1,196 @@
+"""
+Background removal of the OpenFGA tuples that reference deleted entities
+"""
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from .config import get_db
+from .openfga_outbox import OpenFGAOutbox
+from .relationship_dal import READ_AFTER_WRITE_CONSISTENCY, _delete_confirmed, _get_openfga_service_class, _is_unavailable
+from .tuple_changes import record_tuple_changes
+
+# Tuples read and deleted per OpenFGA request; OpenFGA caps both reads and writes at 100
+CLEANUP_BATCH_SIZE = int(os.environ.get('CLEANUP_BATCH_SIZE', 100))
+# Seconds between polls for pending jobs when nothing has been queued by this process
+CLEANUP_POLL_INTERVAL = float(os.environ.get('CLEANUP_POLL_INTERVAL', 30))
+# Jobs that fail this many times, other than while OpenFGA is unavailable, are marked failed
+CLEANUP_MAX_ATTEMPTS = int(os.environ.get('CLEANUP_MAX_ATTEMPTS', 5))
+# Finished jobs are kept this many days for progress lookups, then pruned
+CLEANUP_JOB_RETENTION_DAYS = float(os.environ.get('CLEANUP_JOB_RETENTION_DAYS', 7))
+# Bounds of the jittered exponential backoff after a failed run, in seconds
+CLEANUP_RETRY_BASE_DELAY = 1.0
+CLEANUP_RETRY_MAX_DELAY = 300.0
+
+_wakeup = threading.Event()
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+_run_lock = threading.Lock()
+
+class CleanupJobs:
+    @staticmethod
+    def enqueue(conn: sqlite3.Connection, entities: List[str]) -> str:
+        """Queue the cleanup of the tuples referencing the given entities (such as user:<id>) within
+        the caller's SQLite transaction. Returns the job ID; call notify() once the transaction has committed.
+
+        Outbox changes still queued for the entities are dropped in the same transaction, so none can
+        re-create a tuple after the job has run.
+        """
+        OpenFGAOutbox.cancel(conn, entities)
+        job_id = str(uuid.uuid4())
+        timestamp = datetime.now().isoformat()
+        conn.execute('''
+            INSERT INTO cleanup_jobs (id, entities, status, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (job_id, json.dumps(entities), 'pending' if entities else 'done', timestamp, timestamp))
+        return job_id
+
+    @staticmethod
+    def notify():
+        """Wake the dispatcher, starting it if this process has not yet done so"""
+        CleanupJobs.start_dispatcher()
+        _wakeup.set()
+
+    @staticmethod
+    def start_dispatcher():
+        """Start the background thread that runs pending jobs, resuming any left by a previous run"""
+        global _dispatcher
+        with _dispatcher_lock:
+            if _dispatcher is None or not _dispatcher.is_alive():
+                _dispatcher = threading.Thread(target=_run_dispatcher, name='cleanup-jobs', daemon=True)
+                _dispatcher.start()
+
+    @staticmethod
+    def get(job_id: str) -> Optional[Dict[str, Any]]:
+        """Get the progress of a job"""
+        with get_db() as conn:
+            row = conn.execute('''
+                SELECT id, status, json_array_length(entities) as entities_total, entities_done,
+                       tuples_deleted, attempts, last_error, created_at, updated_at
+                FROM cleanup_jobs WHERE id = ?
+            ''', (job_id,)).fetchone()
+            return dict(row) if row else None
+
+    @staticmethod
+    def run_pending() -> int:
+        """Run every pending job to completion, oldest first. Returns the number of tuples deleted"""
+        with _run_lock:
+            CleanupJobs._prune()
+            deleted = 0
+            while True:
+                job = CleanupJobs._next_job()
+                if job is None:
+                    return deleted
+                # A drain that read the job's outbox entries before they were dropped may still be sending them
+                OpenFGAOutbox.wait_for_sends()
+                deleted += asyncio.run(CleanupJobs._async_run(job))
+
+    @staticmethod
+    async def _async_run(job: sqlite3.Row) -> int:
+        """Async helper that deletes the tuples of each remaining entity of a job, recording progress
+        after every batch so a restarted job resumes where it stopped"""
+        service_class = _get_openfga_service_class()
+        if service_class is None:
+            raise Exception("OpenFGA service class not available")
+
+        CleanupJobs._update(job['id'], "status = 'running'")
+        service = service_class()
+        await service.initialize()
+
+        try:
+            entities = json.loads(job['entities'])
+            deleted = 0
+            for position in range(job['entities_done'], len(entities)):
+                for read_filter in service.codec.reference_filters(entities[position]):
+                    deleted += await CleanupJobs._delete_matching(service, job['id'], read_filter)
+                CleanupJobs._update(job['id'], 'entities_done = ?', position + 1)
+            CleanupJobs._update(job['id'], "status = 'done', last_error = NULL")
+            return deleted
+        except Exception as e:
+            # Outages are retried indefinitely; only other failures count towards CLEANUP_MAX_ATTEMPTS
+            if not _is_unavailable(e):
+                CleanupJobs._update(job['id'], '''
+                    attempts = attempts + 1, last_error = ?,
+                    status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END
+                ''', str(e), CLEANUP_MAX_ATTEMPTS)
+            raise
+        finally:
+            await service.close()
+
+    @staticmethod
+    async def _delete_matching(service, job_id: str, read_filter: Dict[str, str]) -> int:
+        """Helper method to delete every tuple matching a read filter, one page at a time.
+
+        The first page is read again after each delete rather than following continuation tokens,
+        which may not survive the deletion of the tuples they point past. Only deletes OpenFGA confirms
+        are recorded, so a tuple another writer removed first is not counted twice.
+        """
+        deleted = 0
+        previous = None
+        while True:
+            pages = service.iter_tuple_pages(page_size=CLEANUP_BATCH_SIZE, consistency=READ_AFTER_WRITE_CONSISTENCY,
+                                             **read_filter)
+            try:
+                page = await anext(pages, [])
+            finally:
+                await pages.aclose()
+            if not page:
+                return deleted
+            if page == previous:
+                raise Exception(f"Tuples matching {read_filter} were not deleted")
+
+            confirmed = await _delete_confirmed(service, page)
+            record_tuple_changes(deleted=confirmed)
+            CleanupJobs._update(job_id, 'tuples_deleted = tuples_deleted + ?', len(confirmed))
+            deleted += len(confirmed)
+            previous = page
+
+    @staticmethod
+    def _next_job() -> Optional[sqlite3.Row]:
+        """Helper method to get the oldest job that still has work to do"""
+        with get_db() as conn:
+            return conn.execute('''
+                SELECT id, entities, entities_done FROM cleanup_jobs
+                WHERE status IN ('pending', 'running') ORDER BY created_at LIMIT 1
+            ''').fetchone()
+
+    @staticmethod
+    def _update(job_id: str, assignments: str, *params):
+        """Helper method to update a job and its timestamp"""
+        with get_db() as conn:
+            conn.execute(f'UPDATE cleanup_jobs SET {assignments}, updated_at = ? WHERE id = ?',
+                         (*params, datetime.now().isoformat(), job_id))
+            conn.commit()
+
+    @staticmethod
+    def _prune():
+        """Helper method to drop finished jobs past their retention"""
+        cutoff = (datetime.now() - timedelta(days=CLEANUP_JOB_RETENTION_DAYS)).isoformat()
+        with get_db() as conn:
+            conn.execute('''
+                DELETE FROM cleanup_jobs WHERE status IN ('done', 'failed') AND updated_at < ?
+            ''', (cutoff,))
+            conn.commit()
+
+def _run_dispatcher():
+    """Run pending jobs whenever woken or polled, backing off while they are failing"""
+    failures = 0
+    while True:
+        _wakeup.wait(CLEANUP_POLL_INTERVAL)
+        _wakeup.clear()
+        try:
+            deleted = CleanupJobs.run_pending()
+            if deleted:
+                print(f"🧹 Deleted {deleted} OpenFGA tuples of deleted entities")
+            failures = 0
+        except Exception as e:
+            failures += 1
+            delay = min(CLEANUP_RETRY_BASE_DELAY * 2 ** failures, CLEANUP_RETRY_MAX_DELAY)
+            print(f"⚠️  Cleanup job failed (retrying in {delay:.1f}s): {e}")
+            time.sleep(delay * random.uniform(0.5, 1.0))
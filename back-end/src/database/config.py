@@ -3,12 +3,45 @@ Database configuration and connection management for Rebecca API
 """
 import sqlite3
 import os
+import re
 from contextlib import contextmanager
+from datetime import datetime
 from typing import Optional
 
 # Database configuration
 DATABASE_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'rebecca.db')
 
+# Maintain the materialized effective_permissions table on every tuple change
+EFFECTIVE_PERMISSIONS_ENABLED = os.environ.get('EFFECTIVE_PERMISSIONS_ENABLED', '').lower() in ('1', 'true', 'yes')
+
+# Count every table at server startup; off by default as it scans whole tables before the server is ready
+STARTUP_STATS_ENABLED = os.environ.get('STARTUP_STATS', '').lower() in ('1', 'true', 'yes')
+
+# Resource metadata keys filtered often enough to deserve an index, e.g. "owner_team,project.code".
+# Each gets an index on json_extract(metadata, '$.<key>'); keys may be nested with dots
+METADATA_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_]+(\.[A-Za-z0-9_]+)*$')
+INDEXED_METADATA_KEYS = [key.strip() for key in os.environ.get('INDEXED_METADATA_KEYS', '').split(',') if key.strip()]
+METADATA_INDEX_PREFIX = 'idx_resources_metadata_'
+
+# Columns of each table indexed for full-text search, with their bm25 weights. Each table
+# gets an external content FTS5 table named <table>_fts, kept in sync by triggers
+SEARCH_INDEXES = {
+    'users': {'name': 10.0, 'email': 5.0},
+    'resources': {'name': 10.0, 'type': 2.0, 'metadata': 1.0},
+    'user_groups': {'name': 10.0},
+    'resource_groups': {'name': 10.0},
+}
+
+# Tables with integer created_at_ms/updated_at_ms columns next to the ISO created_at/updated_at
+EPOCH_TIMESTAMP_TABLES = ('users', 'resources', 'user_groups', 'resource_groups')
+
+# SQL converting an ISO timestamp column written by datetime.now() (naive local time) to epoch milliseconds
+EPOCH_MS_SQL = "CAST(round((julianday({column}, 'utc') - 2440587.5) * 86400000) AS INTEGER)"
+
+def epoch_ms(timestamp: str) -> int:
+    """Milliseconds since the Unix epoch for an ISO timestamp written by datetime.now()"""
+    return round(datetime.fromisoformat(timestamp).timestamp() * 1000)
+
 def get_db_connection() -> sqlite3.Connection:
     """Get a database connection with row factory for dict-like access"""
     conn = sqlite3.connect(DATABASE_PATH)
@@ -88,18 +121,220 @@ def init_database():
             )
         ''')
         
+        # Create counters table (maintained aggregates such as OpenFGA tuple counts)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        # Create openfga_outbox table (tuple changes queued in the same transaction as
+        # the SQLite change and sent to OpenFGA by a background dispatcher)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS openfga_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                operation TEXT NOT NULL CHECK (operation IN ('write', 'delete')),
+                user TEXT NOT NULL,
+                relation TEXT NOT NULL,
+                object TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at TEXT NOT NULL
+            )
+        ''')
+        
+        # Create cleanup_jobs table (removal of the OpenFGA tuples that reference deleted
+        # entities, queued in the same transaction as the delete and run in the background)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cleanup_jobs (
+                id TEXT PRIMARY KEY,
+                entities TEXT NOT NULL,
+                status TEXT NOT NULL CHECK (status IN ('pending', 'running', 'done', 'failed')),
+                entities_done INTEGER NOT NULL DEFAULT 0,
+                tuples_deleted INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+        
+        # Create relationship_tuples table (local mirror of OpenFGA tuples, only
+        # populated when effective permissions are enabled)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS relationship_tuples (
+                user TEXT NOT NULL,
+                relation TEXT NOT NULL,
+                object TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                PRIMARY KEY (user, relation, object)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Create effective_permissions table (tuples expanded through group
+        # membership and the owner > editor > viewer hierarchy)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS effective_permissions (
+                subject TEXT NOT NULL,
+                relation TEXT NOT NULL,
+                object TEXT NOT NULL,
+                PRIMARY KEY (subject, relation, object)
+            ) WITHOUT ROWID
+        ''')
+        
         # Note: Relationships are now stored in OpenFGA, not SQLite
         # This improves performance and reduces complexity
         
+        # Bring the tables created above up to the current schema version
+        migrate_database(conn)
+        
         # Create indexes for better performance
         conn.execute('CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)')
         conn.execute('CREATE INDEX IF NOT EXISTS idx_resources_group ON resources(resource_group_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_resources_type ON resources(type)')
         conn.execute('CREATE INDEX IF NOT EXISTS idx_user_group_members_user ON user_group_members(user_id)')
         conn.execute('CREATE INDEX IF NOT EXISTS idx_user_group_members_group ON user_group_members(user_group_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_openfga_outbox_attempts ON openfga_outbox(attempts, id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_cleanup_jobs_status ON cleanup_jobs(status, created_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_relationship_tuples_subject ON relationship_tuples(subject, object)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_relationship_tuples_object ON relationship_tuples(object, subject)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_effective_permissions_object ON effective_permissions(object, relation, subject)')
+        
+        # Index the declared metadata keys, dropping the indexes of keys no longer declared
+        sync_metadata_indexes(conn, INDEXED_METADATA_KEYS)
+        
+        # Create the full-text search indexes and the triggers keeping them in sync
+        for table, weights in SEARCH_INDEXES.items():
+            create_search_index(conn, table, list(weights), list(weights.values()))
+        
+        # Seed the data version epoch once per database (see versions.py)
+        conn.execute('''
+            INSERT OR IGNORE INTO counters (name, value) VALUES ('version.epoch', random() & 281474976710655)
+        ''')
         
         conn.commit()
         print("✅ Database initialized successfully (relationships stored in OpenFGA)")
 
+def _add_epoch_timestamps(conn: sqlite3.Connection):
+    """Add indexed epoch millisecond timestamps, filled from the ISO ones"""
+    for table in EPOCH_TIMESTAMP_TABLES:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN created_at_ms INTEGER')
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN updated_at_ms INTEGER')
+        conn.execute(f'''
+            UPDATE {table} SET created_at_ms = {EPOCH_MS_SQL.format(column='created_at')},
+                               updated_at_ms = {EPOCH_MS_SQL.format(column='updated_at')}
+        ''')
+        conn.execute(f'CREATE INDEX idx_{table}_created_at_ms ON {table}(created_at_ms)')
+        conn.execute(f'CREATE INDEX idx_{table}_updated_at_ms ON {table}(updated_at_ms)')
+
+def _add_deletions(conn: sqlite3.Connection):
+    """Add the log of deleted records for incremental sync"""
+    conn.execute('''
+        CREATE TABLE deletions (
+            kind TEXT NOT NULL,
+            id TEXT NOT NULL,
+            deleted_at_ms INTEGER NOT NULL,
+            PRIMARY KEY (kind, id)
+        )
+    ''')
+    conn.execute('CREATE INDEX idx_deletions_deleted_at_ms ON deletions(deleted_at_ms)')
+
+# Schema changes to existing tables, in order. PRAGMA user_version holds how many have been applied
+MIGRATIONS = [_add_epoch_timestamps, _add_deletions]
+
+def migrate_database(conn: sqlite3.Connection):
+    """Apply the migrations the database has not had yet, each in its own transaction"""
+    conn.commit()
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute('BEGIN')
+        migration(conn)
+        conn.execute(f'PRAGMA user_version = {number}')
+        conn.commit()
+        print(f"🔧 Applied database migration {number}: {migration.__doc__}")
+
+def metadata_key_expression(key: str, alias: Optional[str] = None) -> str:
+    """SQL expression extracting a metadata key, raising ValueError for keys that are not
+    plain names. The path is inlined rather than bound, so queries match the index expression"""
+    if not METADATA_KEY_PATTERN.match(key):
+        raise ValueError(f"Invalid metadata key: {key}")
+    column = f"{alias}.metadata" if alias else 'metadata'
+    return f"json_extract({column}, '$.{key}')"
+
+def sync_metadata_indexes(conn: sqlite3.Connection, keys: list):
+    """Create an expression index for each declared metadata key and drop those of undeclared keys"""
+    wanted = {f"{METADATA_INDEX_PREFIX}{key.replace('.', '_')}": key for key in keys}
+    existing = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND substr(name, 1, ?) = ?",
+        (len(METADATA_INDEX_PREFIX), METADATA_INDEX_PREFIX)
+    )]
+    for name in existing:
+        if name not in wanted:
+            conn.execute(f'DROP INDEX {name}')
+    for name, key in wanted.items():
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON resources({metadata_key_expression(key)})')
+
+def create_search_index(conn: sqlite3.Connection, table: str, columns: list, weights: list):
+    """Create the FTS5 index of a table and its sync triggers, filling it from existing rows
+    when it is new.
+
+    The index references rows by rowid. VACUUM may renumber the rowids of tables without an
+    INTEGER PRIMARY KEY, so compact the database with vacuum_database(), which rebuilds the index.
+    """
+    fts = f"{table}_fts"
+    cols = ', '.join(columns)
+    new_cols = ', '.join(f'new.{c}' for c in columns)
+    old_cols = ', '.join(f'old.{c}' for c in columns)
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+    ).fetchone()
+    
+    # Prefix indexes serve the search-as-you-type prefix queries
+    conn.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {cols}, content='{table}', content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.rowid, {new_cols});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.rowid, {old_cols});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {cols} ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.rowid, {old_cols});
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.rowid, {new_cols});
+        END
+    ''')
+    
+    if not exists:
+        # Rank by bm25 with the column weights, and index the rows created before the triggers
+        conn.execute(f"INSERT INTO {fts}({fts}, rank) VALUES ('rank', ?)",
+                     (f"bm25({', '.join(str(w) for w in weights)})",))
+        conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+def rebuild_search_indexes(conn: sqlite3.Connection):
+    """Re-read every full-text index from its table, matching it to the current rowids"""
+    for table in SEARCH_INDEXES:
+        conn.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+
+def vacuum_database():
+    """Compact the database file, then rebuild the full-text indexes, whose rowids VACUUM may have changed.
+    Writers wait for the rebuild, so no search runs against renumbered rows"""
+    with get_db() as conn:
+        conn.execute('VACUUM')
+        conn.execute('BEGIN IMMEDIATE')
+        rebuild_search_indexes(conn)
+        conn.commit()
+    print("🧹 Database compacted and search indexes rebuilt")
+
 def reset_database():
     """Reset the database by dropping all tables and recreating them"""
     if os.path.exists(DATABASE_PATH):
@@ -0,0 +1,35 @@
+"""
+Data Access Layer for maintained counters
+"""
+import sqlite3
+from typing import Dict, Optional
+from .config import get_db
+
+class CounterDAL:
+    @staticmethod
+    def increment(conn: sqlite3.Connection, name: str, delta: int = 1):
+        """Add delta to a counter within the caller's transaction"""
+        conn.execute('''
+            INSERT INTO counters (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+        ''', (name, delta))
+    
+    @staticmethod
+    def get(name: str) -> Optional[int]:
+        """Get a counter value, or None if it has never been set"""
+        with get_db() as conn:
+            row = conn.execute('SELECT value FROM counters WHERE name = ?', (name,)).fetchone()
+            return row[0] if row else None
+    
+    @staticmethod
+    def get_by_prefix(prefix: str) -> Dict[str, int]:
+        """Get all counters whose name starts with prefix"""
+        with get_db() as conn:
+            cursor = conn.execute('SELECT name, value FROM counters WHERE name GLOB ?', (prefix + '*',))
+            return {row['name']: row['value'] for row in cursor.fetchall()}
+    
+    @staticmethod
+    def replace_by_prefix(conn: sqlite3.Connection, prefix: str, values: Dict[str, int]):
+        """Replace every counter under prefix with the given values within the caller's transaction"""
+        conn.execute('DELETE FROM counters WHERE name GLOB ?', (prefix + '*',))
+        conn.executemany('INSERT INTO counters (name, value) VALUES (?, ?)', list(values.items()))
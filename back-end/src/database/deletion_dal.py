@@ -0,0 +1,29 @@
+"""
+Data Access Layer for the log of deleted records, read by incremental sync clients
+"""
+import json
+import sqlite3
+from typing import Any, Dict, List, Optional
+from .config import get_db, EPOCH_TIMESTAMP_TABLES
+
+# Tables whose deletions are logged; the kind of a logged deletion is its table name
+DELETION_KINDS = EPOCH_TIMESTAMP_TABLES
+
+class DeletionDAL:
+    @staticmethod
+    def record(conn: sqlite3.Connection, kind: str, ids: List[str], deleted_at_ms: int):
+        """Log deleted records of one kind within the caller's transaction"""
+        conn.executemany('''
+            INSERT OR REPLACE INTO deletions (kind, id, deleted_at_ms) VALUES (?, ?, ?)
+        ''', [(kind, record_id, deleted_at_ms) for record_id in ids])
+    
+    @staticmethod
+    def get_since(deleted_since: int, kinds: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get the records deleted at or after deleted_since (epoch milliseconds), oldest first"""
+        with get_db() as conn:
+            cursor = conn.execute('''
+                SELECT kind, id, deleted_at_ms FROM deletions
+                WHERE deleted_at_ms >= ? AND kind IN (SELECT value FROM json_each(?))
+                ORDER BY deleted_at_ms, kind, id
+            ''', (deleted_since, json.dumps(list(kinds or DELETION_KINDS))))
+            return [dict(row) for row in cursor.fetchall()]
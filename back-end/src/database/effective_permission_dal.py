@@ -0,0 +1,208 @@
+"""
+Data Access Layer for the materialized effective_permissions table
+"""
+import json
+import sqlite3
+import threading
+from typing import List, Dict, Iterable, Optional, Set, Tuple
+from . import config
+from .config import get_db
+from .counter_dal import CounterDAL
+from .permission_index import IMPLIED_RELATIONS
+
+# Counter set once the mirror has been fully loaded from OpenFGA
+BUILT_COUNTER = 'effective_permissions.built'
+
+# (relation, implied) pairs as a CTE so the hierarchy is applied inside SQLite
+_IMPLICATIONS = [(rel, implied) for rel, implies in IMPLIED_RELATIONS.items() for implied in implies]
+_IMPLICATIONS_CTE = 'implications(relation, implied) AS (VALUES {})'.format(
+    ', '.join('(?, ?)' for _ in _IMPLICATIONS)
+)
+_IMPLICATIONS_PARAMS = [value for pair in _IMPLICATIONS for value in pair]
+
+# Tuple changes recorded while a rebuild is reading from OpenFGA, or None when no rebuild is running
+_rebuild_changes: Optional[List[Tuple[List[Dict[str, str]], List[Dict[str, str]]]]] = None
+_rebuild_changes_lock = threading.Lock()
+_rebuild_run_lock = threading.Lock()
+
+def _subject(user: str) -> str:
+    """Normalize a tuple user: group:<id>#member grants the same access as group:<id>"""
+    return user.split('#', 1)[0] if user.startswith('group:') else user
+
+class EffectivePermissionDAL:
+    @staticmethod
+    def is_enabled() -> bool:
+        """Check whether the table is enabled and has been built"""
+        return config.EFFECTIVE_PERMISSIONS_ENABLED and CounterDAL.get(BUILT_COUNTER) == 1
+
+    @staticmethod
+    def apply_changes(conn: sqlite3.Connection, written: List[Dict[str, str]],
+                      deleted: List[Dict[str, str]]) -> Optional[Tuple[List[Dict[str, str]], List[Dict[str, str]]]]:
+        """Apply tuple changes to the mirror and re-derive the affected rows within the caller's transaction.
+        Returns the written and deleted tuples that changed the mirror, or None if it has not been built"""
+        with _rebuild_changes_lock:
+            if _rebuild_changes is not None:
+                _rebuild_changes.append((written, deleted))
+        if conn.execute('SELECT value FROM counters WHERE name = ?', (BUILT_COUNTER,)).fetchone() is None:
+            return None
+
+        # Pairs are collected before and after the mirror changes so that removed paths are re-derived too
+        affected = EffectivePermissionDAL._affected_pairs(conn, written + deleted)
+
+        changed_deleted = [t for t in deleted if conn.execute('''
+            DELETE FROM relationship_tuples WHERE user = ? AND relation = ? AND object = ?
+        ''', (t['user'], t['relation'], t['object'])).rowcount]
+        changed_written = [t for t in written if conn.execute('''
+            INSERT OR IGNORE INTO relationship_tuples (user, relation, object, subject) VALUES (?, ?, ?, ?)
+        ''', (t['user'], t['relation'], t['object'], _subject(t['user']))).rowcount]
+
+        affected |= EffectivePermissionDAL._affected_pairs(conn, written + deleted)
+        for subject, object_ref in affected:
+            EffectivePermissionDAL._derive_pair(conn, subject, object_ref)
+        return changed_written, changed_deleted
+
+    @staticmethod
+    def _affected_pairs(conn: sqlite3.Connection, tuples: Iterable[Dict[str, str]]) -> Set[Tuple[str, str]]:
+        """Helper method to find the (subject, object) pairs whose effective relations a tuple can change"""
+        pairs = set()
+        for tuple_data in tuples:
+            subject = _subject(tuple_data['user'])
+            object_ref = tuple_data['object']
+            pairs.add((subject, object_ref))
+
+            if tuple_data['relation'] == 'member' and object_ref.startswith('group:'):
+                # Membership changes what the member inherits on everything granted to the group
+                cursor = conn.execute('''
+                    SELECT DISTINCT object FROM relationship_tuples WHERE subject = ? AND relation != 'member'
+                ''', (object_ref,))
+                pairs.update((subject, row[0]) for row in cursor.fetchall())
+            elif subject.startswith('group:'):
+                # A group grant changes what every member inherits on the object
+                cursor = conn.execute('''
+                    SELECT subject FROM relationship_tuples WHERE object = ? AND relation = 'member'
+                ''', (subject,))
+                pairs.update((row[0], object_ref) for row in cursor.fetchall())
+        return pairs
+
+    @staticmethod
+    def _derive_pair(conn: sqlite3.Connection, subject: str, object_ref: str):
+        """Helper method to recompute the effective relations of one subject on one object"""
+        conn.execute('DELETE FROM effective_permissions WHERE subject = ? AND object = ?', (subject, object_ref))
+        conn.execute(f'''
+            WITH {_IMPLICATIONS_CTE},
+            granted(relation) AS (
+                SELECT relation FROM relationship_tuples WHERE subject = ? AND object = ?
+                UNION
+                SELECT t.relation
+                FROM relationship_tuples m
+                JOIN relationship_tuples t ON t.subject = m.object AND t.object = ?
+                WHERE m.subject = ? AND m.relation = 'member' AND t.relation != 'member'
+            )
+            INSERT OR IGNORE INTO effective_permissions (subject, relation, object)
+            SELECT ?, COALESCE(i.implied, g.relation), ?
+            FROM granted g LEFT JOIN implications i ON i.relation = g.relation
+        ''', _IMPLICATIONS_PARAMS + [subject, object_ref, object_ref, subject, subject, object_ref])
+
+    @staticmethod
+    def rebuild() -> int:
+        """Reload the tuple mirror from OpenFGA and re-derive the whole table. Returns the row count.
+
+        Tuples are streamed into temporary staging tables, which take no lock on the database, and
+        swapped in with one short write transaction. Tuple changes recorded meanwhile are replayed
+        after the swap, as the stream may have read past them.
+        """
+        # Imported here because RelationshipDAL records its writes through this module
+        from .relationship_dal import RelationshipDAL
+        global _rebuild_changes
+
+        with _rebuild_run_lock, get_db() as conn:
+            with _rebuild_changes_lock:
+                _rebuild_changes = []
+            try:
+                conn.execute('''
+                    CREATE TEMP TABLE staged_tuples (
+                        user TEXT NOT NULL,
+                        relation TEXT NOT NULL,
+                        object TEXT NOT NULL,
+                        subject TEXT NOT NULL,
+                        PRIMARY KEY (user, relation, object)
+                    ) WITHOUT ROWID
+                ''')
+                conn.execute('''
+                    CREATE TEMP TABLE staged_permissions (
+                        subject TEXT NOT NULL,
+                        relation TEXT NOT NULL,
+                        object TEXT NOT NULL,
+                        PRIMARY KEY (subject, relation, object)
+                    ) WITHOUT ROWID
+                ''')
+                loaded = RelationshipDAL.stream_tuples(lambda page: conn.executemany('''
+                    INSERT OR IGNORE INTO staged_tuples (user, relation, object, subject) VALUES (?, ?, ?, ?)
+                ''', [(t['user'], t['relation'], t['object'], _subject(t['user'])) for t in page]))
+                if not loaded:
+                    conn.rollback()
+                    raise Exception("Failed to read tuples from OpenFGA")
+                EffectivePermissionDAL._derive_all(conn, 'staged_tuples', 'staged_permissions')
+                conn.commit()
+
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute('DELETE FROM relationship_tuples')
+                conn.execute('''
+                    INSERT INTO relationship_tuples (user, relation, object, subject)
+                    SELECT user, relation, object, subject FROM staged_tuples
+                ''')
+                conn.execute('DELETE FROM effective_permissions')
+                conn.execute('''
+                    INSERT INTO effective_permissions (subject, relation, object)
+                    SELECT subject, relation, object FROM staged_permissions
+                ''')
+                conn.execute('''
+                    INSERT INTO counters (name, value) VALUES (?, 1)
+                    ON CONFLICT(name) DO UPDATE SET value = 1
+                ''', (BUILT_COUNTER,))
+                # The write lock is held, so changes recorded from here on wait for the commit and
+                # apply to the new mirror; those recorded during the read are replayed onto it
+                with _rebuild_changes_lock:
+                    changes, _rebuild_changes = _rebuild_changes, None
+                for written, deleted in changes:
+                    EffectivePermissionDAL.apply_changes(conn, written, deleted)
+                conn.commit()
+                return conn.execute('SELECT COUNT(*) FROM effective_permissions').fetchone()[0]
+            finally:
+                with _rebuild_changes_lock:
+                    _rebuild_changes = None
+
+    @staticmethod
+    def _derive_all(conn: sqlite3.Connection, tuples_table: str, permissions_table: str):
+        """Helper method to fill a permissions table from every tuple in a tuples table"""
+        conn.execute(f'''
+            WITH {_IMPLICATIONS_CTE},
+            granted(subject, relation, object) AS (
+                SELECT subject, relation, object FROM {tuples_table}
+                UNION
+                SELECT m.subject, t.relation, t.object
+                FROM {tuples_table} m
+                JOIN {tuples_table} t ON t.subject = m.object
+                WHERE m.relation = 'member' AND t.relation != 'member'
+            )
+            INSERT OR IGNORE INTO {permissions_table} (subject, relation, object)
+            SELECT g.subject, COALESCE(i.implied, g.relation), g.object
+            FROM granted g LEFT JOIN implications i ON i.relation = g.relation
+        ''', _IMPLICATIONS_PARAMS)
+
+    @staticmethod
+    def list_objects(subject: str, relation: str, object_types: List[str]) -> List[str]:
+        """List the objects of the given types the subject holds a relation on"""
+        with get_db() as conn:
+            cursor = conn.execute('''
+                SELECT object FROM effective_permissions
+                WHERE subject = ? AND relation = ?
+                AND substr(object, 1, instr(object, ':') - 1) IN (SELECT value FROM json_each(?))
+                ORDER BY object
+            ''', (subject, relation, json.dumps(object_types)))
+            return [row[0] for row in cursor.fetchall()]
+
+if __name__ == '__main__':
+    # Full rebuild: python -m database.effective_permission_dal (from back-end/src)
+    config.init_database()
+    print(f"✅ Rebuilt effective permissions: {EffectivePermissionDAL.rebuild()} rows")
@@ -0,0 +1,126 @@
+"""
+Data Access Layer for the Permission Matrix
+"""
+import json
+from typing import List, Optional, Dict, Any, Tuple
+from .config import get_db
+from .relationship_dal import RelationshipDAL
+
+# Layout of each entry in the matrix "cells" list
+CELL_FORMAT = ['subject', 'object', 'direct', 'effective']
+
+class PermissionMatrixDAL:
+    @staticmethod
+    def get_matrix(subjects: Optional[List[str]] = None, objects: Optional[List[str]] = None,
+                   resource_group_id: Optional[str] = None,
+                   subject_limit: int = 50, subject_offset: int = 0,
+                   object_limit: int = 50, object_offset: int = 0) -> Dict[str, Any]:
+        """Get a page of the subject x object permission grid.
+
+        Subjects default to every user followed by every user group, and objects default
+        to every resource (optionally within one resource group). Only non-empty cells are
+        returned, as [subject index, object index, direct relations, effective relations].
+        """
+        if subjects is None:
+            subject_refs, subject_total = PermissionMatrixDAL._get_default_subjects(subject_limit, subject_offset)
+        else:
+            subject_refs = subjects[subject_offset:subject_offset + subject_limit]
+            subject_total = len(subjects)
+
+        if objects is None:
+            object_refs, object_total = PermissionMatrixDAL._get_default_objects(resource_group_id, object_limit, object_offset)
+        else:
+            object_refs = objects[object_offset:object_offset + object_limit]
+            object_total = len(objects)
+
+        index = RelationshipDAL.get_permission_index(object_refs) if subject_refs and object_refs else None
+
+        cells = []
+        if index is not None:
+            for subject_idx, subject in enumerate(subject_refs):
+                for object_idx, object_ref in enumerate(object_refs):
+                    effective = index.effective_relations(subject, object_ref)
+                    if effective:
+                        direct = index.direct_relations(subject, object_ref)
+                        cells.append([subject_idx, object_idx, sorted(direct), sorted(effective)])
+
+        names = PermissionMatrixDAL._get_names(subject_refs + object_refs)
+        return {
+            'subjects': [{'ref': ref, 'name': names.get(ref)} for ref in subject_refs],
+            'objects': [{'ref': ref, 'name': names.get(ref)} for ref in object_refs],
+            'cell_format': CELL_FORMAT,
+            'cells': cells,
+            'subject_total': subject_total,
+            'subject_limit': subject_limit,
+            'subject_offset': subject_offset,
+            'object_total': object_total,
+            'object_limit': object_limit,
+            'object_offset': object_offset
+        }
+
+    @staticmethod
+    def _get_default_subjects(limit: int, offset: int) -> Tuple[List[str], int]:
+        """Helper method to page through users followed by user groups"""
+        with get_db() as conn:
+            cursor = conn.execute('''
+                SELECT ref, COUNT(*) OVER () as total_count FROM (
+                    SELECT 'user:' || id as ref, 0 as kind, created_at, id FROM users
+                    UNION ALL
+                    SELECT 'group:' || id as ref, 1 as kind, created_at, id FROM user_groups
+                )
+                ORDER BY kind, created_at DESC, id
+                LIMIT ? OFFSET ?
+            ''', (limit, offset))
+            rows = cursor.fetchall()
+            if rows:
+                return [row['ref'] for row in rows], rows[0]['total_count']
+
+            total = conn.execute('''
+                SELECT (SELECT COUNT(*) FROM users) + (SELECT COUNT(*) FROM user_groups)
+            ''').fetchone()[0]
+            return [], total
+
+    @staticmethod
+    def _get_default_objects(resource_group_id: Optional[str], limit: int, offset: int) -> Tuple[List[str], int]:
+        """Helper method to page through resources as OpenFGA object references"""
+        where = 'WHERE resource_group_id = ?' if resource_group_id else ''
+        params: List[Any] = [resource_group_id] if resource_group_id else []
+
+        with get_db() as conn:
+            cursor = conn.execute(f'''
+                SELECT type || ':' || id as ref, COUNT(*) OVER () as total_count
+                FROM resources {where}
+                ORDER BY created_at DESC, id
+                LIMIT ? OFFSET ?
+            ''', params + [limit, offset])
+            rows = cursor.fetchall()
+            if rows:
+                return [row['ref'] for row in rows], rows[0]['total_count']
+
+            total = conn.execute(f'SELECT COUNT(*) FROM resources {where}', params).fetchone()[0]
+            return [], total
+
+    @staticmethod
+    def _get_names(refs: List[str]) -> Dict[str, str]:
+        """Helper method to resolve display names for users, groups and resources in one query each"""
+        user_ids = [ref.split(':', 1)[1] for ref in refs if ref.startswith('user:')]
+        group_ids = [ref.split(':', 1)[1] for ref in refs if ref.startswith('group:')]
+        resource_ids = [ref.split(':', 1)[1] for ref in refs
+                        if ':' in ref and not ref.startswith(('user:', 'group:'))]
+
+        names = {}
+        with get_db() as conn:
+            for prefix, table, ids in (('user:', 'users', user_ids), ('group:', 'user_groups', group_ids)):
+                if ids:
+                    cursor = conn.execute(f'''
+                        SELECT id, name FROM {table} WHERE id IN (SELECT value FROM json_each(?))
+                    ''', (json.dumps(ids),))
+                    names.update({f"{prefix}{row['id']}": row['name'] for row in cursor.fetchall()})
+
+            if resource_ids:
+                cursor = conn.execute('''
+                    SELECT id, type, name FROM resources WHERE id IN (SELECT value FROM json_each(?))
+                ''', (json.dumps(resource_ids),))
+                names.update({f"{row['type']}:{row['id']}": row['name'] for row in cursor.fetchall()})
+
+        return names
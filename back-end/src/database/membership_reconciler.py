@@ -0,0 +1,195 @@
+"""
+Reconciliation of user_group_members with OpenFGA member tuples
+"""
+import asyncio
+import json
+from typing import List, Optional, Dict, Any, Iterator, Set, Tuple
+from .config import get_db
+from .openfga_outbox import OpenFGAOutbox
+from .relationship_dal import _get_openfga_service_class, READ_AFTER_WRITE_CONSISTENCY
+
+# Groups compared per SQLite query and repairs queued per outbox transaction
+RECONCILE_GROUP_PAGE_SIZE = 100
+# Number of individual repairs listed in a report; the counts always cover every repair
+RECONCILE_REPORT_LIMIT = 100
+
+class MembershipReconciler:
+    @staticmethod
+    def reconcile(group_id: Optional[str] = None, dry_run: bool = False) -> Dict[str, Any]:
+        """Compare SQLite memberships with OpenFGA member tuples and repair the differences.
+
+        SQLite is the source of truth: missing tuples are written and extra tuples deleted.
+        With group_id only that group is checked; otherwise every group is checked, followed by
+        a pass over member tuples of groups that no longer exist. With dry_run nothing is changed.
+
+        Each group's tuples are read before its SQLite members, and every repair is checked against
+        SQLite again when it is queued, so memberships changed during the run are not undone.
+        """
+        if not dry_run:
+            # Send queued changes first so they are not reported as drift
+            OpenFGAOutbox.drain()
+
+        report = {
+            'dry_run': dry_run,
+            'groups_checked': 0,
+            'missing_count': 0,
+            'extra_count': 0,
+            'missing': [],
+            'extra': []
+        }
+        asyncio.run(MembershipReconciler._async_reconcile(group_id, dry_run, report))
+
+        if not dry_run and (report['missing_count'] or report['extra_count']):
+            OpenFGAOutbox.drain()
+        return report
+
+    @staticmethod
+    async def _async_reconcile(group_id: Optional[str], dry_run: bool, report: Dict[str, Any]):
+        """Async helper that diffs group by group over one service connection"""
+        service_class = _get_openfga_service_class()
+        if service_class is None:
+            raise Exception("OpenFGA service class not available")
+
+        service = service_class()
+        await service.initialize()
+
+        try:
+            group_pages = [[group_id]] if group_id is not None else MembershipReconciler._iter_id_pages('user_groups')
+            for group_ids in group_pages:
+                missing, extra = [], []
+                for current_group_id in group_ids:
+                    # OpenFGA returns tuples unordered, so one group's members are sorted in memory
+                    actual = sorted([
+                        tuple_data['user']
+                        async for page in service.iter_tuple_pages(relation='member', object_ref=f"group:{current_group_id}",
+                                                                consistency=READ_AFTER_WRITE_CONSISTENCY)
+                        for tuple_data in page
+                    ])
+                    # Read after OpenFGA: a membership sent in between is then in both
+                    expected = MembershipReconciler._get_member_refs(current_group_id)
+                    group_missing, group_extra = merge_diff(expected, actual)
+                    missing += [_member_tuple(user, current_group_id) for user in group_missing]
+                    extra += [_member_tuple(user, current_group_id) for user in group_extra]
+                    report['groups_checked'] += 1
+                MembershipReconciler._repair(missing, extra, dry_run, report)
+
+            if group_id is None:
+                # Member tuples of deleted groups are invisible to the per-group pass. OpenFGA only reads
+                # by object type together with a user, so each user's group memberships are read a page at a time
+                for user_ids in MembershipReconciler._iter_id_pages('users'):
+                    orphaned = []
+                    for user_id in user_ids:
+                        async for page in service.iter_tuple_pages(user=f"user:{user_id}", relation='member',
+                                                                   object_ref='group:',
+                                                                   consistency=READ_AFTER_WRITE_CONSISTENCY):
+                            known = MembershipReconciler._get_existing_group_ids(
+                                list({tuple_data['object'].split(':', 1)[1] for tuple_data in page})
+                            )
+                            orphaned += [tuple_data for tuple_data in page
+                                         if tuple_data['object'].split(':', 1)[1] not in known]
+                    MembershipReconciler._repair([], orphaned, dry_run, report)
+        finally:
+            await service.close()
+
+    @staticmethod
+    def _iter_id_pages(table: str) -> Iterator[List[str]]:
+        """Helper method to yield the IDs of a table (users or user_groups) in sorted pages"""
+        last_id = ''
+        while True:
+            with get_db() as conn:
+                cursor = conn.execute(f'''
+                    SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?
+                ''', (last_id, RECONCILE_GROUP_PAGE_SIZE))
+                group_ids = [row[0] for row in cursor.fetchall()]
+            if not group_ids:
+                return
+            yield group_ids
+            last_id = group_ids[-1]
+
+    @staticmethod
+    def _get_member_refs(group_id: str) -> List[str]:
+        """Helper method to get a group's members as sorted OpenFGA user references"""
+        with get_db() as conn:
+            cursor = conn.execute('''
+                SELECT 'user:' || user_id FROM user_group_members
+                WHERE user_group_id = ? ORDER BY 1
+            ''', (group_id,))
+            return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def _get_existing_group_ids(group_ids: List[str]) -> Set[str]:
+        """Helper method to find which of the given groups exist"""
+        with get_db() as conn:
+            cursor = conn.execute('''
+                SELECT id FROM user_groups WHERE id IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(group_ids),))
+            return {row[0] for row in cursor.fetchall()}
+
+    @staticmethod
+    def _repair(missing: List[Dict[str, str]], extra: List[Dict[str, str]], dry_run: bool,
+                report: Dict[str, Any]):
+        """Helper method to record repairs in the report and queue them unless dry_run"""
+        if not (missing or extra):
+            return
+        with get_db() as conn:
+            if not dry_run:
+                # Hold the write lock from the check to the enqueue, so no membership change falls in between
+                conn.execute('BEGIN IMMEDIATE')
+            # Drop repairs that memberships changed since the diff have made wrong
+            current = MembershipReconciler._get_current_memberships(conn, missing + extra)
+            missing = [tuple_data for tuple_data in missing if _membership_key(tuple_data) in current]
+            extra = [tuple_data for tuple_data in extra if _membership_key(tuple_data) not in current]
+
+            report['missing_count'] += len(missing)
+            report['extra_count'] += len(extra)
+            report['missing'] += missing[:RECONCILE_REPORT_LIMIT - len(report['missing'])]
+            report['extra'] += extra[:RECONCILE_REPORT_LIMIT - len(report['extra'])]
+
+            if not dry_run:
+                OpenFGAOutbox.enqueue(conn, writes=missing, deletes=extra)
+                conn.commit()
+
+    @staticmethod
+    def _get_current_memberships(conn, tuples: List[Dict[str, str]]) -> Set[Tuple[str, str]]:
+        """Helper method to find which of the given member tuples are memberships in SQLite"""
+        cursor = conn.execute('''
+            SELECT user_group_id, user_id FROM user_group_members
+            WHERE (user_group_id, user_id) IN (
+                SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?)
+            )
+        ''', (json.dumps([list(_membership_key(tuple_data)) for tuple_data in tuples]),))
+        return {(row[0], row[1]) for row in cursor.fetchall()}
+
+def merge_diff(expected: List[str], actual: List[str]) -> Tuple[List[str], List[str]]:
+    """Diff two sorted lists in a single pass. Returns (missing from actual, extra in actual)"""
+    missing, extra = [], []
+    i = j = 0
+    while i < len(expected) and j < len(actual):
+        if expected[i] == actual[j]:
+            i += 1
+            j += 1
+        elif expected[i] < actual[j]:
+            missing.append(expected[i])
+            i += 1
+        else:
+            extra.append(actual[j])
+            j += 1
+    missing.extend(expected[i:])
+    extra.extend(actual[j:])
+    return missing, extra
+
+def _membership_key(tuple_data: Dict[str, str]) -> Tuple[str, str]:
+    """The (group ID, user ID) of a member tuple; the user ID keeps its type unless it is a user"""
+    user = tuple_data['user']
+    return tuple_data['object'].split(':', 1)[1], user[len('user:'):] if user.startswith('user:') else user
+
+def _member_tuple(user: str, group_id: str) -> Dict[str, str]:
+    """Build a member tuple for a group"""
+    return {'user': user, 'relation': 'member', 'object': f"group:{group_id}"}
+
+if __name__ == '__main__':
+    # python -m database.membership_reconciler [--dry-run] [group_id] (from back-end/src)
+    import sys
+    args = [arg for arg in sys.argv[1:] if arg != '--dry-run']
+    result = MembershipReconciler.reconcile(args[0] if args else None, dry_run='--dry-run' in sys.argv)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,217 @@
+"""
+Transactional outbox for OpenFGA tuple changes made alongside SQLite writes
+"""
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import List, Dict, Iterable, Tuple
+from .config import get_db
+from .relationship_dal import READ_AFTER_WRITE_CONSISTENCY, _get_openfga_service_class, _is_unavailable
+from .tuple_changes import record_tuple_changes
+
+# OpenFGA accepts at most 100 tuples per write request
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 100))
+# Seconds between outbox polls when nothing has been queued by this process
+OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', 5))
+# Entries that fail this many times are left in the outbox for inspection and no longer retried
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 8))
+# Bounds of the jittered exponential backoff after a failed drain, in seconds
+OUTBOX_RETRY_BASE_DELAY = 0.5
+OUTBOX_RETRY_MAX_DELAY = 60.0
+
+_wakeup = threading.Event()
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+_drain_lock = threading.Lock()
+
+class OpenFGAOutbox:
+    @staticmethod
+    def enqueue(conn: sqlite3.Connection, writes: Iterable[Dict[str, str]] = (),
+                deletes: Iterable[Dict[str, str]] = ()):
+        """Queue tuple writes and deletes within the caller's SQLite transaction.
+        Call notify() once the transaction has committed"""
+        timestamp = datetime.now().isoformat()
+        rows = [('write', t['user'], t['relation'], t['object'], timestamp) for t in writes]
+        rows += [('delete', t['user'], t['relation'], t['object'], timestamp) for t in deletes]
+        conn.executemany('''
+            INSERT INTO openfga_outbox (operation, user, relation, object, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+
+    @staticmethod
+    def cancel(conn: sqlite3.Connection, refs: List[str]) -> int:
+        """Drop queued changes to tuples that reference the given entities (such as user:<id>), as the
+        object or as the user, within the caller's SQLite transaction. Returns the number dropped"""
+        cursor = conn.execute('''
+            DELETE FROM openfga_outbox
+            WHERE object IN (SELECT value FROM json_each(?1))
+            OR (CASE WHEN instr(user, '#') THEN substr(user, 1, instr(user, '#') - 1) ELSE user END)
+               IN (SELECT value FROM json_each(?1))
+        ''', (json.dumps(refs),))
+        return cursor.rowcount
+
+    @staticmethod
+    def wait_for_sends():
+        """Wait until any drain in progress has finished, so entries it had already read are sent"""
+        with _drain_lock:
+            pass
+
+    @staticmethod
+    def notify():
+        """Wake the dispatcher, starting it if this process has not yet done so"""
+        OpenFGAOutbox.start_dispatcher()
+        _wakeup.set()
+
+    @staticmethod
+    def start_dispatcher():
+        """Start the background thread that drains the outbox"""
+        global _dispatcher
+        with _dispatcher_lock:
+            if _dispatcher is None or not _dispatcher.is_alive():
+                _dispatcher = threading.Thread(target=_run_dispatcher, name='openfga-outbox', daemon=True)
+                _dispatcher.start()
+
+    @staticmethod
+    def get_pending_count() -> int:
+        """Get the number of entries still waiting to be sent"""
+        with get_db() as conn:
+            return conn.execute('''
+                SELECT COUNT(*) FROM openfga_outbox WHERE attempts < ?
+            ''', (OUTBOX_MAX_ATTEMPTS,)).fetchone()[0]
+
+    @staticmethod
+    def drain() -> int:
+        """Send every pending entry to OpenFGA in batched writes. Returns the number of entries processed"""
+        with _drain_lock:
+            if not OpenFGAOutbox._next_batch():
+                return 0
+            return asyncio.run(OpenFGAOutbox._async_drain())
+
+    @staticmethod
+    async def _async_drain() -> int:
+        """Async helper that sends batches over one service connection until the outbox is empty"""
+        service_class = _get_openfga_service_class()
+        if service_class is None:
+            raise Exception("OpenFGA service class not available")
+
+        service = service_class()
+        await service.initialize()
+
+        try:
+            sent = 0
+            while True:
+                batch = OpenFGAOutbox._next_batch()
+                if not batch:
+                    return sent
+                await OpenFGAOutbox._send_batch(service, batch)
+                sent += len(batch)
+        finally:
+            await service.close()
+
+    @staticmethod
+    def _next_batch() -> List[sqlite3.Row]:
+        """Helper method to get the oldest pending entries"""
+        with get_db() as conn:
+            return conn.execute('''
+                SELECT id, operation, user, relation, object FROM openfga_outbox
+                WHERE attempts < ? ORDER BY id LIMIT ?
+            ''', (OUTBOX_MAX_ATTEMPTS, OUTBOX_BATCH_SIZE)).fetchall()
+
+    @staticmethod
+    async def _send_batch(service, batch: List[sqlite3.Row]):
+        """Helper method to send one batch, isolating entries OpenFGA rejects.
+
+        Duplicate writes and missing deletes are rejected rather than ignored, so an accepted batch
+        confirms every change it records. A rejected entry whose tuple is already in the queued state
+        (after a retry of a write that had landed, say) is done, but recorded as unconfirmed.
+        """
+        writes, deletes = _coalesce(batch)
+        try:
+            await service.write_tuples(writes, deletes, on_duplicate='error', on_missing='error')
+        except ValueError as e:
+            if len(batch) == 1:
+                if await OpenFGAOutbox._is_applied(service, batch[0]):
+                    OpenFGAOutbox._remove(batch)
+                    record_tuple_changes(written=writes, deleted=deletes, confirmed=False)
+                    return
+                # Retrying cannot help an entry OpenFGA rejects, so stop retrying it straight away
+                OpenFGAOutbox._mark_failed([row['id'] for row in batch], str(e), permanent=True)
+                return
+            # One invalid tuple rejects the whole request, so retry the entries one at a time
+            for row in batch:
+                await OpenFGAOutbox._send_batch(service, [row])
+            return
+        except Exception as e:
+            # Outages are retried indefinitely; only other failures count towards OUTBOX_MAX_ATTEMPTS
+            if not _is_unavailable(e):
+                OpenFGAOutbox._mark_failed([row['id'] for row in batch], str(e))
+            raise
+
+        OpenFGAOutbox._remove(batch)
+        record_tuple_changes(written=writes, deleted=deletes)
+
+    @staticmethod
+    async def _is_applied(service, row: sqlite3.Row) -> bool:
+        """Helper method to check whether OpenFGA already holds an entry's tuple in the queued state"""
+        try:
+            exists = await service.tuple_exists(row['user'], row['relation'], row['object'],
+                                                consistency=READ_AFTER_WRITE_CONSISTENCY)
+        except Exception as e:
+            if _is_unavailable(e):
+                raise
+            # A tuple OpenFGA cannot even read is invalid rather than applied
+            return False
+        return exists == (row['operation'] == 'write')
+
+    @staticmethod
+    def _remove(batch: List[sqlite3.Row]):
+        """Helper method to drop entries that have been sent"""
+        with get_db() as conn:
+            conn.executemany('DELETE FROM openfga_outbox WHERE id = ?', [(row['id'],) for row in batch])
+            conn.commit()
+
+    @staticmethod
+    def _mark_failed(entry_ids: List[int], error: str, permanent: bool = False):
+        """Helper method to record a failed attempt"""
+        with get_db() as conn:
+            conn.executemany('''
+                UPDATE openfga_outbox
+                SET attempts = CASE WHEN ? THEN ? ELSE attempts + 1 END, last_error = ?
+                WHERE id = ?
+            ''', [(permanent, OUTBOX_MAX_ATTEMPTS, error, entry_id) for entry_id in entry_ids])
+            conn.commit()
+
+def _coalesce(batch: List[sqlite3.Row]) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """Reduce a batch to the last queued operation per tuple, as OpenFGA rejects a request
+    that writes or deletes the same tuple twice"""
+    latest = {}
+    for row in batch:
+        latest[(row['user'], row['relation'], row['object'])] = row['operation']
+
+    writes, deletes = [], []
+    for (user, relation, object_ref), operation in latest.items():
+        tuple_key = {'user': user, 'relation': relation, 'object': object_ref}
+        (writes if operation == 'write' else deletes).append(tuple_key)
+    return writes, deletes
+
+def _run_dispatcher():
+    """Drain the outbox whenever woken or polled, backing off while OpenFGA is failing"""
+    failures = 0
+    while True:
+        _wakeup.wait(OUTBOX_POLL_INTERVAL)
+        _wakeup.clear()
+        try:
+            sent = OpenFGAOutbox.drain()
+            if sent:
+                print(f"📤 Sent {sent} queued OpenFGA tuple changes")
+            failures = 0
+        except Exception as e:
+            failures += 1
+            delay = min(OUTBOX_RETRY_BASE_DELAY * 2 ** failures, OUTBOX_RETRY_MAX_DELAY)
+            print(f"⚠️  OpenFGA outbox drain failed (retrying in {delay:.1f}s): {e}")
+            time.sleep(delay * random.uniform(0.5, 1.0))
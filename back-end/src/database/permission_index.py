@@ -0,0 +1,63 @@
+"""
+Relation hierarchy and local permission helpers for the Rebecca model
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Each relation implies itself and every weaker relation: owner ⊂ editor ⊂ viewer
+IMPLIED_RELATIONS = {
+    'owner': ('owner', 'editor', 'viewer'),
+    'editor': ('editor', 'viewer'),
+    'viewer': ('viewer',),
+}
+
+# Suffix of the model relations that grant access through group membership
+GROUP_RELATION_SUFFIX = '_via_group'
+
+def granting_relations(relation: str) -> List[str]:
+    """Get the relations whose holders also hold the given relation"""
+    return [rel for rel, implied in IMPLIED_RELATIONS.items() if relation in implied]
+
+def granting_model_relations(relation: str) -> List[str]:
+    """Get the model relations (direct and via group) that grant the given relation"""
+    relations = []
+    for rel in granting_relations(relation):
+        relations.append(rel)
+        relations.append(f"{rel}{GROUP_RELATION_SUFFIX}")
+    return relations
+
+def implied_relations(relation: str) -> Tuple[str, ...]:
+    """Get the relations implied by holding the given relation (including itself)"""
+    return IMPLIED_RELATIONS.get(relation, (relation,))
+
+class PermissionIndex:
+    """Hash index over relationship tuples for constant-time direct and effective lookups"""
+
+    def __init__(self, tuples: Iterable[Dict[str, str]] = ()):
+        self._direct: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        self._groups: Dict[str, Set[str]] = defaultdict(set)
+        for tuple_data in tuples:
+            self.add(tuple_data['user'], tuple_data['relation'], tuple_data['object'])
+
+    def add(self, user: str, relation: str, object_ref: str):
+        """Index a single tuple"""
+        # group:<id>#member usersets grant the same access as group:<id>
+        subject = user.split('#', 1)[0] if user.startswith('group:') else user
+        self._direct[(subject, object_ref)].add(relation)
+        if relation == 'member' and object_ref.startswith('group:'):
+            self._groups[subject].add(object_ref)
+
+    def direct_relations(self, subject: str, object_ref: str) -> Set[str]:
+        """Get the relations stored directly between a subject and an object"""
+        return self._direct.get((subject, object_ref), set())
+
+    def effective_relations(self, subject: str, object_ref: str) -> Set[str]:
+        """Get every relation a subject holds on an object through groups and the hierarchy"""
+        granted = set(self.direct_relations(subject, object_ref))
+        for group_ref in self._groups.get(subject, ()):
+            granted.update(self._direct.get((group_ref, object_ref), ()))
+
+        effective = set()
+        for relation in granted:
+            effective.update(implied_relations(relation))
+        return effective
@@ -1,12 +1,22 @@
 """
 Data Access Layer for Relationships - Pure OpenFGA
 """
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+import functools
 import uuid
 import asyncio
 import sys
 import os
 from datetime import datetime
+from .permission_index import PermissionIndex, granting_relations, granting_model_relations
+from .effective_permission_dal import EffectivePermissionDAL
+from .tuple_changes import record_tuple_changes
+
+try:
+    from ..openfga.config import CONSISTENCY_HIGHER
+except ImportError:
+    # database is imported as a top-level package when src is on the path
+    from openfga.config import CONSISTENCY_HIGHER
 
 def get_openfga_service():
     """Get an OpenFGA service instance with robust import handling"""
@@ -41,8 +51,10 @@ def get_openfga_service():
                 # Return a dummy service that does nothing
                 return None
 
+@functools.lru_cache(maxsize=None)
 def _get_openfga_service_class():
-    """Get OpenFGA service class with robust import handling"""
+    """Get OpenFGA service class with robust import handling.
+    Cached, as the failed import attempts before the one that works cost more than the call they guard"""
     try:
         # Try absolute import first
         from src.openfga.service import OpenFGAService
@@ -73,6 +85,48 @@ def _get_openfga_service_class():
                 print(f"❌ Failed to import OpenFGA service: {e}")
                 return None
 
+# Consistency for reads that must observe writes this process has just made. Hot read
+# paths leave consistency unset so OpenFGA can answer from its cache
+READ_AFTER_WRITE_CONSISTENCY = CONSISTENCY_HIGHER
+
+# Tuples per delete request in bulk deletes (the most OpenFGA accepts in one write), and
+# how many of those requests may be in flight at once
+DELETE_BATCH_SIZE = 100
+DELETE_CONCURRENCY = int(os.environ.get('OPENFGA_DELETE_CONCURRENCY', 4))
+
+def _is_unavailable(error: Exception) -> bool:
+    """Check whether an error means OpenFGA could not answer, as opposed to refusing the request"""
+    service_class = _get_openfga_service_class()
+    service_module = sys.modules.get(service_class.__module__) if service_class else None
+    return service_module is not None and isinstance(error, service_module.OpenFGAUnavailableError)
+
+async def _delete_confirmed(service, tuples: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Delete tuples, rejecting missing ones, and return those OpenFGA confirmed this call deleted.
+    A tuple something else deleted first is left out, so it is not recorded twice. Raises ValueError
+    if OpenFGA refuses to delete a tuple that still exists"""
+    try:
+        await service.write_tuples([], tuples, on_missing='error')
+        return list(tuples)
+    except ValueError:
+        if len(tuples) == 1:
+            if await service.tuple_exists(tuples[0]['user'], tuples[0]['relation'], tuples[0]['object'],
+                                          consistency=READ_AFTER_WRITE_CONSISTENCY):
+                raise
+            return []
+    # One missing or invalid tuple rejects the whole request, so delete the tuples one at a time
+    confirmed = []
+    for tuple_data in tuples:
+        confirmed += await _delete_confirmed(service, [tuple_data])
+    return confirmed
+
+def _get_model_codec():
+    """Get the codec compiled from the authorization model, or None if the service is unavailable"""
+    service_class = _get_openfga_service_class()
+    return service_class.codec if service_class else None
+
+class RelationshipExistsError(Exception):
+    """Raised when an update would turn a relationship into one that already exists"""
+
 def generate_id() -> str:
     """Generate a unique ID"""
     return str(uuid.uuid4())
@@ -84,48 +138,36 @@ def get_timestamp() -> str:
 class RelationshipDAL:
     @staticmethod
     def get_all(user_filter: Optional[str] = None, resource_filter: Optional[str] = None,
-                relation_filter: Optional[str] = None, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+                relation_filter: Optional[str] = None, limit: int = 100, offset: int = 0,
+                consistency: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get all relationships from OpenFGA"""
         try:
             import asyncio
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
             try:
-                result = loop.run_until_complete(RelationshipDAL._async_get_all_openfga(user_filter, resource_filter, relation_filter))
+                result = loop.run_until_complete(RelationshipDAL._async_get_all_openfga(user_filter, resource_filter, relation_filter, consistency))
                 return result[:limit] if limit > 0 else result  # Simple client-side limiting
             finally:
                 loop.close()
         except Exception as e:
+            if _is_unavailable(e):
+                raise
             print(f"⚠️  OpenFGA read failed: {e}")
             return []
     
     @staticmethod
     def get_by_id(relationship_id: str) -> Optional[Dict[str, Any]]:
-        """Get relationship by ID from OpenFGA (ID format: user:relation:object)"""
+        """Get relationship by ID from OpenFGA"""
         try:
-            # Parse the relationship ID by finding the relation in the middle
-            known_relations = ['owner', 'editor', 'viewer', 'member']
-            
-            user_part = None
-            relation_part = None
-            object_part = None
-            
-            # Try to find the relation in the ID
-            for rel in known_relations:
-                rel_pattern = f":{rel}:"
-                if rel_pattern in relationship_id:
-                    parts = relationship_id.split(rel_pattern, 1)
-                    if len(parts) == 2:
-                        user_part = parts[0]
-                        relation_part = rel
-                        object_part = parts[1]
-                        break
-            
-            if not (user_part and relation_part and object_part):
+            parsed = RelationshipDAL.parse_id(relationship_id)
+            if not parsed:
                 return None
+            user_part, relation_part, object_part = parsed
             
-            # Check if this specific relationship exists in OpenFGA
-            if RelationshipDAL.check_relationship(user_part, relation_part, object_part):
+            # Check if this specific relationship exists in OpenFGA (it may have just been written)
+            if RelationshipDAL.check_relationship(user_part, relation_part, object_part,
+                                                  consistency=READ_AFTER_WRITE_CONSISTENCY):
                 return {
                     'id': relationship_id,
                     'user': user_part,
@@ -136,13 +178,39 @@ class RelationshipDAL:
                 }
             return None
         except Exception as e:
+            if _is_unavailable(e):
+                raise
             print(f"⚠️  Failed to get relationship by ID: {e}")
             return None
     
+    @staticmethod
+    def parse_id(relationship_id: str) -> Optional[Tuple[str, str, str]]:
+        """Decode a relationship ID into (user, relation, object).
+        Returns None if the ID is malformed or names a tuple the model does not allow"""
+        codec = _get_model_codec()
+        parsed = codec.decode_id(relationship_id) if codec else None
+        if not parsed:
+            return None
+        try:
+            codec.validate_tuple(*parsed)
+        except ValueError:
+            return None
+        return parsed
+    
+    @staticmethod
+    def validate(user: str, relation: str, object_ref: str):
+        """Raise ValueError unless the tuple can be written under the authorization model"""
+        codec = _get_model_codec()
+        if codec is None:
+            raise Exception("OpenFGA service class not available")
+        codec.validate_tuple(user, relation, object_ref)
+    
     @staticmethod
     def create(user: str, relation: str, object_ref: str) -> Dict[str, Any]:
-        """Create a new relationship in OpenFGA only"""
-        relationship_id = f"{user}:{relation}:{object_ref}"
+        """Create a new relationship in OpenFGA only. Raises ValueError for a tuple the model does not allow,
+        RelationshipExistsError if it already exists and an exception if OpenFGA did not accept it"""
+        RelationshipDAL.validate(user, relation, object_ref)
+        relationship_id = _get_model_codec().encode_id(user, relation, object_ref)
         timestamp = get_timestamp()
         
         relationship_data = {
@@ -160,109 +228,135 @@ class RelationshipDAL:
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
             try:
-                loop.run_until_complete(RelationshipDAL._async_create_openfga(user, relation, object_ref))
+                written = loop.run_until_complete(RelationshipDAL._async_create_openfga(user, relation, object_ref))
+                if not written:
+                    raise Exception("OpenFGA did not accept the write")
+                record_tuple_changes(written=[{'user': user, 'relation': relation, 'object': object_ref}])
                 print(f"✅ Created relationship in OpenFGA: {user} {relation} {object_ref}")
             finally:
                 loop.close()
         except Exception as e:
+            if _is_unavailable(e) or isinstance(e, RelationshipExistsError):
+                raise
             print(f"❌ OpenFGA write failed: {e}")
             raise Exception(f"Failed to create relationship: {e}")
         
         return relationship_data
     
     @staticmethod
-    async def _async_create_openfga(user: str, relation: str, object_ref: str):
-        """Async helper to create relationship in OpenFGA"""
+    async def _async_create_openfga(user: str, relation: str, object_ref: str) -> bool:
+        """Async helper to create relationship in OpenFGA. Returns False if OpenFGA rejects the write,
+        and raises RelationshipExistsError if that is because the tuple exists"""
         service_class = _get_openfga_service_class()
         if service_class is None:
             print("❌ OpenFGA service class not available")
-            return
+            return False
         
         service = service_class()
         await service.initialize()
         
         try:
-            await service.write_tuple(user, relation, object_ref)
+            if await service.write_tuple(user, relation, object_ref):
+                return True
+            # A concurrent create may have written the same tuple since the caller checked
+            if await service.tuple_exists(user, relation, object_ref, consistency=READ_AFTER_WRITE_CONSISTENCY):
+                raise RelationshipExistsError("Relationship already exists")
+            return False
         finally:
             await service.close()
     
     @staticmethod
     def update(relationship_id: str, user: Optional[str] = None, relation: Optional[str] = None,
                object_ref: Optional[str] = None) -> Optional[Dict[str, Any]]:
-        """Update relationship in OpenFGA (delete old, create new)"""
+        """Update relationship in OpenFGA by deleting the old tuple and writing the new one in a single
+        atomic write. Returns None if the old tuple does not exist, in which case nothing is changed.
+        Raises ValueError if the updated tuple is not allowed by the model, before anything is changed,
+        and RelationshipExistsError if it already exists"""
+        parsed = RelationshipDAL.parse_id(relationship_id)
+        if not parsed:
+            print(f"❌ Could not parse relationship ID: {relationship_id}")
+            return None
+        current_user, current_relation, current_object = parsed
+        
+        # Use provided values or keep current ones
+        new_user = user if user is not None else current_user
+        new_relation = relation if relation is not None else current_relation
+        new_object_ref = object_ref if object_ref is not None else current_object
+        RelationshipDAL.validate(new_user, new_relation, new_object_ref)
+        old_tuple = {'user': current_user, 'relation': current_relation, 'object': current_object}
+        new_tuple = {'user': new_user, 'relation': new_relation, 'object': new_object_ref}
+        
         try:
-            # Parse the current relationship ID by finding the relation in the middle
-            # Expected format: user_part:relation:object_part
-            # Known relations: owner, editor, viewer, member
-            known_relations = ['owner', 'editor', 'viewer', 'member']
-            
-            current_user = None
-            current_relation = None
-            current_object = None
-            
-            # Try to find the relation in the ID
-            for rel in known_relations:
-                rel_pattern = f":{rel}:"
-                if rel_pattern in relationship_id:
-                    parts = relationship_id.split(rel_pattern, 1)
-                    if len(parts) == 2:
-                        current_user = parts[0]
-                        current_relation = rel
-                        current_object = parts[1]
-                        break
-            
-            if not (current_user and current_relation and current_object):
-                print(f"❌ Could not parse relationship ID: {relationship_id}")
-                return None
-            
-            print(f"🔍 Parsed relationship: {current_user} {current_relation} {current_object}")
-            
-            # Use provided values or keep current ones
-            new_user = user if user is not None else current_user
-            new_relation = relation if relation is not None else current_relation
-            new_object_ref = object_ref if object_ref is not None else current_object
-            
             print(f"🔄 Updating: {current_user} {current_relation} {current_object} -> {new_user} {new_relation} {new_object_ref}")
             
-            # Delete the old relationship
-            if not RelationshipDAL.delete(relationship_id):
-                print(f"❌ Failed to delete old relationship: {relationship_id}")
-                return None
-            
-            # Create the new relationship
-            result = RelationshipDAL.create(new_user, new_relation, new_object_ref)
-            print(f"✅ Created new relationship: {result}")
-            return result
-            
+            import asyncio
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                if not loop.run_until_complete(RelationshipDAL._async_update_openfga(old_tuple, new_tuple)):
+                    return None
+            finally:
+                loop.close()
         except Exception as e:
+            if _is_unavailable(e) or isinstance(e, RelationshipExistsError):
+                raise
             print(f"❌ Failed to update relationship: {e}")
             return None
+        
+        if new_tuple != old_tuple:
+            record_tuple_changes(written=[new_tuple], deleted=[old_tuple])
+        print(f"✅ Updated relationship: {new_user} {new_relation} {new_object_ref}")
+        
+        timestamp = get_timestamp()
+        return {
+            'id': _get_model_codec().encode_id(new_user, new_relation, new_object_ref),
+            **new_tuple,
+            'created_at': timestamp,
+            'updated_at': timestamp
+        }
+    
+    @staticmethod
+    async def _async_update_openfga(old_tuple: Dict[str, str], new_tuple: Dict[str, str]) -> bool:
+        """Async helper that replaces a tuple with one write request. Returns False if the old tuple does
+        not exist; raises RelationshipExistsError rather than merging into an existing new tuple"""
+        service_class = _get_openfga_service_class()
+        if service_class is None:
+            raise Exception("OpenFGA service class not available")
+        
+        service = service_class()
+        await service.initialize()
+        
+        try:
+            # OpenFGA rejects a request that deletes and writes the same tuple, so an unchanged
+            # tuple only has to exist
+            if new_tuple == old_tuple:
+                return await service.tuple_exists(old_tuple['user'], old_tuple['relation'], old_tuple['object'],
+                                                  consistency=READ_AFTER_WRITE_CONSISTENCY)
+            await service.write_tuples([new_tuple], [old_tuple], on_duplicate='error', on_missing='error')
+            return True
+        except ValueError as e:
+            # Rejected because the old tuple does not exist or the new one does; a missing old tuple
+            # is reported first, whether or not the new one exists
+            old_exists = await service.tuple_exists(old_tuple['user'], old_tuple['relation'], old_tuple['object'],
+                                                    consistency=READ_AFTER_WRITE_CONSISTENCY)
+            if old_exists and await service.tuple_exists(new_tuple['user'], new_tuple['relation'], new_tuple['object'],
+                                                         consistency=READ_AFTER_WRITE_CONSISTENCY):
+                raise RelationshipExistsError("Relationship already exists")
+            print(f"❌ OpenFGA rejected relationship update: {e}")
+            return False
+        finally:
+            await service.close()
     
     @staticmethod
     def delete(relationship_id: str) -> bool:
-        """Delete relationship from OpenFGA only (ID format: user:relation:object)"""
+        """Delete relationship from OpenFGA only. Returns False if it does not exist; raises
+        OpenFGAUnavailableError when OpenFGA cannot answer"""
         try:
-            # Parse the relationship ID by finding the relation in the middle
-            known_relations = ['owner', 'editor', 'viewer', 'member']
-            
-            user_part = None
-            relation_part = None
-            object_part = None
-            
-            # Try to find the relation in the ID
-            for rel in known_relations:
-                rel_pattern = f":{rel}:"
-                if rel_pattern in relationship_id:
-                    parts = relationship_id.split(rel_pattern, 1)
-                    if len(parts) == 2:
-                        user_part = parts[0]
-                        relation_part = rel
-                        object_part = parts[1]
-                        break
-            
-            if not (user_part and relation_part and object_part):
+            parsed = RelationshipDAL.parse_id(relationship_id)
+            if not parsed:
                 print(f"❌ Could not parse relationship ID for deletion: {relationship_id}")
                 return False
+            user_part, relation_part, object_part = parsed
             
             print(f"🗑️  Deleting relationship: {user_part} {relation_part} {object_part}")
             
@@ -271,50 +365,66 @@ class RelationshipDAL:
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
             try:
-                loop.run_until_complete(RelationshipDAL._async_delete_openfga(user_part, relation_part, object_part))
+                deleted = loop.run_until_complete(RelationshipDAL._async_delete_openfga(user_part, relation_part, object_part))
+                if not deleted:
+                    print(f"❌ OpenFGA did not delete relationship: {user_part} {relation_part} {object_part}")
+                    return False
+                record_tuple_changes(deleted=[{'user': user_part, 'relation': relation_part, 'object': object_part}])
                 print(f"✅ Deleted relationship from OpenFGA: {user_part} {relation_part} {object_part}")
                 return True
             finally:
                 loop.close()
         except Exception as e:
+            if _is_unavailable(e):
+                raise
             print(f"❌ OpenFGA delete failed: {e}")
             return False
     
     @staticmethod
-    async def _async_delete_openfga(user: str, relation: str, object_ref: str):
+    async def _async_delete_openfga(user: str, relation: str, object_ref: str) -> bool:
         """Async helper to delete relationship from OpenFGA"""
         service_class = _get_openfga_service_class()
         if service_class is None:
             print("❌ OpenFGA service class not available")
-            return
+            return False
         
         service = service_class()
         await service.initialize()
         
         try:
-            await service.delete_tuple(user, relation, object_ref)
+            return await service.delete_tuple(user, relation, object_ref)
         finally:
             await service.close()
     
     @staticmethod
-    def check_relationship(user: str, relation: str, object_ref: str) -> bool:
+    def check_relationship(user: str, relation: str, object_ref: str, consistency: Optional[str] = None) -> bool:
         """Check if a specific relationship exists using OpenFGA"""
+        codec = _get_model_codec()
+        try:
+            if codec:
+                codec.validate_check(user, relation, object_ref)
+        except ValueError:
+            # The model cannot grant it, so there is nothing to ask OpenFGA
+            return False
         try:
             # Create a new event loop for this operation
             import asyncio
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
             try:
-                result = loop.run_until_complete(RelationshipDAL._async_check_relationship(user, relation, object_ref))
+                result = loop.run_until_complete(RelationshipDAL._async_check_relationship(user, relation, object_ref, consistency))
                 return result
             finally:
                 loop.close()
         except Exception as e:
+            if _is_unavailable(e):
+                raise
             print(f"❌ OpenFGA check failed: {e}")
             return False
     
     @staticmethod
-    async def _async_check_relationship(user: str, relation: str, object_ref: str) -> bool:
+    async def _async_check_relationship(user: str, relation: str, object_ref: str,
+                                        consistency: Optional[str] = None) -> bool:
         """Async version of check_relationship using OpenFGA"""
         service_class = _get_openfga_service_class()
         if service_class is None:
@@ -325,7 +435,7 @@ class RelationshipDAL:
         await service.initialize()
         
         try:
-            result = await service.check_permission(user, relation, object_ref)
+            result = await service.check_permission(user, relation, object_ref, consistency=consistency)
             return result
         finally:
             await service.close()
@@ -340,36 +450,351 @@ class RelationshipDAL:
         """Get all relationships for a specific object from OpenFGA"""
         return RelationshipDAL.get_all(resource_filter=object_ref)
     
+    @staticmethod
+    def list_accessible_objects(user: str, relation: str, object_types: List[str]) -> List[str]:
+        """List the objects of the given types the user holds a relation on, directly, through a
+        stronger relation or through group membership, using OpenFGA ListObjects"""
+        if EffectivePermissionDAL.is_enabled():
+            return EffectivePermissionDAL.list_objects(user, relation, object_types)
+
+        try:
+            import asyncio
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                return loop.run_until_complete(RelationshipDAL._async_list_accessible_objects(user, relation, object_types))
+            finally:
+                loop.close()
+        except Exception as e:
+            if _is_unavailable(e):
+                raise
+            print(f"❌ OpenFGA list objects failed: {e}")
+            return []
+    
+    @staticmethod
+    async def _async_list_accessible_objects(user: str, relation: str, object_types: List[str]) -> List[str]:
+        """Async helper that unions ListObjects over every type and every relation granting the requested one"""
+        service_class = _get_openfga_service_class()
+        if service_class is None:
+            print("❌ OpenFGA service class not available")
+            return []
+        
+        service = service_class()
+        await service.initialize()
+        
+        try:
+            results = await asyncio.gather(*[
+                service.list_objects(user, model_relation, object_type)
+                for object_type in object_types
+                for model_relation in granting_model_relations(relation)
+            ])
+            objects = set()
+            for result in results:
+                objects.update(result)
+            return sorted(objects)
+        finally:
+            await service.close()
+    
+    @staticmethod
+    def list_principals(object_ref: str, relation: str) -> List[Dict[str, Any]]:
+        """List the users holding a relation on an object, expanding group grants into
+        their members. Returns entries sorted by user with the relations and grant paths"""
+        try:
+            import asyncio
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                return loop.run_until_complete(RelationshipDAL._async_list_principals(object_ref, relation))
+            finally:
+                loop.close()
+        except Exception as e:
+            if _is_unavailable(e):
+                raise
+            print(f"❌ OpenFGA principal expansion failed: {e}")
+            return []
+
+    @staticmethod
+    async def _async_list_principals(object_ref: str, relation: str) -> List[Dict[str, Any]]:
+        """Async helper that reads the object's tuples once and each granted group's members concurrently"""
+        service_class = _get_openfga_service_class()
+        if service_class is None:
+            print("❌ OpenFGA service class not available")
+            return []
+
+        service = service_class()
+        await service.initialize()
+
+        try:
+            granting = set(granting_relations(relation))
+            object_tuples = await service.read_all_tuples(object_ref=object_ref)
+
+            principals: Dict[str, Dict[str, set]] = {}
+            group_grants: Dict[str, set] = {}
+            for tuple_data in object_tuples:
+                if tuple_data['relation'] not in granting:
+                    continue
+                subject = tuple_data['user']
+                if subject.startswith('user:'):
+                    entry = principals.setdefault(subject, {'relations': set(), 'via': set()})
+                    entry['relations'].add(tuple_data['relation'])
+                    entry['via'].add('direct')
+                elif subject.startswith('group:'):
+                    # Both group:<id> and group:<id>#member grant access to the group's members
+                    group_ref = subject.split('#', 1)[0]
+                    group_grants.setdefault(group_ref, set()).add(tuple_data['relation'])
+
+            group_refs = sorted(group_grants)
+            memberships = await asyncio.gather(*[
+                service.read_all_tuples(relation='member', object_ref=group_ref)
+                for group_ref in group_refs
+            ])
+            for group_ref, members in zip(group_refs, memberships):
+                for member in members:
+                    if not member['user'].startswith('user:'):
+                        continue
+                    entry = principals.setdefault(member['user'], {'relations': set(), 'via': set()})
+                    entry['relations'].update(group_grants[group_ref])
+                    entry['via'].add(group_ref)
+
+            return [
+                {
+                    'user': user_ref,
+                    'relations': sorted(entry['relations']),
+                    'via': sorted(entry['via'])
+                }
+                for user_ref, entry in sorted(principals.items())
+            ]
+        finally:
+            await service.close()
+
+    @staticmethod
+    def get_permission_index(object_refs: List[str]) -> PermissionIndex:
+        """Build a permission index over the tuples of the given objects and the
+        memberships of every group granted on them"""
+        try:
+            import asyncio
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                return loop.run_until_complete(RelationshipDAL._async_get_permission_index(object_refs))
+            finally:
+                loop.close()
+        except Exception as e:
+            if _is_unavailable(e):
+                raise
+            print(f"❌ OpenFGA permission index build failed: {e}")
+            return PermissionIndex()
+
+    @staticmethod
+    async def _async_get_permission_index(object_refs: List[str]) -> PermissionIndex:
+        """Async helper that reads each object's tuples and the granted groups' members concurrently"""
+        index = PermissionIndex()
+        service_class = _get_openfga_service_class()
+        if service_class is None:
+            print("❌ OpenFGA service class not available")
+            return index
+
+        service = service_class()
+        await service.initialize()
+
+        try:
+            object_tuples = await asyncio.gather(*[
+                service.read_all_tuples(object_ref=object_ref) for object_ref in object_refs
+            ])
+            group_refs = set()
+            for tuples in object_tuples:
+                for tuple_data in tuples:
+                    index.add(tuple_data['user'], tuple_data['relation'], tuple_data['object'])
+                    if tuple_data['user'].startswith('group:'):
+                        group_refs.add(tuple_data['user'].split('#', 1)[0])
+
+            memberships = await asyncio.gather(*[
+                service.read_all_tuples(relation='member', object_ref=group_ref) for group_ref in sorted(group_refs)
+            ])
+            for members in memberships:
+                for tuple_data in members:
+                    index.add(tuple_data['user'], tuple_data['relation'], tuple_data['object'])
+
+            return index
+        finally:
+            await service.close()
+
+    @staticmethod
+    def stream_tuples(on_page) -> bool:
+        """Read every tuple in OpenFGA page by page, passing each page to on_page.
+        Returns False if the read fails part-way"""
+        try:
+            import asyncio
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                return loop.run_until_complete(RelationshipDAL._async_stream_tuples(on_page))
+            finally:
+                loop.close()
+        except Exception as e:
+            print(f"❌ OpenFGA tuple stream failed: {e}")
+            return False
+
+    @staticmethod
+    async def _async_stream_tuples(on_page) -> bool:
+        """Async helper that hands each page to the callback without accumulating them"""
+        service_class = _get_openfga_service_class()
+        if service_class is None:
+            raise Exception("OpenFGA service class not available")
+
+        service = service_class()
+        await service.initialize()
+
+        try:
+            async for page in service.iter_tuple_pages(consistency=READ_AFTER_WRITE_CONSISTENCY):
+                on_page(page)
+            return True
+        finally:
+            await service.close()
+
+    @staticmethod
+    def count_by_relation() -> Optional[Dict[str, int]]:
+        """Count every tuple in OpenFGA by relation, page by page. Returns None if the read fails"""
+        try:
+            import asyncio
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                return loop.run_until_complete(RelationshipDAL._async_count_by_relation())
+            finally:
+                loop.close()
+        except Exception as e:
+            print(f"❌ OpenFGA tuple count failed: {e}")
+            return None
+
+    @staticmethod
+    async def _async_count_by_relation() -> Dict[str, int]:
+        """Async helper that streams tuple pages without holding them in memory"""
+        service_class = _get_openfga_service_class()
+        if service_class is None:
+            raise Exception("OpenFGA service class not available")
+
+        service = service_class()
+        await service.initialize()
+
+        try:
+            counts: Dict[str, int] = {}
+            async for page in service.iter_tuple_pages(consistency=READ_AFTER_WRITE_CONSISTENCY):
+                for tuple_data in page:
+                    counts[tuple_data['relation']] = counts.get(tuple_data['relation'], 0) + 1
+            return counts
+        finally:
+            await service.close()
+
     @staticmethod
     def relationship_exists(user: str, relation: str, object_ref: str) -> bool:
         """Check if a relationship already exists (for duplicate prevention)"""
-        return RelationshipDAL.check_relationship(user, relation, object_ref)
+        return RelationshipDAL.check_relationship(user, relation, object_ref, consistency=READ_AFTER_WRITE_CONSISTENCY)
     
     @staticmethod
     def delete_by_criteria(user: Optional[str] = None, relation: Optional[str] = None,
                           object_ref: Optional[str] = None) -> int:
-        """Delete relationships matching criteria from OpenFGA. Returns number of deleted relationships."""
+        """Delete relationships matching criteria from OpenFGA. Returns number of deleted relationships.
+        Raises ValueError for a relation without a user or object, which OpenFGA cannot read by"""
         if not any([user, relation, object_ref]):
             return 0  # Don't delete everything by accident
+        if not user and not object_ref:
+            raise ValueError("Deleting by relation needs a user or an object as well")
         
         try:
-            # First, get all relationships matching the criteria
-            relationships = RelationshipDAL.get_all(user_filter=user, resource_filter=object_ref, relation_filter=relation)
-            
-            # Delete each relationship
-            deleted_count = 0
-            for rel in relationships:
-                if RelationshipDAL.delete(rel['id']):
-                    deleted_count += 1
-            
-            return deleted_count
+            import asyncio
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                return loop.run_until_complete(RelationshipDAL._async_delete_by_criteria(user, relation, object_ref))
+            finally:
+                loop.close()
         except Exception as e:
+            if _is_unavailable(e):
+                raise
             print(f"❌ Failed to delete relationships by criteria: {e}")
             return 0
     
+    @staticmethod
+    async def _async_delete_by_criteria(user: Optional[str], relation: Optional[str],
+                                        object_ref: Optional[str]) -> int:
+        """Async helper that deletes the matching tuples over one service connection, a window of
+        DELETE_CONCURRENCY pages at a time: the pages are read, then deleted as concurrent batches
+        of DELETE_BATCH_SIZE.
+
+        Reading starts again from the first page after each window, as continuation tokens may not
+        survive the deletion of the tuples they point past. Only deletes OpenFGA confirms are counted,
+        so tuples another writer removes first are not.
+        """
+        service_class = _get_openfga_service_class()
+        if service_class is None:
+            raise Exception("OpenFGA service class not available")
+        
+        service = service_class()
+        await service.initialize()
+        
+        try:
+            # OpenFGA reads need an object or object type, so without an object read each type with the relation
+            if object_ref:
+                object_refs = [object_ref]
+            else:
+                object_refs = [f"{object_type}:" for object_type, relations in service.codec.relations.items()
+                               if relations and (not relation or relation in relations)]
+            
+            semaphore = asyncio.Semaphore(DELETE_CONCURRENCY)
+            
+            async def delete_batch(batch: List[Dict[str, str]]) -> int:
+                try:
+                    async with semaphore:
+                        confirmed = await _delete_confirmed(service, batch)
+                except ValueError as e:
+                    # A rejected tuple fails the whole request, so isolate it
+                    if len(batch) == 1:
+                        print(f"❌ OpenFGA rejected delete of {batch[0]}: {e}")
+                        return 0
+                    return sum([await delete_batch([tuple_data]) for tuple_data in batch])
+                record_tuple_changes(deleted=confirmed)
+                return len(confirmed)
+            
+            deleted = 0
+            failures = []
+            for ref in object_refs:
+                while not failures:
+                    window = []
+                    pages = service.iter_tuple_pages(user, relation, ref, page_size=DELETE_BATCH_SIZE,
+                                                     consistency=READ_AFTER_WRITE_CONSISTENCY)
+                    try:
+                        async for page in pages:
+                            if page:
+                                window.append(page)
+                            if len(window) == DELETE_CONCURRENCY:
+                                break
+                    finally:
+                        await pages.aclose()
+                    if not window:
+                        break
+                    
+                    results = await asyncio.gather(*[delete_batch(page) for page in window], return_exceptions=True)
+                    window_deleted = sum(result for result in results if not isinstance(result, BaseException))
+                    failures = [result for result in results if isinstance(result, BaseException)]
+                    deleted += window_deleted
+                    if not window_deleted:
+                        # Only tuples OpenFGA refuses to delete are left
+                        break
+            
+            for failure in failures:
+                print(f"❌ Batched relationship delete failed: {failure}")
+            if failures and not deleted and any(_is_unavailable(failure) for failure in failures):
+                # Nothing was deleted because OpenFGA is down; report that rather than zero matches
+                raise failures[0]
+            return deleted
+        finally:
+            await service.close()
+    
     @staticmethod
     async def _async_get_all_openfga(user_filter: Optional[str] = None, resource_filter: Optional[str] = None,
-                                   relation_filter: Optional[str] = None) -> List[Dict[str, Any]]:
+                                   relation_filter: Optional[str] = None,
+                                   consistency: Optional[str] = None) -> List[Dict[str, Any]]:
         """Async helper to get all relationships from OpenFGA"""
         service_class = _get_openfga_service_class()
         if service_class is None:
@@ -384,14 +809,15 @@ class RelationshipDAL:
             tuples = await service.read_tuples(
                 user=user_filter, 
                 relation=relation_filter, 
-                object_ref=resource_filter
+                object_ref=resource_filter,
+                consistency=consistency
             )
             
             # Convert to the expected format with IDs and timestamps
             relationships = []
             for tuple_data in tuples:
                 relationships.append({
-                    'id': f"{tuple_data['user']}:{tuple_data['relation']}:{tuple_data['object']}",  # Generate consistent ID
+                    'id': service.codec.encode_id(tuple_data['user'], tuple_data['relation'], tuple_data['object']),
                     'user': tuple_data['user'],
                     'relation': tuple_data['relation'], 
                     'object': tuple_data['object'],
@@ -1,9 +1,15 @@
 """
 Data Access Layer for Resources
 """
+import base64
 import json
-from typing import List, Optional, Dict, Any
-from .config import get_db
+from typing import List, Optional, Dict, Any, Tuple
+from .cleanup_jobs import CleanupJobs
+from .config import get_db, epoch_ms, metadata_key_expression
+from .deletion_dal import DeletionDAL
+from .openfga_outbox import OpenFGAOutbox
+from .relationship_dal import RelationshipDAL
+from .versions import bump_versions
 import uuid
 from datetime import datetime
 
@@ -17,15 +23,18 @@ def get_timestamp() -> str:
 
 class ResourceDAL:
     @staticmethod
-    def get_all() -> List[Dict[str, Any]]:
-        """Get all resources"""
+    def get_all(metadata: Optional[Dict[str, str]] = None, updated_since: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get all resources, optionally only those whose metadata matches every given key and that were
+        created or updated at or after updated_since (epoch milliseconds). Raises ValueError for invalid metadata keys"""
+        where, params = ResourceDAL._filter(metadata, updated_since)
         with get_db() as conn:
-            cursor = conn.execute('''
+            cursor = conn.execute(f'''
                 SELECT r.*, rg.name as resource_group_name
                 FROM resources r
                 LEFT JOIN resource_groups rg ON r.resource_group_id = rg.id
+                {'WHERE ' + where if where else ''}
                 ORDER BY r.created_at DESC
-            ''')
+            ''', params)
             resources = []
             for row in cursor.fetchall():
                 resource = dict(row)
@@ -57,11 +66,179 @@ class ResourceDAL:
                 return resource
             return None
     
+    @staticmethod
+    def get_by_ids(resource_ids: List[str], resource_type: Optional[str] = None,
+                   limit: int = 100, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """Get a page of the given resources in a single query. Returns (resources, total)"""
+        if not resource_ids:
+            return [], 0
+
+        query = '''
+            SELECT r.*, rg.name as resource_group_name, COUNT(*) OVER () as total_count
+            FROM resources r
+            LEFT JOIN resource_groups rg ON r.resource_group_id = rg.id
+            WHERE r.id IN (SELECT value FROM json_each(?))
+        '''
+        params: List[Any] = [json.dumps(resource_ids)]
+        if resource_type:
+            query += ' AND r.type = ?'
+            params.append(resource_type)
+        query += ' ORDER BY r.created_at DESC, r.id LIMIT ? OFFSET ?'
+        params.extend([limit, offset])
+
+        with get_db() as conn:
+            cursor = conn.execute(query, params)
+            resources = []
+            total = 0
+            for row in cursor.fetchall():
+                resource = dict(row)
+                total = resource.pop('total_count')
+                try:
+                    resource['metadata'] = json.loads(resource['metadata']) if resource['metadata'] else {}
+                except json.JSONDecodeError:
+                    resource['metadata'] = {}
+                resources.append(resource)
+
+            if not resources and offset > 0:
+                # Window count is unavailable past the last page, count separately
+                count_query = 'SELECT COUNT(*) FROM resources WHERE id IN (SELECT value FROM json_each(?))'
+                count_params: List[Any] = [json.dumps(resource_ids)]
+                if resource_type:
+                    count_query += ' AND type = ?'
+                    count_params.append(resource_type)
+                total = conn.execute(count_query, count_params).fetchone()[0]
+
+            return resources, total
+
+    @staticmethod
+    def get_page_by_ids(resource_ids: List[str], limit: int = 100, cursor: Optional[str] = None,
+                        metadata: Optional[Dict[str, str]] = None,
+                        updated_since: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Get a keyset-paginated page of the given resources, newest first.
+        Returns (resources, next_cursor); the cost follows the size of resource_ids, not the table"""
+        if cursor:
+            # Reject a malformed cursor even when there is nothing to page through
+            ResourceDAL._decode_cursor(cursor)
+        if not resource_ids:
+            return [], None
+
+        return ResourceDAL._get_page('r.id IN (SELECT value FROM json_each(?))', [json.dumps(resource_ids)],
+                                     limit, cursor, metadata, updated_since)
+
+    @staticmethod
+    def get_page_for_subject(subject: str, relation: str, resource_type: Optional[str] = None, limit: int = 100,
+                             cursor: Optional[str] = None, metadata: Optional[Dict[str, str]] = None,
+                             updated_since: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Get a keyset-paginated page of the resources a subject holds a relation on, newest first,
+        joined against the materialized effective_permissions table"""
+        where = '''r.id IN (
+                SELECT substr(object, instr(object, ':') + 1) FROM effective_permissions
+                WHERE subject = ? AND relation = ?
+            )'''
+        params: List[Any] = [subject, relation]
+        if resource_type:
+            where += ' AND r.type = ?'
+            params.append(resource_type)
+        return ResourceDAL._get_page(where, params, limit, cursor, metadata, updated_since)
+
+    @staticmethod
+    def _get_page(where: str, params: List[Any], limit: int, cursor: Optional[str],
+                  metadata: Optional[Dict[str, str]] = None,
+                  updated_since: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Helper method to fetch one keyset page of resources matching a filter"""
+        query = f'''
+            SELECT r.*, rg.name as resource_group_name
+            FROM resources r
+            LEFT JOIN resource_groups rg ON r.resource_group_id = rg.id
+            WHERE {where}
+        '''
+        params = list(params)
+        filter_where, filter_params = ResourceDAL._filter(metadata, updated_since)
+        if filter_where:
+            query += f' AND {filter_where}'
+            params.extend(filter_params)
+        if cursor:
+            created_at, last_id = ResourceDAL._decode_cursor(cursor)
+            query += ' AND (r.created_at < ? OR (r.created_at = ? AND r.id < ?))'
+            params.extend([created_at, created_at, last_id])
+        query += ' ORDER BY r.created_at DESC, r.id DESC LIMIT ?'
+        params.append(limit + 1)
+
+        with get_db() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        resources = []
+        for row in rows[:limit]:
+            resource = dict(row)
+            try:
+                resource['metadata'] = json.loads(resource['metadata']) if resource['metadata'] else {}
+            except json.JSONDecodeError:
+                resource['metadata'] = {}
+            resources.append(resource)
+
+        next_cursor = None
+        if len(rows) > limit:
+            last = resources[-1]
+            next_cursor = ResourceDAL._encode_cursor(last['created_at'], last['id'])
+        return resources, next_cursor
+
+    @staticmethod
+    def get_types() -> List[str]:
+        """Get the distinct resource types in use"""
+        with get_db() as conn:
+            cursor = conn.execute('SELECT DISTINCT type FROM resources ORDER BY type')
+            return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def _filter(metadata: Optional[Dict[str, str]], updated_since: Optional[int]) -> Tuple[str, List[Any]]:
+        """Helper method to build the WHERE clause of the metadata and updated_since filters"""
+        where, params = ResourceDAL._metadata_filter(metadata)
+        if updated_since is not None:
+            where = ' AND '.join(filter(None, [where, 'r.updated_at_ms >= ?']))
+            params.append(updated_since)
+        return where, params
+
+    @staticmethod
+    def _metadata_filter(metadata: Optional[Dict[str, str]]) -> Tuple[str, List[Any]]:
+        """Helper method to build the WHERE clause matching metadata keys against query string values.
+
+        A value also matches the JSON number or boolean it spells, so ?metadata.priority=3 finds
+        {"priority": 3} as well as {"priority": "3"}. Declared keys are served by their index.
+        """
+        clauses = []
+        params: List[Any] = []
+        for key, value in (metadata or {}).items():
+            typed = value
+            try:
+                parsed = json.loads(value)
+                if isinstance(parsed, (bool, int, float)):
+                    typed = parsed
+            except ValueError:
+                pass
+            clauses.append(f"{metadata_key_expression(key, 'r')} IN (?, ?)")
+            params.extend([value, typed])
+        return ' AND '.join(clauses), params
+
+    @staticmethod
+    def _encode_cursor(created_at: str, resource_id: str) -> str:
+        """Helper method to encode a keyset pagination position"""
+        return base64.urlsafe_b64encode(json.dumps([created_at, resource_id]).encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[str, str]:
+        """Helper method to decode a keyset pagination position, raising ValueError if malformed"""
+        try:
+            created_at, resource_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return str(created_at), str(resource_id)
+        except Exception:
+            raise ValueError("Invalid cursor")
+
     @staticmethod
     def create(resource_type: str, name: str, resource_group_id: str, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
         """Create a new resource"""
         resource_id = generate_id()
         timestamp = get_timestamp()
+        timestamp_ms = epoch_ms(timestamp)
         metadata_json = json.dumps(metadata or {})
         
         resource_data = {
@@ -71,18 +248,85 @@ class ResourceDAL:
             'metadata': metadata or {},
             'resource_group_id': resource_group_id,
             'created_at': timestamp,
-            'updated_at': timestamp
+            'updated_at': timestamp,
+            'created_at_ms': timestamp_ms,
+            'updated_at_ms': timestamp_ms
         }
         
         with get_db() as conn:
             conn.execute('''
-                INSERT INTO resources (id, type, name, metadata, resource_group_id, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (resource_id, resource_type, name, metadata_json, resource_group_id, timestamp, timestamp))
+                INSERT INTO resources (id, type, name, metadata, resource_group_id, created_at, updated_at,
+                                       created_at_ms, updated_at_ms)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (resource_id, resource_type, name, metadata_json, resource_group_id, timestamp, timestamp,
+                  timestamp_ms, timestamp_ms))
+            bump_versions(conn, 'resources')
             conn.commit()
         
         return resource_data
     
+    @staticmethod
+    def bulk_create(resources: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Create many resources in one transaction. Each resource has type, name, resource_group_id,
+        optional metadata and an optional owner (an OpenFGA user such as user:<id>), whose owner tuple
+        is queued in the outbox and sent in batched writes. Returns (created, conflicts), where each
+        conflict gives the index of a resource whose group does not exist or whose owner tuple the
+        authorization model does not allow"""
+        timestamp = get_timestamp()
+        timestamp_ms = epoch_ms(timestamp)
+        created, conflicts, owner_tuples = [], [], []
+        
+        with get_db() as conn:
+            # Hold the write lock from the group check to the commit, so no group can be deleted in between
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.execute('''
+                SELECT id FROM resource_groups WHERE id IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(list({resource['resource_group_id'] for resource in resources})),))
+            group_ids = {row['id'] for row in cursor.fetchall()}
+            
+            rows = []
+            for index, resource in enumerate(resources):
+                if resource['resource_group_id'] not in group_ids:
+                    conflicts.append({'index': index, 'error': 'Resource group not found', 'status': 404})
+                    continue
+                resource_id = generate_id()
+                if resource.get('owner'):
+                    owner_tuple = {'user': resource['owner'], 'relation': 'owner', 'object': f"{resource['type']}:{resource_id}"}
+                    try:
+                        RelationshipDAL.validate(owner_tuple['user'], owner_tuple['relation'], owner_tuple['object'])
+                    except ValueError as e:
+                        conflicts.append({'index': index, 'error': f"Invalid owner: {str(e)}", 'status': 400})
+                        continue
+                    owner_tuples.append(owner_tuple)
+                resource_data = {
+                    'id': resource_id,
+                    'type': resource['type'],
+                    'name': resource['name'],
+                    'metadata': resource.get('metadata') or {},
+                    'resource_group_id': resource['resource_group_id'],
+                    'created_at': timestamp,
+                    'updated_at': timestamp,
+                    'created_at_ms': timestamp_ms,
+                    'updated_at_ms': timestamp_ms
+                }
+                created.append(resource_data)
+                rows.append({**resource_data, 'metadata': json.dumps(resource_data['metadata'])})
+            
+            conn.executemany('''
+                INSERT INTO resources (id, type, name, metadata, resource_group_id, created_at, updated_at,
+                                       created_at_ms, updated_at_ms)
+                VALUES (:id, :type, :name, :metadata, :resource_group_id, :created_at, :updated_at,
+                        :created_at_ms, :updated_at_ms)
+            ''', rows)
+            OpenFGAOutbox.enqueue(conn, writes=owner_tuples)
+            if created:
+                bump_versions(conn, 'resources')
+            conn.commit()
+        
+        if owner_tuples:
+            OpenFGAOutbox.notify()
+        return created, conflicts
+    
     @staticmethod
     def update(resource_id: str, **kwargs) -> Optional[Dict[str, Any]]:
         """Update resource"""
@@ -115,26 +359,37 @@ class ResourceDAL:
             
             if update_fields:
                 timestamp = get_timestamp()
-                update_fields.append('updated_at = ?')
-                params.append(timestamp)
+                update_fields.append('updated_at = ?, updated_at_ms = ?')
+                params.extend([timestamp, epoch_ms(timestamp)])
                 params.append(resource_id)
                 
                 conn.execute(f'''
                     UPDATE resources SET {', '.join(update_fields)}
                     WHERE id = ?
                 ''', params)
+                bump_versions(conn, 'resources')
                 conn.commit()
             
             # Return updated resource
             return ResourceDAL.get_by_id(resource_id)
     
     @staticmethod
-    def delete(resource_id: str) -> bool:
-        """Delete resource"""
+    def delete(resource_id: str) -> Optional[str]:
+        """Delete resource and queue the removal of every OpenFGA tuple on it.
+        Returns the cleanup job ID, or None if the resource does not exist"""
+        job_id = None
         with get_db() as conn:
+            row = conn.execute('SELECT type FROM resources WHERE id = ?', (resource_id,)).fetchone()
             cursor = conn.execute('DELETE FROM resources WHERE id = ?', (resource_id,))
+            if cursor.rowcount:
+                DeletionDAL.record(conn, 'resources', [resource_id], epoch_ms(get_timestamp()))
+                job_id = CleanupJobs.enqueue(conn, [f"{row['type']}:{resource_id}"])
+                bump_versions(conn, 'resources')
             conn.commit()
-            return cursor.rowcount > 0
+        
+        if job_id:
+            CleanupJobs.notify()
+        return job_id
     
     @staticmethod
     def get_by_resource_group(resource_group_id: str) -> List[Dict[str, Any]]:
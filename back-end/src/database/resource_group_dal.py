@@ -3,8 +3,11 @@ Data Access Layer for Resource Groups
 """
 import json
 from typing import List, Optional, Dict, Any
-from .config import get_db
+from .cleanup_jobs import CleanupJobs
+from .config import get_db, epoch_ms
+from .deletion_dal import DeletionDAL
 from .resource_dal import ResourceDAL
+from .versions import bump_versions
 import uuid
 from datetime import datetime
 
@@ -18,10 +21,16 @@ def get_timestamp() -> str:
 
 class ResourceGroupDAL:
     @staticmethod
-    def get_all() -> List[Dict[str, Any]]:
-        """Get all resource groups with their resources"""
+    def get_all(updated_since: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get all resource groups with their resources, or only those created or updated at or after
+        updated_since (epoch milliseconds). Resources moving between groups update the resources, not the groups"""
         with get_db() as conn:
-            cursor = conn.execute('SELECT * FROM resource_groups ORDER BY created_at DESC')
+            if updated_since is None:
+                cursor = conn.execute('SELECT * FROM resource_groups ORDER BY created_at DESC')
+            else:
+                cursor = conn.execute('''
+                    SELECT * FROM resource_groups WHERE updated_at_ms >= ? ORDER BY created_at DESC
+                ''', (updated_since,))
             groups = []
             for row in cursor.fetchall():
                 group = dict(row)
@@ -77,22 +86,21 @@ class ResourceGroupDAL:
         """Create a new resource group"""
         group_id = generate_id()
         timestamp = get_timestamp()
+        timestamp_ms = epoch_ms(timestamp)
         
         with get_db() as conn:
             # Create the group
             conn.execute('''
-                INSERT INTO resource_groups (id, name, description, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (group_id, name, description, timestamp, timestamp))
+                INSERT INTO resource_groups (id, name, description, created_at, updated_at, created_at_ms, updated_at_ms)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (group_id, name, description, timestamp, timestamp, timestamp_ms, timestamp_ms))
             
-            # Update resources to belong to this group if resource_ids provided
-            if resource_ids:
-                for resource_id in resource_ids:
-                    conn.execute('''
-                        UPDATE resources SET resource_group_id = ?, updated_at = ?
-                        WHERE id = ?
-                    ''', (group_id, timestamp, resource_id))
+            # Move the given resources into this group
+            moved = ResourceGroupDAL._move_resources(conn, group_id, timestamp, resource_ids=resource_ids or [])
             
+            bump_versions(conn, 'resource_groups')
+            if moved:
+                bump_versions(conn, 'resources')
             conn.commit()
         
         return ResourceGroupDAL.get_by_id(group_id)
@@ -122,8 +130,8 @@ class ResourceGroupDAL:
             
             if update_fields:
                 timestamp = get_timestamp()
-                update_fields.append('updated_at = ?')
-                params.append(timestamp)
+                update_fields.append('updated_at = ?, updated_at_ms = ?')
+                params.extend([timestamp, epoch_ms(timestamp)])
                 params.append(group_id)
                 
                 conn.execute(f'''
@@ -131,36 +139,98 @@ class ResourceGroupDAL:
                     WHERE id = ?
                 ''', params)
             
-            # Update resources if provided
-            if resource_ids is not None:
-                timestamp = get_timestamp()
-                
-                # First, remove all resources from this group (set to null or move to default)
-                # We'll need to handle this carefully since resource_group_id is NOT NULL
-                # For now, we'll just update the specified resources to belong to this group
-                
-                # Remove current resources from this group by setting them to a default group
-                # This is a simplification - in production you might want better handling
-                current_resources = ResourceGroupDAL._get_group_resources(group_id)
-                
-                # Update specified resources to belong to this group
-                for resource_id in resource_ids:
-                    conn.execute('''
-                        UPDATE resources SET resource_group_id = ?, updated_at = ?
-                        WHERE id = ?
-                    ''', (group_id, timestamp, resource_id))
+            # Move the given resources into this group. Resources already in it and not listed stay,
+            # as resource_group_id is NOT NULL and there is no default group to move them to
+            if resource_ids:
+                if ResourceGroupDAL._move_resources(conn, group_id, get_timestamp(), resource_ids=resource_ids):
+                    bump_versions(conn, 'resources')
             
+            if update_fields:
+                bump_versions(conn, 'resource_groups')
             conn.commit()
         
         return ResourceGroupDAL.get_by_id(group_id)
     
     @staticmethod
-    def delete(group_id: str) -> bool:
-        """Delete resource group (resources will be cascade deleted)"""
+    def move_resources(group_id: str, resource_ids: Optional[List[str]] = None,
+                       from_group_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Move resources into a group in one statement: the given resources, or every resource of
+        from_group_id. Returns a summary of the move, or None if either group does not exist"""
         with get_db() as conn:
+            cursor = conn.execute('''
+                SELECT id FROM resource_groups WHERE id IN (?, ?)
+            ''', (group_id, from_group_id or group_id))
+            group_ids = {row['id'] for row in cursor.fetchall()}
+            if group_id not in group_ids or (from_group_id and from_group_id not in group_ids):
+                return None
+            
+            summary = {'group_id': group_id}
+            if resource_ids is not None:
+                # Distinct IDs, so a repeated ID is neither moved nor counted twice
+                found = conn.execute('''
+                    SELECT COUNT(*) FROM resources WHERE id IN (SELECT value FROM json_each(?))
+                ''', (json.dumps(resource_ids),)).fetchone()[0]
+                summary['requested'] = len(set(resource_ids))
+                summary['not_found'] = summary['requested'] - found
+            
+            moved = ResourceGroupDAL._move_resources(conn, group_id, get_timestamp(), resource_ids=resource_ids,
+                                                     from_group_id=from_group_id)
+            if moved:
+                bump_versions(conn, 'resources')
+            conn.commit()
+        
+        summary['moved'] = moved
+        if resource_ids is not None:
+            summary['unchanged'] = summary['requested'] - summary['not_found'] - moved
+        return summary
+    
+    @staticmethod
+    def _move_resources(conn, group_id: str, timestamp: str, resource_ids: Optional[List[str]] = None,
+                        from_group_id: Optional[str] = None) -> int:
+        """Helper method to move resources into a group within the caller's transaction, selected by ID
+        and/or current group. Resources already in the group are left untouched. Returns the number moved"""
+        conditions = ['resource_group_id != ?']
+        params: List[Any] = [group_id, timestamp, epoch_ms(timestamp), group_id]
+        if resource_ids is not None:
+            if not resource_ids:
+                return 0
+            conditions.append('id IN (SELECT value FROM json_each(?))')
+            params.append(json.dumps(resource_ids))
+        if from_group_id is not None:
+            conditions.append('resource_group_id = ?')
+            params.append(from_group_id)
+        
+        cursor = conn.execute(f'''
+            UPDATE resources SET resource_group_id = ?, updated_at = ?, updated_at_ms = ?
+            WHERE {' AND '.join(conditions)}
+        ''', params)
+        return cursor.rowcount
+    
+    @staticmethod
+    def delete(group_id: str) -> Optional[str]:
+        """Delete resource group (resources will be cascade deleted) and queue the removal of the
+        OpenFGA tuples on its resources. Returns the cleanup job ID, or None if the group does not exist"""
+        job_id = None
+        with get_db() as conn:
+            cursor = conn.execute('''
+                SELECT id, type FROM resources WHERE resource_group_id = ?
+            ''', (group_id,))
+            resources = cursor.fetchall()
+            resource_refs = [f"{row['type']}:{row['id']}" for row in resources]
+            
             cursor = conn.execute('DELETE FROM resource_groups WHERE id = ?', (group_id,))
+            if cursor.rowcount:
+                deleted_at_ms = epoch_ms(get_timestamp())
+                DeletionDAL.record(conn, 'resource_groups', [group_id], deleted_at_ms)
+                DeletionDAL.record(conn, 'resources', [row['id'] for row in resources], deleted_at_ms)
+                job_id = CleanupJobs.enqueue(conn, resource_refs)
+                # The group's resources are deleted with it
+                bump_versions(conn, 'resource_groups', 'resources')
             conn.commit()
-            return cursor.rowcount > 0
+        
+        if job_id and resource_refs:
+            CleanupJobs.notify()
+        return job_id
     
     @staticmethod
     def add_resource(group_id: str, resource_id: str) -> bool:
@@ -169,9 +239,10 @@ class ResourceGroupDAL:
             try:
                 timestamp = get_timestamp()
                 conn.execute('''
-                    UPDATE resources SET resource_group_id = ?, updated_at = ?
+                    UPDATE resources SET resource_group_id = ?, updated_at = ?, updated_at_ms = ?
                     WHERE id = ?
-                ''', (group_id, timestamp, resource_id))
+                ''', (group_id, timestamp, epoch_ms(timestamp), resource_id))
+                bump_versions(conn, 'resources')
                 conn.commit()
                 return conn.total_changes > 0
             except Exception:
@@ -7,22 +7,17 @@ from .resource_dal import ResourceDAL
 from .resource_group_dal import ResourceGroupDAL
 from .user_group_dal import UserGroupDAL
 from .relationship_dal import RelationshipDAL
+from .stats_dal import StatsDAL
 
-def load_sample_data():
-    """Load sample data into the database"""
+def load_sample_data(with_stats: bool = True):
+    """Load sample data into the database.
+    If data already exists nothing is loaded, and the existing counts are returned only with_stats"""
     print("📦 Loading sample data...")
     
     # Check if we already have data
-    existing_users = UserDAL.get_all()
-    if existing_users:
+    if UserDAL.exists_any():
         print("   ℹ️  Sample data already exists, skipping...")
-        return {
-            'users': len(existing_users),
-            'resource_groups': len(ResourceGroupDAL.get_all()),
-            'resources': len(ResourceDAL.get_all()),
-            'user_groups': len(UserGroupDAL.get_all()),
-            'relationships': len(RelationshipDAL.get_all())
-        }
+        return StatsDAL.get_counts() if with_stats else None
     
     # Sample users
     sample_users = [
@@ -0,0 +1,69 @@
+"""
+Data Access Layer for full-text search over users, resources and groups
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from .config import get_db, SEARCH_INDEXES
+
+# Searchable tables, in the order hits of equal rank are returned
+SEARCH_KINDS = tuple(SEARCH_INDEXES)
+
+def to_match_query(query: str) -> Optional[str]:
+    """Turn free text into an FTS5 query matching rows that contain every word as a prefix.
+
+    Words are quoted, so FTS5 operators and punctuation in the input are never interpreted.
+    Returns None when the input contains no words.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+class SearchDAL:
+    @staticmethod
+    def search(query: str, kinds: Optional[List[str]] = None, limit: int = 20, offset: int = 0,
+               count: bool = False) -> Tuple[List[Dict[str, Any]], bool, Optional[int]]:
+        """Search the given kinds of entities, best matches first.
+
+        Each kind contributes at most offset + limit + 1 hits, taken from its FTS5 index in rank
+        order, so a page costs a few index lookups however many rows match. Returns the page of
+        hits, whether more follow it, and the total number of matches if count is set; counting
+        visits every match, so it is left to callers that need it.
+        """
+        match = to_match_query(query)
+        if match is None:
+            return [], False, 0 if count else None
+
+        hits = []
+        total = 0 if count else None
+        with get_db() as conn:
+            for kind in kinds or SEARCH_KINDS:
+                cursor = conn.execute(f'''
+                    SELECT t.*, f.rank as rank FROM {kind}_fts f
+                    JOIN {kind} t ON t.rowid = f.rowid
+                    WHERE {kind}_fts MATCH ?
+                    ORDER BY f.rank
+                    LIMIT ?
+                ''', (match, offset + limit + 1))
+                for row in cursor.fetchall():
+                    item = dict(row)
+                    rank = item.pop('rank')
+                    if kind == 'resources':
+                        # Parse metadata JSON, as the other resource endpoints do
+                        try:
+                            item['metadata'] = json.loads(item['metadata']) if item['metadata'] else {}
+                        except json.JSONDecodeError:
+                            item['metadata'] = {}
+                    hits.append((rank, kind, item))
+                if count:
+                    total += conn.execute(
+                        f'SELECT COUNT(*) FROM {kind}_fts WHERE {kind}_fts MATCH ?', (match,)
+                    ).fetchone()[0]
+
+        # bm25 ranks are negative; lower is a better match
+        hits.sort(key=lambda hit: (hit[0], SEARCH_KINDS.index(hit[1])))
+        return [
+            {'kind': kind, 'score': -rank, 'item': item}
+            for rank, kind, item in hits[offset:offset + limit]
+        ], len(hits) > offset + limit, total
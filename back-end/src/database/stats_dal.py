@@ -0,0 +1,119 @@
+"""
+Data Access Layer for aggregate statistics
+"""
+import threading
+from typing import Dict, Any
+from .config import get_db
+from .counter_dal import CounterDAL
+from .relationship_dal import RelationshipDAL
+from .tuple_changes import (
+    TUPLE_COUNTER_PREFIX, TUPLE_TOTAL_COUNTER, TUPLE_RELATION_COUNTER, recount_changed, start_recount, stop_recount
+)
+
+# Columns returned for the most recently created entities of each table
+RECENT_COLUMNS = {
+    'users': 'id, name, email, created_at',
+    'resources': 'id, type, name, resource_group_id, created_at',
+    'user_groups': 'id, name, description, created_at',
+    'resource_groups': 'id, name, description, created_at',
+}
+
+# Scans of OpenFGA per recount while tuples keep changing during the scan
+TUPLE_RECOUNT_ATTEMPTS = 3
+_recount_run_lock = threading.Lock()
+
+# Row counts of every entity table in a single statement
+COUNTS_QUERY = '''
+    SELECT
+        (SELECT COUNT(*) FROM users) as users,
+        (SELECT COUNT(*) FROM resources) as resources,
+        (SELECT COUNT(*) FROM resource_groups) as resource_groups,
+        (SELECT COUNT(*) FROM user_groups) as user_groups,
+        (SELECT COUNT(*) FROM user_group_members) as user_group_members
+'''
+
+class StatsDAL:
+    @staticmethod
+    def get_counts() -> Dict[str, Any]:
+        """Get entity counts from SQLite only. The relationship count is included when the
+        maintained tuple counter is seeded; OpenFGA is never read"""
+        with get_db() as conn:
+            counts = dict(conn.execute(COUNTS_QUERY).fetchone())
+        relationships = CounterDAL.get(TUPLE_TOTAL_COUNTER)
+        if relationships is not None:
+            counts['relationships'] = relationships
+        return counts
+
+    @staticmethod
+    def get_summary(recent_limit: int = 5) -> Dict[str, Any]:
+        """Get entity counts, per-type breakdowns and the most recent entities"""
+        with get_db() as conn:
+            counts = dict(conn.execute(COUNTS_QUERY).fetchone())
+
+            cursor = conn.execute('SELECT type, COUNT(*) as count FROM resources GROUP BY type ORDER BY type')
+            resources_by_type = {row['type']: row['count'] for row in cursor.fetchall()}
+
+            recent = {}
+            for table, columns in RECENT_COLUMNS.items():
+                cursor = conn.execute(f'''
+                    SELECT {columns} FROM {table} ORDER BY created_at DESC LIMIT ?
+                ''', (recent_limit,))
+                recent[table] = [dict(row) for row in cursor.fetchall()]
+
+        tuple_counters = StatsDAL._get_tuple_counters()
+        counts['relationships'] = tuple_counters.get(TUPLE_TOTAL_COUNTER, 0)
+        relationships_by_relation = {
+            name[len(TUPLE_RELATION_COUNTER):]: value
+            for name, value in sorted(tuple_counters.items())
+            if name.startswith(TUPLE_RELATION_COUNTER) and value
+        }
+
+        return {
+            'counts': counts,
+            'resources_by_type': resources_by_type,
+            'relationships_by_relation': relationships_by_relation,
+            'recent': recent
+        }
+
+    @staticmethod
+    def _get_tuple_counters() -> Dict[str, int]:
+        """Helper method to get the maintained tuple counters, seeding them from OpenFGA once"""
+        counters = CounterDAL.get_by_prefix(TUPLE_COUNTER_PREFIX)
+        if TUPLE_TOTAL_COUNTER not in counters:
+            counters = StatsDAL.rebuild_tuple_counts()
+        return counters
+
+    @staticmethod
+    def rebuild_tuple_counts() -> Dict[str, int]:
+        """Recount every tuple in OpenFGA and replace the maintained counters.
+
+        Changes recorded during the scan are added to its result, as the counters they incremented
+        are replaced. A change to a tuple the scan had yet to reach would then count twice, so the
+        scan is repeated while changes land during it, up to TUPLE_RECOUNT_ATTEMPTS times.
+        """
+        with _recount_run_lock:
+            try:
+                for _ in range(TUPLE_RECOUNT_ATTEMPTS):
+                    start_recount()
+                    relation_counts = RelationshipDAL.count_by_relation()
+                    if relation_counts is None:
+                        # Leave the counters unseeded so the next request retries
+                        return {}
+                    if not recount_changed():
+                        break
+
+                counters = {TUPLE_TOTAL_COUNTER: sum(relation_counts.values())}
+                for relation, count in relation_counts.items():
+                    counters[f"{TUPLE_RELATION_COUNTER}{relation}"] = count
+
+                with get_db() as conn:
+                    # The write lock is held, so changes recorded from here on wait for the commit and
+                    # apply to the new counters; those recorded since the scan started are added to them
+                    conn.execute('BEGIN IMMEDIATE')
+                    for name, delta in stop_recount().items():
+                        counters[name] = counters.get(name, 0) + delta
+                    CounterDAL.replace_by_prefix(conn, TUPLE_COUNTER_PREFIX, counters)
+                    conn.commit()
+                return counters
+            finally:
+                stop_recount()
@@ -0,0 +1,84 @@
+"""
+Bookkeeping for relationship tuples written to or deleted from OpenFGA
+"""
+import threading
+from typing import Dict, Iterable, List, Optional
+from . import config
+from .config import get_db
+from .counter_dal import CounterDAL
+from .effective_permission_dal import EffectivePermissionDAL
+from .versions import bump_versions
+
+# Counter names for the maintained tuple counts
+TUPLE_COUNTER_PREFIX = 'tuples.'
+TUPLE_TOTAL_COUNTER = 'tuples.total'
+TUPLE_RELATION_COUNTER = 'tuples.relation.'
+
+# Counter deltas recorded while the tuples are being recounted, or None when no recount is running
+_recount_deltas: Optional[Dict[str, int]] = None
+_recount_lock = threading.Lock()
+
+def record_tuple_changes(written: Iterable[Dict[str, str]] = (), deleted: Iterable[Dict[str, str]] = (),
+                         confirmed: bool = True):
+    """Record tuples that OpenFGA has accepted as written or deleted.
+
+    With confirmed=False the tuples are known to be in that state, but not whether this change put
+    them there (a write OpenFGA reports as a duplicate may be a retry that had landed). They update
+    the mirror, and are counted only when the mirror shows they changed.
+    """
+    written, deleted = list(written), list(deleted)
+    if not written and not deleted:
+        return
+
+    try:
+        with get_db() as conn:
+            changed = None
+            if config.EFFECTIVE_PERMISSIONS_ENABLED:
+                changed = EffectivePermissionDAL.apply_changes(conn, written, deleted)
+            if changed is not None:
+                # The mirror tells which tuples actually changed, so repeated changes are not counted twice
+                written, deleted = changed
+            elif not confirmed:
+                written, deleted = [], []
+
+            deltas = _count_deltas(written, deleted)
+            # Counts are only maintained once they have been seeded from OpenFGA
+            if deltas and conn.execute('SELECT 1 FROM counters WHERE name = ?', (TUPLE_TOTAL_COUNTER,)).fetchone():
+                for name, delta in deltas.items():
+                    CounterDAL.increment(conn, name, delta)
+            bump_versions(conn, 'tuples')
+            # The write lock is held from here to the commit, so a recount cannot replace the counters in between
+            with _recount_lock:
+                if _recount_deltas is not None:
+                    for name, delta in deltas.items():
+                        _recount_deltas[name] = _recount_deltas.get(name, 0) + delta
+            conn.commit()
+    except Exception as e:
+        print(f"⚠️  Failed to record tuple changes: {e}")
+
+def start_recount():
+    """Collect the counter deltas recorded from now on, for a recount that will replace the counters"""
+    global _recount_deltas
+    with _recount_lock:
+        _recount_deltas = {}
+
+def recount_changed() -> bool:
+    """Check whether any counter delta has been recorded since start_recount"""
+    with _recount_lock:
+        return any(_recount_deltas.values()) if _recount_deltas else False
+
+def stop_recount() -> Dict[str, int]:
+    """Stop collecting and return the counter deltas recorded since start_recount"""
+    global _recount_deltas
+    with _recount_lock:
+        deltas, _recount_deltas = _recount_deltas or {}, None
+    return deltas
+
+def _count_deltas(written: List[Dict[str, str]], deleted: List[Dict[str, str]]) -> Dict[str, int]:
+    """Helper method to turn tuple changes into counter deltas"""
+    deltas: Dict[str, int] = {}
+    for tuple_data, delta in [(t, 1) for t in written] + [(t, -1) for t in deleted]:
+        relation_counter = f"{TUPLE_RELATION_COUNTER}{tuple_data['relation']}"
+        deltas[TUPLE_TOTAL_COUNTER] = deltas.get(TUPLE_TOTAL_COUNTER, 0) + delta
+        deltas[relation_counter] = deltas.get(relation_counter, 0) + delta
+    return deltas
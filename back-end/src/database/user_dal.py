@@ -2,8 +2,11 @@
 Data Access Layer for Users
 """
 import json
-from typing import List, Optional, Dict, Any
-from .config import get_db
+from typing import List, Optional, Dict, Any, Tuple
+from .cleanup_jobs import CleanupJobs
+from .config import get_db, epoch_ms
+from .deletion_dal import DeletionDAL
+from .versions import bump_versions
 import uuid
 from datetime import datetime
 
@@ -17,12 +20,23 @@ def get_timestamp() -> str:
 
 class UserDAL:
     @staticmethod
-    def get_all() -> List[Dict[str, Any]]:
-        """Get all users"""
+    def get_all(updated_since: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get all users, or only those created or updated at or after updated_since (epoch milliseconds)"""
         with get_db() as conn:
-            cursor = conn.execute('SELECT * FROM users ORDER BY created_at DESC')
+            if updated_since is None:
+                cursor = conn.execute('SELECT * FROM users ORDER BY created_at DESC')
+            else:
+                cursor = conn.execute('''
+                    SELECT * FROM users WHERE updated_at_ms >= ? ORDER BY created_at DESC
+                ''', (updated_since,))
             return [dict(row) for row in cursor.fetchall()]
     
+    @staticmethod
+    def exists_any() -> bool:
+        """Check whether there is at least one user, without scanning the table"""
+        with get_db() as conn:
+            return bool(conn.execute('SELECT EXISTS (SELECT 1 FROM users)').fetchone()[0])
+    
     @staticmethod
     def get_by_id(user_id: str) -> Optional[Dict[str, Any]]:
         """Get user by ID"""
@@ -31,29 +45,86 @@ class UserDAL:
             row = cursor.fetchone()
             return dict(row) if row else None
     
+    @staticmethod
+    def get_by_ids(user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get the given users in a single query, keyed by ID"""
+        if not user_ids:
+            return {}
+
+        with get_db() as conn:
+            cursor = conn.execute('''
+                SELECT * FROM users WHERE id IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(user_ids),))
+            return {row['id']: dict(row) for row in cursor.fetchall()}
+
     @staticmethod
     def create(name: str, email: str) -> Dict[str, Any]:
         """Create a new user"""
         user_id = generate_id()
         timestamp = get_timestamp()
+        timestamp_ms = epoch_ms(timestamp)
         
         user_data = {
             'id': user_id,
             'name': name,
             'email': email,
             'created_at': timestamp,
-            'updated_at': timestamp
+            'updated_at': timestamp,
+            'created_at_ms': timestamp_ms,
+            'updated_at_ms': timestamp_ms
         }
         
         with get_db() as conn:
             conn.execute('''
-                INSERT INTO users (id, name, email, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, name, email, timestamp, timestamp))
+                INSERT INTO users (id, name, email, created_at, updated_at, created_at_ms, updated_at_ms)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (user_id, name, email, timestamp, timestamp, timestamp_ms, timestamp_ms))
+            bump_versions(conn, 'users')
             conn.commit()
         
         return user_data
     
+    @staticmethod
+    def bulk_create(users: List[Dict[str, str]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Create many users in one transaction. Returns (created, conflicts), where each conflict
+        gives the index of a user whose email is already taken or repeated earlier in the list"""
+        timestamp = get_timestamp()
+        timestamp_ms = epoch_ms(timestamp)
+        created, conflicts = [], []
+        
+        with get_db() as conn:
+            # Hold the write lock from the email check to the commit, so no other writer can take an email in between
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.execute('''
+                SELECT email FROM users WHERE email IN (SELECT value FROM json_each(?))
+            ''', (json.dumps([user['email'] for user in users]),))
+            taken = {row['email'] for row in cursor.fetchall()}
+            
+            for index, user in enumerate(users):
+                if user['email'] in taken:
+                    conflicts.append({'index': index, 'error': 'Email already exists', 'status': 409})
+                    continue
+                taken.add(user['email'])
+                created.append({
+                    'id': generate_id(),
+                    'name': user['name'],
+                    'email': user['email'],
+                    'created_at': timestamp,
+                    'updated_at': timestamp,
+                    'created_at_ms': timestamp_ms,
+                    'updated_at_ms': timestamp_ms
+                })
+            
+            conn.executemany('''
+                INSERT INTO users (id, name, email, created_at, updated_at, created_at_ms, updated_at_ms)
+                VALUES (:id, :name, :email, :created_at, :updated_at, :created_at_ms, :updated_at_ms)
+            ''', created)
+            if created:
+                bump_versions(conn, 'users')
+            conn.commit()
+        
+        return created, conflicts
+    
     @staticmethod
     def update(user_id: str, name: Optional[str] = None, email: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """Update user"""
@@ -78,14 +149,15 @@ class UserDAL:
             
             if update_fields:
                 timestamp = get_timestamp()
-                update_fields.append('updated_at = ?')
-                params.append(timestamp)
+                update_fields.append('updated_at = ?, updated_at_ms = ?')
+                params.extend([timestamp, epoch_ms(timestamp)])
                 params.append(user_id)
                 
                 conn.execute(f'''
                     UPDATE users SET {', '.join(update_fields)}
                     WHERE id = ?
                 ''', params)
+                bump_versions(conn, 'users')
                 conn.commit()
             
             # Return updated user
@@ -93,12 +165,28 @@ class UserDAL:
             return dict(cursor.fetchone())
     
     @staticmethod
-    def delete(user_id: str) -> bool:
-        """Delete user"""
+    def delete(user_id: str) -> Optional[str]:
+        """Delete user and queue the removal of every OpenFGA tuple referencing it.
+        Returns the cleanup job ID, or None if the user does not exist"""
+        job_id = None
+        timestamp = get_timestamp()
         with get_db() as conn:
+            # Mark the user's groups as updated before the cascade removes the memberships
+            conn.execute('''
+                UPDATE user_groups SET updated_at = ?, updated_at_ms = ?
+                WHERE id IN (SELECT user_group_id FROM user_group_members WHERE user_id = ?)
+            ''', (timestamp, epoch_ms(timestamp), user_id))
             cursor = conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+            if cursor.rowcount:
+                DeletionDAL.record(conn, 'users', [user_id], epoch_ms(timestamp))
+                job_id = CleanupJobs.enqueue(conn, [f"user:{user_id}"])
+                # The user's memberships are deleted with it, which changes the groups too
+                bump_versions(conn, 'users', 'user_groups')
             conn.commit()
-            return cursor.rowcount > 0
+        
+        if job_id:
+            CleanupJobs.notify()
+        return job_id
     
     @staticmethod
     def get_by_email(email: str) -> Optional[Dict[str, Any]]:
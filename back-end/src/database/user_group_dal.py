@@ -2,14 +2,15 @@
 Data Access Layer for User Groups
 """
 import json
-import asyncio
-import sys
-import os
 import threading
 import queue
 from typing import List, Optional, Dict, Any
-from .config import get_db
+from .config import get_db, epoch_ms
+from .deletion_dal import DeletionDAL
 from .user_dal import UserDAL
+from .cleanup_jobs import CleanupJobs
+from .openfga_outbox import OpenFGAOutbox
+from .versions import bump_versions
 import uuid
 from datetime import datetime
 
@@ -23,10 +24,16 @@ def get_timestamp() -> str:
 
 class UserGroupDAL:
     @staticmethod
-    def get_all() -> List[Dict[str, Any]]:
-        """Get all user groups with their members"""
+    def get_all(updated_since: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get all user groups with their members, or only those created or updated at or after
+        updated_since (epoch milliseconds). Membership changes count as updates of the group"""
         with get_db() as conn:
-            cursor = conn.execute('SELECT * FROM user_groups ORDER BY created_at DESC')
+            if updated_since is None:
+                cursor = conn.execute('SELECT * FROM user_groups ORDER BY created_at DESC')
+            else:
+                cursor = conn.execute('''
+                    SELECT * FROM user_groups WHERE updated_at_ms >= ? ORDER BY created_at DESC
+                ''', (updated_since,))
             groups = []
             for row in cursor.fetchall():
                 group = dict(row)
@@ -89,13 +96,14 @@ class UserGroupDAL:
         """Create a new user group"""
         group_id = generate_id()
         timestamp = get_timestamp()
+        timestamp_ms = epoch_ms(timestamp)
         
         with get_db() as conn:
             # Create the group
             conn.execute('''
-                INSERT INTO user_groups (id, name, description, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (group_id, name, description, timestamp, timestamp))
+                INSERT INTO user_groups (id, name, description, created_at, updated_at, created_at_ms, updated_at_ms)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (group_id, name, description, timestamp, timestamp, timestamp_ms, timestamp_ms))
             
             # Add members
             for user_id in user_ids:
@@ -105,71 +113,14 @@ class UserGroupDAL:
                     VALUES (?, ?, ?, ?)
                 ''', (member_id, group_id, user_id, timestamp))
             
+            # Queue OpenFGA membership relationships in the same transaction
+            OpenFGAOutbox.enqueue(conn, writes=_membership_tuples(group_id, user_ids))
+            bump_versions(conn, 'user_groups')
             conn.commit()
         
-        # Create OpenFGA membership relationships
-        UserGroupDAL._create_openfga_memberships(group_id, user_ids)
-        
+        OpenFGAOutbox.notify()
         return UserGroupDAL.get_by_id(group_id)
     
-    @staticmethod
-    def _create_openfga_memberships(group_id: str, user_ids: List[str]):
-        """Create OpenFGA membership relationships for users in a group"""
-        try:
-            # Import here to avoid circular import
-            sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-            from openfga.service import OpenFGAService
-            
-            async def create_memberships():
-                for user_id in user_ids:
-                    try:
-                        # Create a fresh service instance for each operation
-                        service = OpenFGAService()
-                        await service.initialize()
-                        
-                        user_ref = f"user:{user_id}"
-                        group_ref = f"group:{group_id}"
-                        await service.write_tuple(user_ref, "member", group_ref)
-                        print(f"   ✅ Created OpenFGA membership: {user_ref} member {group_ref}")
-                        
-                        await service.close()
-                    except Exception as e:
-                        print(f"   ⚠️  Failed to create OpenFGA membership for user {user_id}: {e}")
-            
-            # Run the async function
-            asyncio.run(create_memberships())
-        except Exception as e:
-            print(f"   ⚠️  Failed to create OpenFGA memberships: {e}")
-    
-    @staticmethod
-    def _delete_openfga_memberships(group_id: str, user_ids: List[str]):
-        """Delete OpenFGA membership relationships for users in a group"""
-        try:
-            # Import here to avoid circular import
-            sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-            from openfga.service import OpenFGAService
-            
-            async def delete_memberships():
-                for user_id in user_ids:
-                    try:
-                        # Create a fresh service instance for each operation
-                        service = OpenFGAService()
-                        await service.initialize()
-                        
-                        user_ref = f"user:{user_id}"
-                        group_ref = f"group:{group_id}"
-                        await service.delete_tuple(user_ref, "member", group_ref)
-                        print(f"   ✅ Deleted OpenFGA membership: {user_ref} member {group_ref}")
-                        
-                        await service.close()
-                    except Exception as e:
-                        print(f"   ⚠️  Failed to delete OpenFGA membership for user {user_id}: {e}")
-            
-            # Run the async function
-            asyncio.run(delete_memberships())
-        except Exception as e:
-            print(f"   ⚠️  Failed to delete OpenFGA memberships: {e}")
-    
     @staticmethod
     def update(group_id: str, name: Optional[str] = None, description: Optional[str] = None, 
                user_ids: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
@@ -193,10 +144,11 @@ class UserGroupDAL:
                 update_fields.append('description = ?')
                 params.append(description)
             
-            if update_fields:
-                timestamp = get_timestamp()
-                update_fields.append('updated_at = ?')
-                params.append(timestamp)
+            timestamp = get_timestamp()
+            # Membership changes also mark the group as updated, so they show up in ?updated_since= syncs
+            if update_fields or user_ids is not None:
+                update_fields.append('updated_at = ?, updated_at_ms = ?')
+                params.extend([timestamp, epoch_ms(timestamp)])
                 params.append(group_id)
                 
                 conn.execute(f'''
@@ -206,7 +158,7 @@ class UserGroupDAL:
             
             # Update members if provided
             if user_ids is not None:
-                # Get current members for OpenFGA cleanup
+                # Get current members so only the difference is sent to OpenFGA
                 current_members_cursor = conn.execute('''
                     SELECT user_id FROM user_group_members WHERE user_group_id = ?
                 ''', (group_id,))
@@ -216,7 +168,6 @@ class UserGroupDAL:
                 conn.execute('DELETE FROM user_group_members WHERE user_group_id = ?', (group_id,))
                 
                 # Add new members
-                timestamp = get_timestamp()
                 for user_id in user_ids:
                     member_id = generate_id()
                     conn.execute('''
@@ -224,33 +175,38 @@ class UserGroupDAL:
                         VALUES (?, ?, ?, ?)
                     ''', (member_id, group_id, user_id, timestamp))
                 
-                # Update OpenFGA memberships
-                UserGroupDAL._delete_openfga_memberships(group_id, current_user_ids)
-                UserGroupDAL._create_openfga_memberships(group_id, user_ids)
+                OpenFGAOutbox.enqueue(
+                    conn,
+                    writes=_membership_tuples(group_id, [u for u in user_ids if u not in current_user_ids]),
+                    deletes=_membership_tuples(group_id, [u for u in current_user_ids if u not in user_ids])
+                )
             
+            if update_fields:
+                bump_versions(conn, 'user_groups')
             conn.commit()
         
+        if user_ids is not None:
+            OpenFGAOutbox.notify()
+        
         return UserGroupDAL.get_by_id(group_id)
     
     @staticmethod
-    def delete(group_id: str) -> bool:
-        """Delete user group (members will be automatically deleted due to foreign key cascade)"""
-        # Get current members for OpenFGA cleanup
+    def delete(group_id: str) -> Optional[str]:
+        """Delete user group (members will be automatically deleted due to foreign key cascade).
+        Its member tuples and the grants to the group are removed from OpenFGA by a cleanup job;
+        returns its ID, or None if the group does not exist"""
+        job_id = None
         with get_db() as conn:
-            members_cursor = conn.execute('''
-                SELECT user_id FROM user_group_members WHERE user_group_id = ?
-            ''', (group_id,))
-            user_ids = [row[0] for row in members_cursor.fetchall()]
-            
             cursor = conn.execute('DELETE FROM user_groups WHERE id = ?', (group_id,))
-            success = cursor.rowcount > 0
+            if cursor.rowcount:
+                DeletionDAL.record(conn, 'user_groups', [group_id], epoch_ms(get_timestamp()))
+                job_id = CleanupJobs.enqueue(conn, [f"group:{group_id}"])
+                bump_versions(conn, 'user_groups')
             conn.commit()
-            
-            if success:
-                # Clean up OpenFGA memberships
-                UserGroupDAL._delete_openfga_memberships(group_id, user_ids)
-            
-            return success
+        
+        if job_id:
+            CleanupJobs.notify()
+        return job_id
     
     @staticmethod
     def add_member(group_id: str, user_id: str) -> bool:
@@ -263,14 +219,15 @@ class UserGroupDAL:
                     INSERT INTO user_group_members (id, user_group_id, user_id, created_at)
                     VALUES (?, ?, ?, ?)
                 ''', (member_id, group_id, user_id, timestamp))
+                _touch(conn, group_id, timestamp)
+                OpenFGAOutbox.enqueue(conn, writes=_membership_tuples(group_id, [user_id]))
+                bump_versions(conn, 'user_groups')
                 conn.commit()
-                
-                # Create OpenFGA membership
-                UserGroupDAL._create_openfga_memberships(group_id, [user_id])
-                
-                return True
             except Exception:
                 return False  # User already in group or doesn't exist
+        
+        OpenFGAOutbox.notify()
+        return True
     
     @staticmethod
     def remove_member(group_id: str, user_id: str) -> bool:
@@ -281,10 +238,22 @@ class UserGroupDAL:
                 WHERE user_group_id = ? AND user_id = ?
             ''', (group_id, user_id))
             success = cursor.rowcount > 0
-            conn.commit()
-            
             if success:
-                # Delete OpenFGA membership
-                UserGroupDAL._delete_openfga_memberships(group_id, [user_id])
-            
-            return success
+                _touch(conn, group_id, get_timestamp())
+                OpenFGAOutbox.enqueue(conn, deletes=_membership_tuples(group_id, [user_id]))
+                bump_versions(conn, 'user_groups')
+            conn.commit()
+        
+        if success:
+            OpenFGAOutbox.notify()
+        return success
+
+def _touch(conn, group_id: str, timestamp: str):
+    """Mark a group as updated after a change to its members"""
+    conn.execute('''
+        UPDATE user_groups SET updated_at = ?, updated_at_ms = ? WHERE id = ?
+    ''', (timestamp, epoch_ms(timestamp), group_id))
+
+def _membership_tuples(group_id: str, user_ids: List[str]) -> List[Dict[str, str]]:
+    """Build the OpenFGA member tuples for users in a group"""
+    return [{'user': f"user:{user_id}", 'relation': 'member', 'object': f"group:{group_id}"} for user_id in user_ids]
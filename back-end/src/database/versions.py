@@ -0,0 +1,30 @@
+"""
+Monotonic data versions per table, bumped on every write for conditional requests and caching
+"""
+import json
+import sqlite3
+from typing import Dict, Iterable
+from .config import get_db
+from .counter_dal import CounterDAL
+
+# Counter names are VERSION_COUNTER_PREFIX + one of VERSIONED_TABLES. 'tuples' covers the
+# relationship tuples in OpenFGA; user_groups also covers group memberships
+VERSION_COUNTER_PREFIX = 'version.'
+VERSIONED_TABLES = ('users', 'resources', 'user_groups', 'resource_groups', 'tuples')
+# Random value set when the database is created, so versions from a previous database never match
+VERSION_EPOCH_COUNTER = 'version.epoch'
+
+def bump_versions(conn: sqlite3.Connection, *tables: str):
+    """Bump the versions of the given tables within the caller's transaction"""
+    for table in tables:
+        CounterDAL.increment(conn, f"{VERSION_COUNTER_PREFIX}{table}")
+
+def get_versions(tables: Iterable[str]) -> Dict[str, int]:
+    """Get the current versions of the given tables and the database epoch in a single query"""
+    names = [VERSION_EPOCH_COUNTER] + [f"{VERSION_COUNTER_PREFIX}{table}" for table in tables]
+    with get_db() as conn:
+        cursor = conn.execute('''
+            SELECT name, value FROM counters WHERE name IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(names),))
+        values = {row['name']: row['value'] for row in cursor.fetchall()}
+    return {name[len(VERSION_COUNTER_PREFIX):]: values.get(name, 0) for name in names}
@@ -0,0 +1,111 @@
+"""
+HTTP caching helpers: ETags derived from table versions, conditional GET handling and
+a server-side response cache
+"""
+import functools
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlencode
+from flask import Response, make_response, request
+from database.versions import get_versions
+from http_compression import COMPRESSIBLE_MIMETYPES, compress, negotiate_encoding, set_encoded_body
+
+# Memory budget for cached response bodies in bytes; bodies over a quarter of it are not cached
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+class ResponseCache:
+    """LRU cache of serialized response bodies, bounded by their total size.
+
+    Each entry is stored with the ETag it was built under. An entry whose ETag no longer
+    matches the current versions is stale; it is dropped on lookup instead of being served.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Tuple[str, bytes, str]]' = OrderedDict()
+        self._size = 0
+
+    def get(self, key: str, etag: str) -> Optional[Tuple[bytes, str]]:
+        """Get (body, mimetype) cached for key under etag, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != etag:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put(self, key: str, etag: str, body: bytes, mimetype: str):
+        """Cache a response body, evicting the least recently used entries to stay within budget"""
+        if len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (etag, body, mimetype)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        """Helper method to drop an entry; the caller holds the lock"""
+        self._size -= len(self._entries.pop(key)[1])
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES)
+
+def versions_etag(versions: Dict[str, int]) -> str:
+    """Build an ETag value from the versions a response depends on"""
+    return '-'.join(f"{value:x}" for _, value in sorted(versions.items()))
+
+def conditional(*tables: str, cache: bool = False):
+    """Decorate a GET view whose response depends only on the given tables.
+
+    The versions are read before the view runs, so a write that lands while it runs
+    only makes the ETag older than the body, never newer. A request whose
+    If-None-Match matches is answered 304 without calling the view at all. With cache,
+    200 responses are also kept in the response cache under the route, the query and
+    the ETag, so repeated requests skip the view until one of the tables is written.
+    Compressed bodies are cached next to the raw one, one entry per content encoding.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = versions_etag(get_versions(tables))
+            cache_key = f"{request.path}?{urlencode(sorted(request.args.items(multi=True)))}"
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            elif cache:
+                cached = response_cache.get(f"{cache_key}|identity", etag)
+                if cached:
+                    response = Response(cached[0], mimetype=cached[1])
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    cached = (response.get_data(), response.mimetype)
+                    response_cache.put(f"{cache_key}|identity", etag, *cached)
+                
+                encoding = negotiate_encoding(len(cached[0])) if cached[1] in COMPRESSIBLE_MIMETYPES else 'identity'
+                if encoding != 'identity':
+                    encoded = response_cache.get(f"{cache_key}|{encoding}", etag)
+                    if encoded:
+                        body = encoded[0]
+                    else:
+                        body = compress(cached[0], encoding)
+                        response_cache.put(f"{cache_key}|{encoding}", etag, body, cached[1])
+                    set_encoded_body(response, body, encoding)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            # Weak, as the representation may be encoded differently for each client
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
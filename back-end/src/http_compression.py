@@ -0,0 +1,52 @@
+"""
+Negotiated gzip/brotli compression of response bodies
+"""
+import gzip
+import os
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # Optional; without it only gzip is offered
+    brotli = None
+
+# Bodies smaller than this are sent as they are; compressing them saves less than it costs
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+# gzip level (1-9) and brotli quality (0-11)
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/plain', 'text/html')
+# Server preference when the client accepts several encodings equally
+SUPPORTED_ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+def negotiate_encoding(body_size: int) -> str:
+    """Pick the content encoding for a body of the given size: 'br', 'gzip' or 'identity'"""
+    if body_size < COMPRESSION_MIN_SIZE:
+        return 'identity'
+    return request.accept_encodings.best_match(SUPPORTED_ENCODINGS) or 'identity'
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Encode a body with a negotiated encoding"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=COMPRESSION_LEVEL)
+    return body
+
+def set_encoded_body(response: Response, body: bytes, encoding: str):
+    """Set a body that is already encoded with encoding, along with its headers"""
+    response.set_data(body)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+
+def compress_response(response: Response) -> Response:
+    """Compress a response in place if the client accepts it and it is large enough to be worth it"""
+    if (response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    body = response.get_data()
+    encoding = negotiate_encoding(len(body))
+    set_encoded_body(response, compress(body, encoding), encoding)
+    return response
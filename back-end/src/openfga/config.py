@@ -5,8 +5,42 @@ import os
 
 # OpenFGA connection settings
 OPENFGA_API_URL = os.getenv('OPENFGA_URL', 'http://localhost:8080')
-OPENFGA_STORE_ID = os.getenv('OPENFGA_STORE_ID', '01JZ0393KCZDMBMW24TMP84BCR')
-OPENFGA_MODEL_ID = os.getenv('OPENFGA_MODEL_ID', '01JZ0KH75HW7DKS3QF8J17PW4P')
+# Optional: pin a store or model; otherwise both are resolved at startup and kept in the state file
+OPENFGA_STORE_ID = os.getenv('OPENFGA_STORE_ID')
+OPENFGA_MODEL_ID = os.getenv('OPENFGA_MODEL_ID')
+OPENFGA_STATE_FILE = os.getenv(
+    'OPENFGA_STATE_FILE', os.path.join(os.path.dirname(__file__), '..', '..', 'openfga_state.json')
+)
+
+# Consistency modes accepted by check, read and list requests (omitted means the server default)
+CONSISTENCY_MINIMIZE_LATENCY = 'MINIMIZE_LATENCY'
+CONSISTENCY_HIGHER = 'HIGHER_CONSISTENCY'
+CONSISTENCY_MODES = (CONSISTENCY_MINIMIZE_LATENCY, CONSISTENCY_HIGHER)
+
+# Per-operation request deadlines in seconds
+OPENFGA_TIMEOUTS = {
+    'check': float(os.getenv('OPENFGA_CHECK_TIMEOUT', '2')),
+    'read': float(os.getenv('OPENFGA_READ_TIMEOUT', '5')),
+    'list': float(os.getenv('OPENFGA_LIST_TIMEOUT', '10')),
+    'write': float(os.getenv('OPENFGA_WRITE_TIMEOUT', '5')),
+    'admin': float(os.getenv('OPENFGA_ADMIN_TIMEOUT', '10'))
+}
+
+# Retries for idempotent requests (jittered exponential backoff)
+OPENFGA_MAX_RETRIES = int(os.getenv('OPENFGA_MAX_RETRIES', '2'))
+OPENFGA_RETRY_BASE_DELAY = float(os.getenv('OPENFGA_RETRY_BASE_DELAY', '0.1'))
+OPENFGA_RETRY_MAX_DELAY = float(os.getenv('OPENFGA_RETRY_MAX_DELAY', '2'))
+
+# Circuit breaker: open after this many consecutive failures, then allow a trial request after the reset timeout
+OPENFGA_BREAKER_FAILURE_THRESHOLD = int(os.getenv('OPENFGA_BREAKER_FAILURE_THRESHOLD', '5'))
+OPENFGA_BREAKER_RESET_TIMEOUT = float(os.getenv('OPENFGA_BREAKER_RESET_TIMEOUT', '30'))
+
+# Hedged checks: send a second check when the first is slower than the given latency percentile
+OPENFGA_HEDGE_CHECKS = os.getenv('OPENFGA_HEDGE_CHECKS', '').lower() in ('1', 'true', 'yes')
+OPENFGA_HEDGE_PERCENTILE = float(os.getenv('OPENFGA_HEDGE_PERCENTILE', '95'))
+OPENFGA_HEDGE_MIN_DELAY = float(os.getenv('OPENFGA_HEDGE_MIN_DELAY', '0.01'))
+# Hedges allowed per check on average (token bucket), bounding the extra load on OpenFGA
+OPENFGA_HEDGE_MAX_RATE = float(os.getenv('OPENFGA_HEDGE_MAX_RATE', '0.05'))
 
 # Authorization model object types
 OBJECT_TYPES = {
@@ -0,0 +1,74 @@
+"""
+Latency tracking and load budget for hedged OpenFGA checks
+"""
+import threading
+from collections import deque
+from . import metrics
+from .config import (
+    OPENFGA_HEDGE_CHECKS, OPENFGA_HEDGE_PERCENTILE, OPENFGA_HEDGE_MIN_DELAY, OPENFGA_HEDGE_MAX_RATE, OPENFGA_TIMEOUTS
+)
+
+# Check latencies kept for the percentile, and how often it is recomputed
+LATENCY_WINDOW_SIZE = 1000
+DELAY_REFRESH_INTERVAL = 50
+# Latencies needed before the percentile is trusted; until then checks are not hedged
+MIN_SAMPLES = 100
+# Unused hedges that can accumulate for a burst of slow checks
+HEDGE_BURST = 10.0
+
+class CheckHedger:
+    """Decides when a check should be hedged and whether the hedge budget allows it"""
+
+    def __init__(self, percentile: float, min_delay: float, max_rate: float):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_rate = max_rate
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW_SIZE)
+        self._since_refresh = 0
+        self._delay = None
+        self._tokens = HEDGE_BURST
+
+    def record_latency(self, seconds: float):
+        """Record how long a check took to answer"""
+        with self._lock:
+            self._latencies.append(seconds)
+            self._since_refresh += 1
+            if len(self._latencies) >= MIN_SAMPLES and (self._delay is None or self._since_refresh >= DELAY_REFRESH_INTERVAL):
+                ordered = sorted(self._latencies)
+                index = min(int(len(ordered) * self.percentile / 100), len(ordered) - 1)
+                self._delay = min(max(ordered[index], self.min_delay), OPENFGA_TIMEOUTS['check'])
+                self._since_refresh = 0
+                metrics.set_gauge('openfga_hedge_delay_seconds', self._delay)
+
+    def get_delay(self):
+        """Get the current hedge delay in seconds, or None while there are too few samples"""
+        with self._lock:
+            return self._delay
+
+    def start_check(self):
+        """Count a check and earn its share of the hedge budget"""
+        metrics.increment('openfga_hedge_checks_total')
+        with self._lock:
+            self._tokens = min(self._tokens + self.max_rate, HEDGE_BURST)
+
+    def try_acquire(self) -> bool:
+        """Spend one hedge from the budget, returning False when it is exhausted"""
+        with self._lock:
+            if self._tokens < 1:
+                acquired = False
+            else:
+                self._tokens -= 1
+                acquired = True
+        metrics.increment('openfga_hedges_sent_total' if acquired else 'openfga_hedge_budget_exhausted_total')
+        return acquired
+
+hedger = CheckHedger(OPENFGA_HEDGE_PERCENTILE, OPENFGA_HEDGE_MIN_DELAY, OPENFGA_HEDGE_MAX_RATE)
+
+metrics.register('openfga_hedge_checks_total', 'counter', 'Checks eligible for hedging')
+metrics.register('openfga_hedges_sent_total', 'counter', 'Hedged check requests sent')
+metrics.register('openfga_hedge_wins_total', 'counter', 'Hedged checks answered by the hedge before the original')
+metrics.register('openfga_hedge_budget_exhausted_total', 'counter', 'Hedges skipped because the hedge budget was spent')
+metrics.register('openfga_hedge_delay_seconds', 'gauge', 'Current delay before a check is hedged')
+metrics.register('openfga_hedge_enabled', 'gauge', 'Whether permission checks are hedged (1) or not (0)')
+metrics.set_gauge('openfga_hedge_enabled', 1 if OPENFGA_HEDGE_CHECKS else 0)
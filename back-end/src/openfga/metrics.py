@@ -0,0 +1,49 @@
+"""
+In-process counters and gauges for OpenFGA client behaviour, rendered in Prometheus text format
+"""
+import threading
+from typing import Dict, Tuple
+
+_lock = threading.Lock()
+_metrics: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+_types: Dict[str, str] = {}
+_help: Dict[str, str] = {}
+
+def register(name: str, metric_type: str, description: str):
+    """Declare a metric so it is rendered with HELP and TYPE lines even before it is set"""
+    with _lock:
+        _types[name] = metric_type
+        _help[name] = description
+        _metrics.setdefault(name, {})
+
+def increment(name: str, value: float = 1, **labels: str):
+    """Add to a counter"""
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        series = _metrics.setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+
+def set_gauge(name: str, value: float, **labels: str):
+    """Set a gauge"""
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        _metrics.setdefault(name, {})[key] = value
+
+def render() -> str:
+    """Render every metric in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        for name in sorted(_metrics):
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+                lines.append(f"# TYPE {name} {_types[name]}")
+            for key, value in sorted(_metrics[name].items()):
+                label_text = ','.join(f'{label}="{label_value}"' for label, label_value in key)
+                lines.append(f"{name}{{{label_text}}} {value:g}" if label_text else f"{name} {value:g}")
+    return '\n'.join(lines) + '\n'
+
+register('openfga_requests_total', 'counter', 'OpenFGA requests by operation and outcome')
+register('openfga_retries_total', 'counter', 'OpenFGA request retries by operation')
+register('openfga_circuit_breaker_state', 'gauge', 'Circuit breaker state (0 closed, 1 open, 2 half-open)')
+register('openfga_circuit_breaker_opened_total', 'counter', 'Times the circuit breaker has opened')
+register('openfga_circuit_breaker_rejected_total', 'counter', 'Requests rejected while the circuit breaker was open')
@@ -0,0 +1,276 @@
+"""
+The Rebecca authorization model and a codec compiled from it for local tuple validation
+"""
+import base64
+import binascii
+import hashlib
+import json
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+# Written to OpenFGA by OpenFGAService._ensure_model
+AUTHORIZATION_MODEL = {
+    "schema_version": "1.1",
+    "type_definitions": [
+        {
+            "type": "user"
+        },
+        {
+            "type": "group",
+            "relations": {
+                "member": {"this": {}}
+            },
+            "metadata": {
+                "relations": {
+                    "member": {
+                        "directly_related_user_types": [{"type": "user"}]
+                    }
+                }
+            }
+        },
+        {
+            "type": "folder",
+            "relations": {
+                "owner": {"this": {}},
+                "editor": {"this": {}},
+                "viewer": {"this": {}},
+                "owner_via_group": {
+                    "tupleToUserset": {
+                        "tupleset": {"relation": "owner"},
+                        "computedUserset": {"relation": "member"}
+                    }
+                },
+                "editor_via_group": {
+                    "tupleToUserset": {
+                        "tupleset": {"relation": "editor"},
+                        "computedUserset": {"relation": "member"}
+                    }
+                },
+                "viewer_via_group": {
+                    "tupleToUserset": {
+                        "tupleset": {"relation": "viewer"},
+                        "computedUserset": {"relation": "member"}
+                    }
+                }
+            },
+            "metadata": {
+                "relations": {
+                    "owner": {
+                        "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
+                    },
+                    "editor": {
+                        "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
+                    },
+                    "viewer": {
+                        "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
+                    }
+                }
+            }
+        },
+        {
+            "type": "document",
+            "relations": {
+                "owner": {"this": {}},
+                "editor": {"this": {}},
+                "viewer": {"this": {}},
+                "owner_via_group": {
+                    "tupleToUserset": {
+                        "tupleset": {"relation": "owner"},
+                        "computedUserset": {"relation": "member"}
+                    }
+                },
+                "editor_via_group": {
+                    "tupleToUserset": {
+                        "tupleset": {"relation": "editor"},
+                        "computedUserset": {"relation": "member"}
+                    }
+                },
+                "viewer_via_group": {
+                    "tupleToUserset": {
+                        "tupleset": {"relation": "viewer"},
+                        "computedUserset": {"relation": "member"}
+                    }
+                }
+            },
+            "metadata": {
+                "relations": {
+                    "owner": {
+                        "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
+                    },
+                    "editor": {
+                        "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
+                    },
+                    "viewer": {
+                        "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
+                    }
+                }
+            }
+        },
+        {
+            "type": "project",
+            "relations": {
+                "owner": {"this": {}},
+                "editor": {"this": {}},
+                "viewer": {"this": {}},
+                "owner_via_group": {
+                    "tupleToUserset": {
+                        "tupleset": {"relation": "owner"},
+                        "computedUserset": {"relation": "member"}
+                    }
+                },
+                "editor_via_group": {
+                    "tupleToUserset": {
+                        "tupleset": {"relation": "editor"},
+                        "computedUserset": {"relation": "member"}
+                    }
+                },
+                "viewer_via_group": {
+                    "tupleToUserset": {
+                        "tupleset": {"relation": "viewer"},
+                        "computedUserset": {"relation": "member"}
+                    }
+                }
+            },
+            "metadata": {
+                "relations": {
+                    "owner": {
+                        "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
+                    },
+                    "editor": {
+                        "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
+                    },
+                    "viewer": {
+                        "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
+                    }
+                }
+            }
+        }
+    ]
+}
+
+class ModelCodec:
+    """Relation lookup, tuple validation and relationship IDs for one authorization model.
+
+    Compiles the model once into a dict of type -> relation -> directly assignable user
+    types, so validation is a couple of hash lookups instead of a round trip to OpenFGA.
+    """
+
+    def __init__(self, model: Dict[str, Any]):
+        self.model = model
+        # Identifies the model by content, so an unchanged model is never written twice
+        self.content_hash = hashlib.sha256(
+            json.dumps(model, sort_keys=True, separators=(',', ':')).encode()
+        ).hexdigest()
+        # Relations defined without a direct assignment ("this") map to an empty set
+        self.relations: Dict[str, Dict[str, FrozenSet[str]]] = {}
+        for type_definition in model['type_definitions']:
+            metadata = (type_definition.get('metadata') or {}).get('relations') or {}
+            self.relations[type_definition['type']] = {
+                relation: frozenset(
+                    _user_type_key(user_type)
+                    for user_type in metadata.get(relation, {}).get('directly_related_user_types', [])
+                )
+                for relation in type_definition.get('relations', {})
+            }
+
+    def has_relation(self, object_type: str, relation: str) -> bool:
+        """Check whether the model defines a relation on an object type"""
+        return relation in self.relations.get(object_type, ())
+
+    def reference_filters(self, ref: str) -> List[Dict[str, str]]:
+        """Read filters that together match every tuple referencing an entity, either as the
+        object or as the user (the entity itself or one of its usersets, such as group:x#member).
+        OpenFGA reads by user need an object type, so there is one filter per type that can hold
+        the user"""
+        ref_type = ref.split(':', 1)[0]
+        own_relations = self.relations.get(ref_type, {})
+        filters = [{'object_ref': ref}] if own_relations else []
+        subjects = [(ref, ref_type)] + [(f"{ref}#{relation}", f"{ref_type}#{relation}") for relation in own_relations]
+        for user, key in subjects:
+            for object_type, relations in self.relations.items():
+                if any(key in allowed for allowed in relations.values()):
+                    filters.append({'user': user, 'object_ref': f"{object_type}:"})
+        return filters
+
+    def validate_tuple(self, user: str, relation: str, object_ref: str):
+        """Raise ValueError unless the tuple can be written under this model"""
+        object_type, _, object_id = object_ref.partition(':')
+        if not object_id:
+            raise ValueError(f"Invalid object '{object_ref}': expected type:id")
+        if object_type not in self.relations:
+            raise ValueError(f"Unknown object type '{object_type}'")
+        allowed = self.relations[object_type].get(relation)
+        if allowed is None:
+            raise ValueError(f"Unknown relation '{relation}' on type '{object_type}'")
+        if not allowed:
+            raise ValueError(f"Relation '{relation}' on type '{object_type}' cannot be assigned directly")
+
+        user_type, _, user_id = user.partition(':')
+        if not user_id:
+            raise ValueError(f"Invalid user '{user}': expected type:id")
+        user_id, _, user_relation = user_id.partition('#')
+        if user_relation:
+            key = f"{user_type}#{user_relation}"
+        elif user_id == '*':
+            key = f"{user_type}:*"
+        else:
+            key = user_type
+        if key not in allowed:
+            raise ValueError(f"User type '{key}' is not allowed for {object_type}#{relation}")
+
+    def validate_check(self, user: str, relation: str, object_ref: str):
+        """Raise ValueError unless the check is meaningful under this model"""
+        object_type, _, object_id = object_ref.partition(':')
+        user_type, _, user_id = user.partition(':')
+        if not (object_id and user_id):
+            raise ValueError("User and object must be of the form type:id")
+        if user_type not in self.relations:
+            raise ValueError(f"Unknown user type '{user_type}'")
+        if not self.has_relation(object_type, relation):
+            raise ValueError(f"Unknown relation '{relation}' on type '{object_type}'")
+
+    @staticmethod
+    def encode_id(user: str, relation: str, object_ref: str) -> str:
+        """Encode a tuple as a URL-safe relationship ID.
+
+        The ID is the unpadded base64url form of object#relation@user, the tuple's canonical
+        OpenFGA notation, so it decodes without knowing the model and is the same in every process.
+        """
+        return base64.urlsafe_b64encode(f"{object_ref}#{relation}@{user}".encode()).rstrip(b'=').decode()
+
+    def decode_id(self, relationship_id: str) -> Optional[Tuple[str, str, str]]:
+        """Decode a relationship ID into (user, relation, object), or None if it is malformed.
+
+        Also accepts the older user:relation:object IDs, which always contain a colon;
+        base64url IDs never do.
+        """
+        if ':' in relationship_id:
+            return self._decode_legacy_id(relationship_id)
+        try:
+            text = base64.urlsafe_b64decode(relationship_id + '=' * (-len(relationship_id) % 4)).decode()
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+        object_ref, _, rest = text.partition('#')
+        relation, _, user = rest.partition('@')
+        if not (object_ref and relation and user):
+            return None
+        return user, relation, object_ref
+
+    def _decode_legacy_id(self, relationship_id: str) -> Optional[Tuple[str, str, str]]:
+        """Helper method to split a user:relation:object ID, where user and object are type:id"""
+        parts = relationship_id.split(':', 3)
+        if len(parts) != 4 or not all(parts):
+            return None
+        user_type, user_id, relation, object_ref = parts
+        if not self.has_relation(object_ref.partition(':')[0], relation):
+            return None
+        return f"{user_type}:{user_id}", relation, object_ref
+
+def _user_type_key(user_type: Dict[str, Any]) -> str:
+    """Key for a directly related user type: type, type#relation or type:*"""
+    if 'relation' in user_type:
+        return f"{user_type['type']}#{user_type['relation']}"
+    if 'wildcard' in user_type:
+        return f"{user_type['type']}:*"
+    return user_type['type']
+
+model_codec = ModelCodec(AUTHORIZATION_MODEL)
@@ -0,0 +1,95 @@
+"""
+Typed errors, retry backoff and the circuit breaker shared by every OpenFGA client
+"""
+import random
+import threading
+import time
+from . import metrics
+from .config import (
+    OPENFGA_RETRY_BASE_DELAY, OPENFGA_RETRY_MAX_DELAY,
+    OPENFGA_BREAKER_FAILURE_THRESHOLD, OPENFGA_BREAKER_RESET_TIMEOUT
+)
+
+class OpenFGAError(Exception):
+    """OpenFGA answered but refused the request (for example an invalid tuple)"""
+
+class OpenFGAUnavailableError(OpenFGAError):
+    """OpenFGA could not answer: timeout, connection failure or a 5xx/429 response"""
+
+class CircuitOpenError(OpenFGAUnavailableError):
+    """The circuit breaker is open, so the request was not sent"""
+
+# Gauge values for openfga_circuit_breaker_state
+BREAKER_STATES = {'closed': 0, 'open': 1, 'half_open': 2}
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    Opens after failure_threshold consecutive failures and rejects requests until
+    reset_timeout has passed, then lets a single trial request through (half-open).
+    The trial's outcome closes the breaker or opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        metrics.set_gauge('openfga_circuit_breaker_state', BREAKER_STATES['closed'])
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request may be sent now"""
+        with self._lock:
+            if self._state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._set_state('half_open')
+            if self._state == 'closed':
+                return
+            if self._state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+        metrics.increment('openfga_circuit_breaker_rejected_total')
+        raise CircuitOpenError("OpenFGA circuit breaker is open")
+
+    def record_success(self):
+        """Record a request that OpenFGA answered"""
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self._state != 'closed':
+                self._set_state('closed')
+
+    def record_failure(self):
+        """Record a request that failed because OpenFGA was unavailable"""
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == 'half_open' or self._failures >= self.failure_threshold:
+                if self._state != 'open':
+                    metrics.increment('openfga_circuit_breaker_opened_total')
+                self._opened_at = time.monotonic()
+                self._set_state('open')
+
+    def release_trial(self):
+        """Free the half-open trial slot after a request ended without an answer either way"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def _set_state(self, state: str):
+        """Helper method to change state; the caller holds the lock"""
+        self._state = state
+        metrics.set_gauge('openfga_circuit_breaker_state', BREAKER_STATES[state])
+
+# Shared by every service instance, as the DALs create a new service per operation
+breaker = CircuitBreaker(OPENFGA_BREAKER_FAILURE_THRESHOLD, OPENFGA_BREAKER_RESET_TIMEOUT)
+
+def retry_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (starting at 0)"""
+    return random.uniform(0, min(OPENFGA_RETRY_BASE_DELAY * 2 ** attempt, OPENFGA_RETRY_MAX_DELAY))
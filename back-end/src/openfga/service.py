@@ -4,242 +4,128 @@ OpenFGA Service - Handles all interactions with OpenFGA (using direct HTTP calls
 import asyncio
 import aiohttp
 import json
-from typing import List, Optional, Dict, Any
-from .config import OPENFGA_API_URL, OPENFGA_STORE_ID, OPENFGA_MODEL_ID
+import threading
+import time
+from typing import List, Optional, Dict, Any, Tuple
+from . import metrics
+from .config import (
+    OPENFGA_API_URL, OPENFGA_STORE_ID, OPENFGA_MODEL_ID, OPENFGA_TIMEOUTS, OPENFGA_MAX_RETRIES, OPENFGA_HEDGE_CHECKS
+)
+from .hedging import hedger
+from .model import model_codec
+from .resilience import OpenFGAError, OpenFGAUnavailableError, breaker, retry_delay
+from .state import load_state, save_state, state_lock
+
+# (store ID, model ID) once resolved and verified; resolution happens once per process
+_resolved_ids: Optional[Tuple[str, str]] = None
+_resolve_lock = threading.Lock()
+# Error codes meaning the resolved store or model no longer exists (e.g. OpenFGA restarted without persistence)
+STALE_ID_ERROR_CODES = ('store_id_not_found', 'authorization_model_not_found')
 
 
 class OpenFGAService:
     """Service for interacting with OpenFGA"""
     
+    # Compiled once from the model written by _ensure_model; needs no connection to use
+    codec = model_codec
+    
     def __init__(self):
         self.session = None
         self.store_id = OPENFGA_STORE_ID
         self.model_id = OPENFGA_MODEL_ID
         
     async def initialize(self):
-        """Initialize the OpenFGA service"""
+        """Initialize the OpenFGA service. Only the first service in a process talks to OpenFGA here"""
         try:
-            self.session = aiohttp.ClientSession()
-            
-            # Check if configured store exists, if not create new one
-            await self._ensure_store()
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=OPENFGA_TIMEOUTS['admin']))
             
-            # Check if configured model exists, if not create new one  
-            await self._ensure_model()
-            
-            print(f"Using OpenFGA store: {self.store_id}")
-            print(f"Using authorization model: {self.model_id}")
+            resolved_ids = _resolved_ids
+            if resolved_ids is None:
+                # Resolved on a separate thread and event loop, so services created concurrently
+                # in this loop wait for the first resolution instead of deadlocking on the locks
+                resolved_ids = await asyncio.to_thread(_resolve_ids_once)
+            self.store_id, self.model_id = resolved_ids
                 
         except Exception as e:
             print(f"Failed to initialize OpenFGA service: {e}")
+            await self.close()
             raise
     
-    async def _ensure_store(self):
-        """Ensure we have a valid store"""
-        # First try to use configured store
-        if self.store_id and self.store_id != "01JYYK7BG878R7NVQRECYFT5C4":  # Skip default placeholder
+    async def _ensure_store(self, state: Dict[str, Any]):
+        """Ensure we have a valid store, preferring OPENFGA_STORE_ID and then the persisted store"""
+        self.store_id = OPENFGA_STORE_ID or state['store_id']
+        if self.store_id:
             try:
-                async with self.session.get(f"{OPENFGA_API_URL}/stores/{self.store_id}") as response:
-                    if response.status == 200:
-                        print(f"Using existing store: {self.store_id}")
-                        return
+                status, _ = await self._request('admin', 'GET', f"/stores/{self.store_id}")
+                if status == 200:
+                    print(f"Using existing store: {self.store_id}")
+                    return
+            except OpenFGAUnavailableError:
+                raise
             except:
                 pass
         
         # Look for existing rebecca-store by name
         try:
-            async with self.session.get(f"{OPENFGA_API_URL}/stores") as response:
-                if response.status == 200:
-                    data = await response.json()
-                    for store in data.get("stores", []):
-                        if store.get("name") == "rebecca-store":
-                            self.store_id = store["id"]
-                            print(f"Found existing rebecca-store: {self.store_id}")
-                            return
+            status, data = await self._request('admin', 'GET', "/stores")
+            if status == 200:
+                for store in data.get("stores", []):
+                    if store.get("name") == "rebecca-store":
+                        self.store_id = store["id"]
+                        print(f"Found existing rebecca-store: {self.store_id}")
+                        return
+        except OpenFGAUnavailableError:
+            raise
         except:
             pass
         
         # Store doesn't exist, create a new one
         try:
             payload = {"name": "rebecca-store"}
-            async with self.session.post(f"{OPENFGA_API_URL}/stores", json=payload) as response:
-                if response.status == 201:
-                    data = await response.json()
-                    self.store_id = data["id"]
-                    print(f"✅ Created new store: {self.store_id}")
-                    self._update_config_file()
-                else:
-                    raise Exception(f"Failed to create store: {response.status}")
+            status, data = await self._request('admin', 'POST', "/stores", payload, idempotent=False)
+            if status == 201:
+                self.store_id = data["id"]
+                print(f"✅ Created new store: {self.store_id}")
+            else:
+                raise OpenFGAError(f"Failed to create store: {status}")
         except Exception as e:
             print(f"Failed to create store: {e}")
             raise
     
-    async def _ensure_model(self):
-        """Ensure we have a valid authorization model"""
-        # Force new model creation to ensure group permissions work
-        print("🔄 Force creating new model to ensure group permissions work...")
-        self.model_id = None  # Clear existing model ID to force new creation
+    async def _ensure_model(self, state: Dict[str, Any]):
+        """Ensure the store has this model, reusing the model ID persisted for its content hash"""
+        if OPENFGA_MODEL_ID:
+            # Pinned explicitly, so it is used as is
+            self.model_id = OPENFGA_MODEL_ID
+            return
         
-        # Always create a new model to ensure we have the latest group permission support
-        print("🔨 Creating new authorization model with group inheritance support...")
-        model_json = {
-            "schema_version": "1.1",
-            "type_definitions": [
-                {
-                    "type": "user"
-                },
-                {
-                    "type": "group",
-                    "relations": {
-                        "member": {"this": {}}
-                    },
-                    "metadata": {
-                        "relations": {
-                            "member": {
-                                "directly_related_user_types": [{"type": "user"}]
-                            }
-                        }
-                    }
-                },
-                {
-                    "type": "folder",
-                    "relations": {
-                        "owner": {"this": {}},
-                        "editor": {"this": {}},
-                        "viewer": {"this": {}},
-                        "owner_via_group": {
-                            "tupleToUserset": {
-                                "tupleset": {"relation": "owner"},
-                                "computedUserset": {"relation": "member"}
-                            }
-                        },
-                        "editor_via_group": {
-                            "tupleToUserset": {
-                                "tupleset": {"relation": "editor"},
-                                "computedUserset": {"relation": "member"}
-                            }
-                        },
-                        "viewer_via_group": {
-                            "tupleToUserset": {
-                                "tupleset": {"relation": "viewer"},
-                                "computedUserset": {"relation": "member"}
-                            }
-                        }
-                    },
-                    "metadata": {
-                        "relations": {
-                            "owner": {
-                                "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
-                            },
-                            "editor": {
-                                "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
-                            },
-                            "viewer": {
-                                "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
-                            }
-                        }
-                    }
-                },
-                {
-                    "type": "document",
-                    "relations": {
-                        "owner": {"this": {}},
-                        "editor": {"this": {}},
-                        "viewer": {"this": {}},
-                        "owner_via_group": {
-                            "tupleToUserset": {
-                                "tupleset": {"relation": "owner"},
-                                "computedUserset": {"relation": "member"}
-                            }
-                        },
-                        "editor_via_group": {
-                            "tupleToUserset": {
-                                "tupleset": {"relation": "editor"},
-                                "computedUserset": {"relation": "member"}
-                            }
-                        },
-                        "viewer_via_group": {
-                            "tupleToUserset": {
-                                "tupleset": {"relation": "viewer"},
-                                "computedUserset": {"relation": "member"}
-                            }
-                        }
-                    },
-                    "metadata": {
-                        "relations": {
-                            "owner": {
-                                "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
-                            },
-                            "editor": {
-                                "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
-                            },
-                            "viewer": {
-                                "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
-                            }
-                        }
-                    }
-                },
-                {
-                    "type": "project",
-                    "relations": {
-                        "owner": {"this": {}},
-                        "editor": {"this": {}},
-                        "viewer": {"this": {}},
-                        "owner_via_group": {
-                            "tupleToUserset": {
-                                "tupleset": {"relation": "owner"},
-                                "computedUserset": {"relation": "member"}
-                            }
-                        },
-                        "editor_via_group": {
-                            "tupleToUserset": {
-                                "tupleset": {"relation": "editor"},
-                                "computedUserset": {"relation": "member"}
-                            }
-                        },
-                        "viewer_via_group": {
-                            "tupleToUserset": {
-                                "tupleset": {"relation": "viewer"},
-                                "computedUserset": {"relation": "member"}
-                            }
-                        }
-                    },
-                    "metadata": {
-                        "relations": {
-                            "owner": {
-                                "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
-                            },
-                            "editor": {
-                                "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
-                            },
-                            "viewer": {
-                                "directly_related_user_types": [{"type": "user"}, {"type": "group"}]
-                            }
-                        }
-                    }
-                }
-            ]
-        }
+        models = state['models'] if state['store_id'] == self.store_id else {}
+        self.model_id = models.get(self.codec.content_hash)
+        if self.model_id:
+            status, _ = await self._request('admin', 'GET', f"/stores/{self.store_id}/authorization-models/{self.model_id}")
+            if status == 200:
+                print(f"Using existing model: {self.model_id}")
+                return
         
+        print("🔨 Creating authorization model...")
         try:
-            url = f"{OPENFGA_API_URL}/stores/{self.store_id}/authorization-models"
-            async with self.session.post(url, json=model_json) as response:
-                if response.status == 201:
-                    data = await response.json()
-                    self.model_id = data["authorization_model_id"]
-                    print(f"✅ Created new model: {self.model_id}")
-                    self._update_config_file()
-                else:
-                    error_text = await response.text()
-                    raise Exception(f"Failed to create model: {response.status} - {error_text}")
+            path = f"/stores/{self.store_id}/authorization-models"
+            status, data = await self._request('admin', 'POST', path, self.codec.model, idempotent=False)
+            if status == 201:
+                self.model_id = data["authorization_model_id"]
+                print(f"✅ Created new model: {self.model_id}")
+            else:
+                raise OpenFGAError(f"Failed to create model: {status} - {data}")
         except Exception as e:
             print(f"Failed to create authorization model: {e}")
             raise
     
     async def write_tuple(self, user: str, relation: str, object_ref: str) -> bool:
-        """Write a relationship tuple to OpenFGA"""
+        """Write a relationship tuple to OpenFGA. Returns False if OpenFGA rejects it, and raises
+        OpenFGAUnavailableError when OpenFGA cannot answer, so that is never mistaken for a rejection"""
         try:
-            url = f"{OPENFGA_API_URL}/stores/{self.store_id}/write"
+            self.codec.validate_tuple(user, relation, object_ref)
+            path = f"/stores/{self.store_id}/write"
             payload = {
                 "writes": {
                     "tuple_keys": [
@@ -256,23 +142,26 @@ class OpenFGAService:
             print(f"🔍 Writing tuple: {user} -> {relation} -> {object_ref}")
             print(f"🔍 Using model ID: {self.model_id}")
             
-            async with self.session.post(url, json=payload) as response:
-                if response.status == 200:
-                    print(f"✅ Write successful")
-                    return True
-                else:
-                    error_text = await response.text()
-                    print(f"❌ Write tuple failed with status {response.status}: {error_text}")
-                    return False
+            # Plain writes fail on duplicates, so a retried write that had landed would be reported as failed
+            status, data = await self._request('write', 'POST', path, payload, idempotent=False)
+            if status == 200:
+                print(f"✅ Write successful")
+                return True
+            else:
+                print(f"❌ Write tuple failed with status {status}: {data}")
+                return False
             
+        except OpenFGAUnavailableError:
+            raise
         except Exception as e:
             print(f"Failed to write tuple: {e}")
             return False
     
     async def delete_tuple(self, user: str, relation: str, object_ref: str) -> bool:
-        """Delete a relationship tuple from OpenFGA"""
+        """Delete a relationship tuple from OpenFGA. Returns False if OpenFGA rejects it (such as a
+        tuple that does not exist), and raises OpenFGAUnavailableError when OpenFGA cannot answer"""
         try:
-            url = f"{OPENFGA_API_URL}/stores/{self.store_id}/write"
+            path = f"/stores/{self.store_id}/write"
             payload = {
                 "deletes": {
                     "tuple_keys": [
@@ -285,17 +174,47 @@ class OpenFGAService:
                 }
             }
             
-            async with self.session.post(url, json=payload) as response:
-                return response.status == 200
+            status, _ = await self._request('write', 'POST', path, payload, idempotent=False)
+            return status == 200
             
+        except OpenFGAUnavailableError:
+            raise
         except Exception as e:
             print(f"Failed to delete tuple: {e}")
             return False
     
-    async def check_permission(self, user: str, relation: str, object_ref: str) -> bool:
-        """Check if a user has a specific relation to an object"""
+    async def write_tuples(self, writes: List[Dict[str, str]], deletes: List[Dict[str, str]],
+                           on_duplicate: str = 'ignore', on_missing: str = 'ignore'):
+        """Write and delete a batch of tuples in a single request, which OpenFGA applies atomically.
+        By default existing writes and missing deletes are ignored; pass 'error' to reject the batch
+        instead. Raises ValueError if a tuple is invalid for the model (checked before sending) or
+        OpenFGA rejects the batch, and OpenFGAError on any other failure"""
+        for tuple_key in list(writes) + list(deletes):
+            self.codec.validate_tuple(tuple_key['user'], tuple_key['relation'], tuple_key['object'])
+
+        path = f"/stores/{self.store_id}/write"
+        payload = {"authorization_model_id": self.model_id}
+        if writes:
+            payload["writes"] = {"tuple_keys": writes, "on_duplicate": on_duplicate}
+        if deletes:
+            payload["deletes"] = {"tuple_keys": deletes, "on_missing": on_missing}
+
+        # Ignoring duplicates and missing tuples makes the batch safe to retry; otherwise a retry of a
+        # batch that had landed would be rejected, so it is sent once
+        idempotent = not (writes and on_duplicate == 'error') and not (deletes and on_missing == 'error')
+        status, data = await self._request('write', 'POST', path, payload, idempotent=idempotent)
+        if status == 200:
+            return
+        if status == 400:
+            raise ValueError(f"Write rejected: {data}")
+        raise OpenFGAError(f"Write failed with status {status}: {data}")
+
+    async def check_permission(self, user: str, relation: str, object_ref: str,
+                               consistency: Optional[str] = None) -> bool:
+        """Check if a user has a specific relation to an object.
+        Raises OpenFGAUnavailableError when OpenFGA cannot answer, so that is never mistaken for a denial"""
         try:
-            url = f"{OPENFGA_API_URL}/stores/{self.store_id}/check"
+            path = f"/stores/{self.store_id}/check"
             payload = {
                 "tuple_key": {
                     "user": user,
@@ -303,22 +222,28 @@ class OpenFGAService:
                     "object": object_ref
                 }
             }
+            if consistency:
+                payload["consistency"] = consistency
             
-            async with self.session.post(url, json=payload) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data.get("allowed", False)
-                return False
+            if OPENFGA_HEDGE_CHECKS:
+                status, data = await self._hedged_request('check', path, payload)
+            else:
+                status, data = await self._request('check', 'POST', path, payload)
+            if status == 200:
+                return data.get("allowed", False)
+            return False
             
+        except OpenFGAUnavailableError:
+            raise
         except Exception as e:
             print(f"Failed to check permission: {e}")
             return False
     
     async def read_tuples(self, user: Optional[str] = None, relation: Optional[str] = None, 
-                         object_ref: Optional[str] = None) -> List[Dict[str, Any]]:
+                         object_ref: Optional[str] = None, consistency: Optional[str] = None) -> List[Dict[str, Any]]:
         """Read tuples from OpenFGA with optional filtering"""
         try:
-            url = f"{OPENFGA_API_URL}/stores/{self.store_id}/read"
+            path = f"/stores/{self.store_id}/read"
             payload = {}
             
             # Only add tuple_key if we have specific filters
@@ -331,78 +256,260 @@ class OpenFGAService:
                     payload["tuple_key"]["relation"] = relation
                 if object_ref:
                     payload["tuple_key"]["object"] = object_ref
+            if consistency:
+                payload["consistency"] = consistency
             
             print(f"🔍 Reading tuples with payload: {payload}")
             
-            async with self.session.post(url, json=payload) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    print(f"🔍 Read response: {data}")
-                    
-                    # Convert tuples to dict format matching current API
-                    tuples = []
-                    for tuple_data in data.get("tuples", []):
-                        tuples.append({
-                            'user': tuple_data["key"]["user"],
-                            'relation': tuple_data["key"]["relation"],
-                            'object': tuple_data["key"]["object"]
-                        })
-                    
-                    return tuples
-                else:
-                    error_text = await response.text()
-                    print(f"❌ Read failed with status {response.status}: {error_text}")
-                    return []
+            status, data = await self._request('read', 'POST', path, payload)
+            if status == 200:
+                print(f"🔍 Read response: {data}")
+                
+                # Convert tuples to dict format matching current API
+                tuples = []
+                for tuple_data in data.get("tuples", []):
+                    tuples.append({
+                        'user': tuple_data["key"]["user"],
+                        'relation': tuple_data["key"]["relation"],
+                        'object': tuple_data["key"]["object"]
+                    })
+                
+                return tuples
+            else:
+                print(f"❌ Read failed with status {status}: {data}")
+                return []
             
+        except OpenFGAUnavailableError:
+            raise
         except Exception as e:
             print(f"Failed to read tuples: {e}")
             return []
-    
+
+    async def iter_tuple_pages(self, user: Optional[str] = None, relation: Optional[str] = None,
+                               object_ref: Optional[str] = None, page_size: int = 100,
+                               consistency: Optional[str] = None):
+        """Yield pages of tuples matching the filters, following continuation tokens"""
+        path = f"/stores/{self.store_id}/read"
+        payload = {"page_size": page_size}
+
+        if user or relation or object_ref:
+            payload["tuple_key"] = {}
+            if user:
+                payload["tuple_key"]["user"] = user
+            if relation:
+                payload["tuple_key"]["relation"] = relation
+            if object_ref:
+                payload["tuple_key"]["object"] = object_ref
+        if consistency:
+            payload["consistency"] = consistency
+
+        while True:
+            status, data = await self._request('read', 'POST', path, payload)
+            if status != 200:
+                raise OpenFGAError(f"Read failed with status {status}: {data}")
+
+            yield [
+                {
+                    'user': tuple_data["key"]["user"],
+                    'relation': tuple_data["key"]["relation"],
+                    'object': tuple_data["key"]["object"]
+                }
+                for tuple_data in data.get("tuples", [])
+            ]
+
+            continuation_token = data.get("continuation_token")
+            if not continuation_token:
+                break
+            payload["continuation_token"] = continuation_token
+
+    async def read_all_tuples(self, user: Optional[str] = None, relation: Optional[str] = None,
+                              object_ref: Optional[str] = None, consistency: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Read every tuple matching the filters across all pages"""
+        try:
+            tuples = []
+            async for page in self.iter_tuple_pages(user, relation, object_ref, consistency=consistency):
+                tuples.extend(page)
+            return tuples
+        except OpenFGAUnavailableError:
+            raise
+        except Exception as e:
+            print(f"Failed to read tuples: {e}")
+            return []
+
+    async def tuple_exists(self, user: str, relation: str, object_ref: str,
+                           consistency: Optional[str] = None) -> bool:
+        """Check whether this exact tuple is stored, unlike check_permission, which also follows
+        computed relations"""
+        pages = self.iter_tuple_pages(user, relation, object_ref, page_size=1, consistency=consistency)
+        try:
+            return bool(await anext(pages, []))
+        finally:
+            await pages.aclose()
+
+    async def list_objects(self, user: str, relation: str, object_type: str,
+                           consistency: Optional[str] = None) -> List[str]:
+        """List the objects of a type that a user has a specific relation to"""
+        try:
+            path = f"/stores/{self.store_id}/list-objects"
+            payload = {
+                "authorization_model_id": self.model_id,
+                "type": object_type,
+                "relation": relation,
+                "user": user
+            }
+            if consistency:
+                payload["consistency"] = consistency
+
+            status, data = await self._request('list', 'POST', path, payload)
+            if status == 200:
+                return data.get("objects", [])
+            else:
+                print(f"❌ List objects failed with status {status}: {data}")
+                return []
+
+        except OpenFGAUnavailableError:
+            raise
+        except Exception as e:
+            print(f"Failed to list objects: {e}")
+            return []
+
     async def health_check(self) -> bool:
         """Check if OpenFGA is healthy and accessible"""
         try:
-            async with self.session.get(f"{OPENFGA_API_URL}/stores") as response:
-                return response.status == 200
+            status, _ = await self._request('admin', 'GET', "/stores", idempotent=False)
+            return status == 200
         except Exception:
             return False
     
+    async def _hedged_request(self, operation: str, path: str, payload: Dict[str, Any]) -> Tuple[int, Any]:
+        """Send an idempotent POST and, if it has not answered within the hedge delay and the
+        hedge budget allows, an identical second one. The first successful answer is used and
+        the other request is cancelled"""
+        hedger.start_check()
+        delay = hedger.get_delay()
+        started = time.monotonic()
+        primary = asyncio.ensure_future(self._request(operation, 'POST', path, payload))
+        
+        if delay is None or (await asyncio.wait({primary}, timeout=delay))[0] or not hedger.try_acquire():
+            result = await primary
+            hedger.record_latency(time.monotonic() - started)
+            return result
+        
+        hedge_started = time.monotonic()
+        hedge = asyncio.ensure_future(self._request(operation, 'POST', path, payload))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            metrics.increment('openfga_hedge_wins_total')
+                        hedger.record_latency(time.monotonic() - (hedge_started if task is hedge else started))
+                        return task.result()
+            # Neither answered: report the original request's failure
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+    
+    async def _request(self, operation: str, method: str, path: str, payload: Optional[Dict[str, Any]] = None,
+                       idempotent: bool = True) -> Tuple[int, Any]:
+        """Send a request under the operation's deadline and the shared circuit breaker.
+
+        Idempotent requests are retried with jittered exponential backoff while OpenFGA is
+        unavailable. Returns (status, body) for any answer other than 429 or 5xx, with the
+        body parsed as JSON where possible. Raises OpenFGAUnavailableError once retries are
+        exhausted, or CircuitOpenError without sending anything while the breaker is open.
+        """
+        url = f"{OPENFGA_API_URL}{path}"
+        timeout = aiohttp.ClientTimeout(total=OPENFGA_TIMEOUTS[operation])
+        attempts = 1 + (OPENFGA_MAX_RETRIES if idempotent else 0)
+        
+        for attempt in range(attempts):
+            breaker.before_request()
+            try:
+                async with self.session.request(method, url, json=payload, timeout=timeout) as response:
+                    text = await response.text()
+                    if response.status == 429 or response.status >= 500:
+                        raise OpenFGAUnavailableError(f"status {response.status}: {text}")
+                    status = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError, OpenFGAUnavailableError) as e:
+                breaker.record_failure()
+                metrics.increment('openfga_requests_total', operation=operation, outcome='unavailable')
+                if attempt + 1 >= attempts:
+                    raise OpenFGAUnavailableError(f"OpenFGA {operation} request failed: {str(e) or type(e).__name__}") from e
+                metrics.increment('openfga_retries_total', operation=operation)
+                await asyncio.sleep(retry_delay(attempt))
+                continue
+            except BaseException:
+                # Cancelled or failed locally: OpenFGA's health is unknown, so release any trial slot
+                breaker.release_trial()
+                raise
+            
+            breaker.record_success()
+            metrics.increment('openfga_requests_total', operation=operation, outcome='ok' if status < 400 else 'rejected')
+            try:
+                body = json.loads(text) if text else {}
+            except ValueError:
+                return status, text
+            if status >= 400 and isinstance(body, dict) and body.get('code') in STALE_ID_ERROR_CODES:
+                _forget_resolved_ids()
+            return status, body
+    
     async def close(self):
         """Close the aiohttp session"""
         if self.session:
             await self.session.close()
 
-    def _update_config_file(self):
-        """Update the config file with current store and model IDs"""
-        import os
-        
-        config_path = os.path.join(os.path.dirname(__file__), 'config.py')
-        try:
-            with open(config_path, 'r') as f:
-                content = f.read()
-            
-            # Update the model ID in the config file
-            import re
-            pattern = r"OPENFGA_MODEL_ID = os\.getenv\('OPENFGA_MODEL_ID', '[^']*'\)"
-            replacement = f"OPENFGA_MODEL_ID = os.getenv('OPENFGA_MODEL_ID', '{self.model_id}')"
-            content = re.sub(pattern, replacement, content)
-            
-            # Update the store ID in the config file
-            pattern = r"OPENFGA_STORE_ID = os\.getenv\('OPENFGA_STORE_ID', '[^']*'\)"
-            replacement = f"OPENFGA_STORE_ID = os.getenv('OPENFGA_STORE_ID', '{self.store_id}')"
-            content = re.sub(pattern, replacement, content)
-            
-            with open(config_path, 'w') as f:
-                f.write(content)
-            
-            print(f"✅ Updated config file with store: {self.store_id}, model: {self.model_id}")
-        except Exception as e:
-            print(f"⚠️  Failed to update config file: {e}")
-
 
 # Global instance
 openfga_service = OpenFGAService()
 
 
+def _resolve_ids_once() -> Tuple[str, str]:
+    """Resolve the store and model IDs unless another thread or worker already has.
+    Holds the state file lock throughout, so concurrent workers never create duplicates"""
+    global _resolved_ids
+    with _resolve_lock:
+        if _resolved_ids is None:
+            with state_lock():
+                _resolved_ids = asyncio.run(_resolve_ids())
+        return _resolved_ids
+
+async def _resolve_ids() -> Tuple[str, str]:
+    """Verify or create the store and model, and persist their IDs keyed by the model's content hash"""
+    state = load_state()
+    resolver = OpenFGAService()
+    resolver.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=OPENFGA_TIMEOUTS['admin']))
+    try:
+        await resolver._ensure_store(state)
+        await resolver._ensure_model(state)
+    finally:
+        await resolver.close()
+    
+    print(f"Using OpenFGA store: {resolver.store_id}")
+    print(f"Using authorization model: {resolver.model_id}")
+    
+    # Model IDs belong to a store, so they are dropped when the store changes
+    models = dict(state['models']) if state['store_id'] == resolver.store_id else {}
+    if not OPENFGA_MODEL_ID:
+        models[resolver.codec.content_hash] = resolver.model_id
+    new_state = {'store_id': resolver.store_id, 'models': models}
+    if new_state != {'store_id': state['store_id'], 'models': state['models']}:
+        try:
+            save_state(new_state)
+        except OSError as e:
+            print(f"⚠️  Failed to save OpenFGA state: {e}")
+    return resolver.store_id, resolver.model_id
+
+def _forget_resolved_ids():
+    """Resolve the store and model again on the next initialize"""
+    global _resolved_ids
+    _resolved_ids = None
+
 async def get_openfga_service() -> OpenFGAService:
     """Get the initialized OpenFGA service"""
     if openfga_service.session is None:
@@ -0,0 +1,54 @@
+"""
+Persisted OpenFGA store and authorization model IDs, shared by every worker process
+"""
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Dict
+from .config import OPENFGA_STATE_FILE
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; workers then just race benignly
+    fcntl = None
+
+def load_state() -> Dict[str, Any]:
+    """Read the state file: {"store_id": ..., "models": {content hash: model ID}}.
+    Returns an empty state if the file is missing or unreadable"""
+    try:
+        with open(OPENFGA_STATE_FILE) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {'store_id': None, 'models': {}}
+    if not isinstance(state, dict):
+        return {'store_id': None, 'models': {}}
+    state.setdefault('store_id', None)
+    state.setdefault('models', {})
+    return state
+
+def save_state(state: Dict[str, Any]):
+    """Write the state file atomically, so readers never see a partial file"""
+    directory = os.path.dirname(os.path.abspath(OPENFGA_STATE_FILE))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.openfga_state.')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(temp_path, OPENFGA_STATE_FILE)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+@contextmanager
+def state_lock():
+    """Hold an exclusive lock across processes while the store and model are resolved,
+    so workers booting together create at most one store and one model"""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{OPENFGA_STATE_FILE}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -6,6 +6,7 @@ import pytest
 import requests
 import json
 import time
+import uuid
 
 BASE_URL = "http://localhost:8000"
 
@@ -96,6 +97,13 @@ class TestHealth:
         assert data["status"] == "success"
         assert "timestamp" in data
         assert "openfga_status" in data
+    
+    def test_metrics(self):
+        """Test that metrics are exposed in the Prometheus text format"""
+        response = requests.get(f"{BASE_URL}/metrics")
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("text/plain")
+        assert "# TYPE openfga_circuit_breaker_state gauge" in response.text
 
 # User Tests
 @pytest.mark.integration
@@ -111,7 +119,67 @@ class TestUsers:
         assert isinstance(users, list)
         # Should have at least the sample users from app startup
         assert len(users) >= 3
-    
+
+    def test_get_users_not_modified(self, sample_user):
+        """Test conditional GET with the ETag of the user list"""
+        response = requests.get(f"{BASE_URL}/users")
+        etag = response.headers["ETag"]
+
+        response = requests.get(f"{BASE_URL}/users", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
+        # Any user change invalidates the ETag
+        requests.put(f"{BASE_URL}/users/{sample_user['id']}", json={"name": "Renamed User"})
+        response = requests.get(f"{BASE_URL}/users", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+    def test_get_users_updated_since(self, sample_user):
+        """Test listing only the users changed since a timestamp"""
+        since = sample_user["updated_at_ms"] + 1
+        response = requests.get(f"{BASE_URL}/users", params={"updated_since": since})
+        assert response.status_code == 200
+        assert sample_user["id"] not in [u["id"] for u in response.json()]
+
+        time.sleep(0.01)
+        requests.put(f"{BASE_URL}/users/{sample_user['id']}", json={"name": "Synced User"})
+        response = requests.get(f"{BASE_URL}/users", params={"updated_since": since})
+        assert sample_user["id"] in [u["id"] for u in response.json()]
+
+        response = requests.get(f"{BASE_URL}/users", params={"updated_since": "yesterday"})
+        assert response.status_code == 400
+
+    def test_get_deletions(self):
+        """Test listing the users deleted since a timestamp"""
+        email = f"deleted.{uuid.uuid4().hex[:8]}@example.com"
+        user = requests.post(f"{BASE_URL}/users", json={"name": "Deleted User", "email": email}).json()
+        requests.delete(f"{BASE_URL}/users/{user['id']}")
+
+        response = requests.get(f"{BASE_URL}/deletions",
+                                params={"updated_since": user["updated_at_ms"], "kind": "users"})
+        assert response.status_code == 200
+        assert user["id"] in [d["id"] for d in response.json()]
+
+        response = requests.get(f"{BASE_URL}/deletions")
+        assert response.status_code == 400
+
+    def test_bulk_create_users(self, sample_user):
+        """Test creating users in bulk with per-record conflicts"""
+        users = [
+            {"name": "Bulk One", "email": f"bulk.one.{uuid.uuid4().hex[:8]}@example.com"},
+            {"name": "Bulk Two", "email": sample_user["email"]},
+            {"name": "Bulk Three"}
+        ]
+        response = requests.post(f"{BASE_URL}/users/bulk", json={"users": users})
+        assert response.status_code == 200
+
+        result = response.json()
+        assert result["created"] == 1
+        assert [(e["index"], e["status"]) for e in result["errors"]] == [(1, 409), (2, 400)]
+
+        for user in result["users"]:
+            requests.delete(f"{BASE_URL}/users/{user['id']}")
+
     def test_create_user(self):
         """Test creating a new user"""
         user_data = {
@@ -182,10 +250,35 @@ class TestUsers:
         response = requests.delete(f"{BASE_URL}/users/{user['id']}")
         assert response.status_code == 204
         
+        # Its tuples are removed by a cleanup job
+        response = requests.get(f"{BASE_URL}/cleanup-jobs/{response.headers['X-Cleanup-Job-Id']}")
+        assert response.status_code == 200
+        assert response.json()["entities_total"] == 1
+        
         # Verify user is gone
         response = requests.get(f"{BASE_URL}/users/{user['id']}")
         assert response.status_code == 404
 
+    def test_get_accessible_resources(self, sample_user, sample_resource, sample_relationship):
+        """Test listing the resources a user can view"""
+        response = requests.get(f"{BASE_URL}/users/{sample_user['id']}/accessible?relation=viewer&type=document")
+        assert response.status_code == 200
+
+        data = response.json()
+        assert data["relation"] == "viewer"
+        assert data["type"] == "document"
+        assert sample_resource["id"] in [r["id"] for r in data["resources"]]
+
+        # A viewer grant does not imply ownership
+        response = requests.get(f"{BASE_URL}/users/{sample_user['id']}/accessible?relation=owner&type=document")
+        assert response.status_code == 200
+        assert sample_resource["id"] not in [r["id"] for r in response.json()["resources"]]
+
+    def test_get_accessible_resources_requires_type(self, sample_user):
+        """Test that the resource type is required"""
+        response = requests.get(f"{BASE_URL}/users/{sample_user['id']}/accessible")
+        assert response.status_code == 400
+
 # Resource Tests
 @pytest.mark.integration
 class TestResources:
@@ -258,6 +351,50 @@ class TestResources:
         assert resource["metadata"] == update_data["metadata"]
         assert resource["id"] == sample_resource["id"]
 
+    def test_get_resources_for_subject(self, sample_user, sample_resource, sample_relationship):
+        """Test listing only the resources a subject can access"""
+        response = requests.get(
+            f"{BASE_URL}/resources",
+            params={"subject": f"user:{sample_user['id']}", "relation": "viewer", "limit": 1}
+        )
+        assert response.status_code == 200
+
+        data = response.json()
+        assert [r["id"] for r in data["resources"]] == [sample_resource["id"]]
+        assert data["next_cursor"] is None
+
+    def test_get_resources_by_metadata(self, sample_resource):
+        """Test filtering resources on a metadata key"""
+        response = requests.get(f"{BASE_URL}/resources", params={"metadata.category": "testing"})
+        assert response.status_code == 200
+        assert sample_resource["id"] in [r["id"] for r in response.json()]
+
+        response = requests.get(f"{BASE_URL}/resources", params={"metadata.category": "no-such-category"})
+        assert sample_resource["id"] not in [r["id"] for r in response.json()]
+
+    def test_get_resources_for_subject_invalid_cursor(self, sample_user):
+        """Test that a malformed cursor is rejected"""
+        response = requests.get(
+            f"{BASE_URL}/resources",
+            params={"subject": f"user:{sample_user['id']}", "cursor": "not-a-cursor"}
+        )
+        assert response.status_code == 400
+
+    def test_get_resource_principals(self, sample_user, sample_resource, sample_relationship):
+        """Test listing the users who can access a resource"""
+        response = requests.get(f"{BASE_URL}/resources/{sample_resource['id']}/principals?relation=viewer")
+        assert response.status_code == 200
+
+        data = response.json()
+        principal = next(p for p in data["principals"] if p["user"]["id"] == sample_user["id"])
+        assert principal["relations"] == ["viewer"]
+        assert principal["via"] == ["direct"]
+
+        # A viewer grant does not make the user an editor
+        response = requests.get(f"{BASE_URL}/resources/{sample_resource['id']}/principals?relation=editor")
+        assert response.status_code == 200
+        assert sample_user["id"] not in [p["user"]["id"] for p in response.json()["principals"]]
+
 # Relationship Tests
 @pytest.mark.integration
 class TestRelationships:
@@ -292,6 +429,17 @@ class TestRelationships:
         # Cleanup
         requests.delete(f"{BASE_URL}/relationships/{relationship['id']}")
     
+    def test_create_relationship_invalid_for_model(self, sample_user, sample_resource):
+        """Test that tuples the authorization model does not allow are rejected"""
+        for relation, object_ref in [
+            ("viewer_via_group", f"document:{sample_resource['id']}"),
+            ("viewer", f"invalid_type:{sample_resource['id']}"),
+            ("approver", f"document:{sample_resource['id']}")
+        ]:
+            relationship_data = {"user": f"user:{sample_user['id']}", "relation": relation, "object": object_ref}
+            response = requests.post(f"{BASE_URL}/relationships", json=relationship_data)
+            assert response.status_code == 400
+    
     def test_create_duplicate_relationship(self, sample_relationship):
         """Test creating a duplicate relationship"""
         duplicate_data = {
@@ -302,6 +450,68 @@ class TestRelationships:
         response = requests.post(f"{BASE_URL}/relationships", json=duplicate_data)
         assert response.status_code == 409
     
+    def test_update_relationship(self, sample_relationship):
+        """Test replacing a relationship's relation, after which the old ID no longer exists"""
+        response = requests.put(f"{BASE_URL}/relationships/{sample_relationship['id']}", json={"relation": "editor"})
+        assert response.status_code == 200
+        updated = response.json()
+        assert updated["relation"] == "editor"
+
+        # The old tuple is gone, so updating it again changes nothing
+        response = requests.put(f"{BASE_URL}/relationships/{sample_relationship['id']}", json={"relation": "owner"})
+        assert response.status_code == 404
+
+        requests.delete(f"{BASE_URL}/relationships/{updated['id']}")
+
+    def test_update_relationship_conflict(self, sample_relationship):
+        """Test that an update onto an existing relationship is rejected instead of merging the two"""
+        existing = requests.post(f"{BASE_URL}/relationships", json={
+            "user": sample_relationship["user"],
+            "relation": "editor",
+            "object": sample_relationship["object"]
+        }).json()
+
+        response = requests.put(f"{BASE_URL}/relationships/{sample_relationship['id']}", json={"relation": "editor"})
+        assert response.status_code == 409
+
+        # Both relationships are left as they were
+        response = requests.get(f"{BASE_URL}/relationships/{sample_relationship['id']}")
+        assert response.status_code == 200
+
+        # Once the old relationship is gone there is nothing to update, even though the target exists
+        requests.delete(f"{BASE_URL}/relationships/{sample_relationship['id']}")
+        response = requests.put(f"{BASE_URL}/relationships/{sample_relationship['id']}", json={"relation": "editor"})
+        assert response.status_code == 404
+
+        requests.delete(f"{BASE_URL}/relationships/{existing['id']}")
+
+    def test_delete_relationships_by_criteria(self):
+        """Test deleting a group's memberships by criteria, leaving other relationships alone"""
+        group = f"group:{uuid.uuid4()}"
+        members = [f"user:{uuid.uuid4()}" for _ in range(3)]
+        for member in members:
+            requests.post(f"{BASE_URL}/relationships", json={"user": member, "relation": "member", "object": group})
+        other = requests.post(f"{BASE_URL}/relationships", json={
+            "user": members[0], "relation": "member", "object": f"group:{uuid.uuid4()}"
+        }).json()
+
+        response = requests.delete(f"{BASE_URL}/relationships", params={"relation": "member", "object": group})
+        assert response.status_code == 200
+        assert response.json()["deleted"] == 3
+
+        response = requests.get(f"{BASE_URL}/relationships", params={"resource": group})
+        assert response.json() == []
+        response = requests.get(f"{BASE_URL}/relationships/{other['id']}")
+        assert response.status_code == 200
+
+        # Nothing is left to delete, and a relation alone is not a usable filter
+        response = requests.delete(f"{BASE_URL}/relationships", params={"relation": "member", "object": group})
+        assert response.json()["deleted"] == 0
+        response = requests.delete(f"{BASE_URL}/relationships", params={"relation": "member"})
+        assert response.status_code == 400
+
+        requests.delete(f"{BASE_URL}/relationships/{other['id']}")
+
     def test_check_relationship_allowed(self, sample_relationship):
         """Test checking a relationship that should be allowed"""
         check_data = {
@@ -330,6 +540,52 @@ class TestRelationships:
         assert result["allowed"] is False
         assert "checked_at" in result
     
+    def test_check_relationship_consistency(self, sample_relationship):
+        """Test checking a relationship with an explicit consistency mode"""
+        check_data = {
+            "user": sample_relationship["user"],
+            "relation": sample_relationship["relation"],
+            "object": sample_relationship["object"],
+            "consistency": "HIGHER_CONSISTENCY"
+        }
+        response = requests.post(f"{BASE_URL}/relationships/check", json=check_data)
+        assert response.status_code == 200
+        assert response.json()["allowed"] is True
+        
+        check_data["consistency"] = "EVENTUAL"
+        response = requests.post(f"{BASE_URL}/relationships/check", json=check_data)
+        assert response.status_code == 400
+    
+    def test_hedged_checks_are_counted(self, sample_relationship):
+        """Test that hedged checks answer as usual and keep the hedge counters consistent"""
+        def read_metrics():
+            lines = requests.get(f"{BASE_URL}/metrics").text.splitlines()
+            return {name: float(value) for name, value in (line.split(' ', 1) for line in lines if line.startswith('openfga_hedge'))}
+
+        before = read_metrics()
+        if before.get("openfga_hedge_enabled") != 1:
+            pytest.skip("Hedged checks are not enabled on the server")
+
+        check_data = {
+            "user": sample_relationship["user"],
+            "relation": sample_relationship["relation"],
+            "object": sample_relationship["object"]
+        }
+        for _ in range(20):
+            response = requests.post(f"{BASE_URL}/relationships/check", json=check_data)
+            assert response.json()["allowed"] is True
+
+        # Counters are only listed once they have been incremented
+        after = read_metrics()
+        delta = {name: after.get(name, 0) - before.get(name, 0) for name in [
+            "openfga_hedge_checks_total", "openfga_hedges_sent_total",
+            "openfga_hedge_budget_exhausted_total", "openfga_hedge_wins_total"
+        ]}
+        assert delta["openfga_hedge_checks_total"] == 20
+        # A check is hedged at most once, and only a hedge that was sent can win
+        assert delta["openfga_hedges_sent_total"] + delta["openfga_hedge_budget_exhausted_total"] <= 20
+        assert delta["openfga_hedge_wins_total"] <= delta["openfga_hedges_sent_total"]
+
     def test_get_relationships_with_filters(self, sample_relationship):
         """Test getting relationships with query filters"""
         # Filter by user
@@ -344,6 +600,20 @@ class TestRelationships:
         relationships = response.json()
         assert len(relationships) >= 1
 
+    def test_get_relationship_matrix(self, sample_relationship):
+        """Test getting the permission matrix for a slice of subjects and objects"""
+        params = {
+            "subjects": sample_relationship["user"],
+            "objects": sample_relationship["object"]
+        }
+        response = requests.get(f"{BASE_URL}/relationships/matrix", params=params)
+        assert response.status_code == 200
+
+        matrix = response.json()
+        assert [s["ref"] for s in matrix["subjects"]] == [sample_relationship["user"]]
+        assert [o["ref"] for o in matrix["objects"]] == [sample_relationship["object"]]
+        assert matrix["cells"] == [[0, 0, ["viewer"], ["viewer"]]]
+
 # User Group Tests
 @pytest.mark.integration
 class TestUserGroups:
@@ -376,6 +646,74 @@ class TestUserGroups:
         
         # Cleanup
         requests.delete(f"{BASE_URL}/user-groups/{group['id']}")
+    
+    def test_user_groups_cache_invalidated_by_user_write(self, sample_user):
+        """Test that the cached group list is refreshed when a member user changes"""
+        group = requests.post(f"{BASE_URL}/user-groups", json={
+            "name": f"Cached Group {uuid.uuid4().hex[:8]}", "user_ids": [sample_user["id"]]
+        }).json()
+
+        # The second request is answered from the response cache with the same body
+        first = requests.get(f"{BASE_URL}/user-groups")
+        second = requests.get(f"{BASE_URL}/user-groups")
+        assert second.content == first.content
+
+        # Groups embed their users, so a user write must invalidate the cached list
+        requests.put(f"{BASE_URL}/users/{sample_user['id']}", json={"name": "Renamed Member"})
+        response = requests.get(f"{BASE_URL}/user-groups")
+        assert response.headers["ETag"] != first.headers["ETag"]
+        cached_group = next(g for g in response.json() if g["id"] == group["id"])
+        assert cached_group["users"][0]["name"] == "Renamed Member"
+
+        requests.delete(f"{BASE_URL}/user-groups/{group['id']}")
+    
+    def test_reconcile_user_group(self, sample_user):
+        """Test reconciling a group's memberships with OpenFGA"""
+        group_data = {
+            "name": "Reconcile Group",
+            "description": "A group to reconcile",
+            "user_ids": [sample_user["id"]]
+        }
+        group = requests.post(f"{BASE_URL}/user-groups", json=group_data).json()
+        
+        # Repair first so the queued membership has reached OpenFGA
+        response = requests.post(f"{BASE_URL}/user-groups/{group['id']}/reconcile")
+        assert response.status_code == 200
+        
+        response = requests.post(f"{BASE_URL}/user-groups/{group['id']}/reconcile", params={"dry_run": "true"})
+        assert response.status_code == 200
+        
+        report = response.json()
+        assert report["dry_run"] is True
+        assert report["groups_checked"] == 1
+        assert report["missing_count"] == 0
+        assert report["extra_count"] == 0
+        
+        # Cleanup
+        requests.delete(f"{BASE_URL}/user-groups/{group['id']}")
+    
+    def test_reconcile_all_user_groups(self, sample_user):
+        """Test reconciling every group, including the pass over member tuples of deleted groups"""
+        group_data = {
+            "name": "Reconcile All Group",
+            "description": "A group to reconcile with the others",
+            "user_ids": [sample_user["id"]]
+        }
+        group = requests.post(f"{BASE_URL}/user-groups", json=group_data).json()
+        
+        response = requests.post(f"{BASE_URL}/user-groups/reconcile")
+        assert response.status_code == 200
+        
+        response = requests.post(f"{BASE_URL}/user-groups/reconcile", params={"dry_run": "true"})
+        assert response.status_code == 200
+        
+        report = response.json()
+        assert report["groups_checked"] >= 1
+        assert report["missing_count"] == 0
+        assert report["extra_count"] == 0
+        
+        # Cleanup
+        requests.delete(f"{BASE_URL}/user-groups/{group['id']}")
 
 # Resource Group Tests  
 @pytest.mark.integration
@@ -410,5 +748,153 @@ class TestResourceGroups:
         # Cleanup
         requests.delete(f"{BASE_URL}/resource-groups/{group['id']}")
 
+    def test_move_resources(self, sample_resource):
+        """Test moving resources between groups in bulk"""
+        response = requests.post(f"{BASE_URL}/resource-groups", json={"name": "Move Target", "resource_ids": []})
+        group = response.json()
+
+        response = requests.post(f"{BASE_URL}/resource-groups/{group['id']}/resources/move",
+                                 json={"resource_ids": [sample_resource["id"], "missing-id"]})
+        assert response.status_code == 200
+        summary = response.json()
+        assert (summary["moved"], summary["not_found"], summary["unchanged"]) == (1, 1, 0)
+
+        # Move everything back, leaving the target group empty
+        response = requests.post(f"{BASE_URL}/resource-groups/{sample_resource['resource_group_id']}/resources/move",
+                                 json={"from_group_id": group["id"]})
+        assert response.json()["moved"] == 1
+
+        requests.delete(f"{BASE_URL}/resource-groups/{group['id']}")
+
+# Stats Tests
+@pytest.mark.integration
+class TestStats:
+    """Test stats endpoint"""
+
+    def test_get_stats(self):
+        """Test getting the dashboard summary"""
+        response = requests.get(f"{BASE_URL}/stats?recent=3")
+        assert response.status_code == 200
+
+        stats = response.json()
+        for key in ["users", "resources", "resource_groups", "user_groups", "relationships"]:
+            assert isinstance(stats["counts"][key], int)
+        assert sum(stats["resources_by_type"].values()) == stats["counts"]["resources"]
+        assert len(stats["recent"]["users"]) <= 3
+
+# Search Tests
+@pytest.mark.integration
+class TestSearch:
+    """Test full-text search endpoint"""
+
+    def test_search_by_name_prefix(self, sample_resource):
+        """Test finding a resource by a prefix of its name"""
+        response = requests.get(f"{BASE_URL}/search?q=test%20docu&kind=resources&count=true")
+        assert response.status_code == 200
+
+        results = response.json()
+        assert results["total"] >= 1
+        assert sample_resource["id"] in [hit["item"]["id"] for hit in results["hits"]]
+        assert all(hit["kind"] == "resources" for hit in results["hits"])
+        assert results["has_more"] == (results["total"] > len(results["hits"]))
+
+        # Without count the total is not computed, but has_more still tells whether to page on
+        response = requests.get(f"{BASE_URL}/search?q=test%20docu&kind=resources&limit=1")
+        results = response.json()
+        assert "total" not in results
+        assert len(results["hits"]) == 1
+
+    def test_search_requires_query(self):
+        """Test search without a query"""
+        response = requests.get(f"{BASE_URL}/search")
+        assert response.status_code == 400
+
+# Compression Tests
+@pytest.mark.integration
+class TestCompression:
+    """Test negotiated compression of large responses"""
+
+    @pytest.fixture
+    def many_users(self):
+        """Create enough users for GET /users to pass the compression threshold"""
+        users = [{"name": f"Compressed User {i}", "email": f"compressed.{uuid.uuid4().hex}@example.com"}
+                 for i in range(30)]
+        created = requests.post(f"{BASE_URL}/users/bulk", json={"users": users}).json()["users"]
+        yield created
+        for user in created:
+            requests.delete(f"{BASE_URL}/users/{user['id']}")
+
+    def test_large_list_is_gzipped(self, many_users):
+        """Test that a large list is gzipped for clients that accept it, with the compressed bytes cached"""
+        response = requests.get(f"{BASE_URL}/users", headers={"Accept-Encoding": "gzip"}, stream=True)
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        first = response.raw.read(decode_content=False)
+
+        # gzip stamps each compression with the time in seconds, so equal bytes a second later were cached
+        time.sleep(1.1)
+        response = requests.get(f"{BASE_URL}/users", headers={"Accept-Encoding": "gzip"}, stream=True)
+        assert response.raw.read(decode_content=False) == first
+
+        response = requests.get(f"{BASE_URL}/users", headers={"Accept-Encoding": "identity"})
+        assert "Content-Encoding" not in response.headers
+        assert len(response.json()) >= len(many_users)
+
+    def test_small_response_is_not_compressed(self, sample_user):
+        """Test that a response below the size threshold is sent as it is"""
+        response = requests.get(f"{BASE_URL}/users/{sample_user['id']}", headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert "Content-Encoding" not in response.headers
+        assert response.json()["id"] == sample_user["id"]
+
+# Effective Permissions Tests
+@pytest.mark.integration
+class TestEffectivePermissions:
+    """Test the materialized effective permissions, when the server has them enabled"""
+
+    @staticmethod
+    def accessible_ids(user_id, relation):
+        """IDs of the resources a user has a relation to, as listed from the materialized table"""
+        response = requests.get(f"{BASE_URL}/resources", params={"subject": f"user:{user_id}", "relation": relation})
+        assert response.status_code == 200
+        return {resource["id"] for resource in response.json()["resources"]}
+
+    def test_group_grant_is_maintained_and_rebuilt(self, sample_user, sample_resource):
+        """Test that a grant to a group reaches its members, is removed on revoke and survives a rebuild"""
+        response = requests.post(f"{BASE_URL}/effective-permissions/rebuild")
+        if response.status_code == 409:
+            pytest.skip("Effective permissions are not enabled on the server")
+        assert response.status_code == 200
+
+        group = requests.post(f"{BASE_URL}/user-groups", json={
+            "name": f"Effective {uuid.uuid4().hex[:8]}", "user_ids": [sample_user["id"]]
+        }).json()
+        grant = requests.post(f"{BASE_URL}/relationships", json={
+            "user": f"group:{group['id']}", "relation": "editor", "object": f"document:{sample_resource['id']}"
+        }).json()
+
+        # The membership reaches OpenFGA through the outbox, so wait for it to be applied
+        deadline = time.time() + 5
+        while sample_resource["id"] not in self.accessible_ids(sample_user["id"], "viewer") and time.time() < deadline:
+            time.sleep(0.1)
+
+        # editor implies viewer but not owner
+        relations = ["viewer", "editor", "owner"]
+        maintained = {relation: self.accessible_ids(sample_user["id"], relation) for relation in relations}
+        assert sample_resource["id"] in maintained["viewer"]
+        assert sample_resource["id"] in maintained["editor"]
+        assert sample_resource["id"] not in maintained["owner"]
+
+        # A rebuild from OpenFGA derives the same permissions as the incremental maintenance
+        response = requests.post(f"{BASE_URL}/effective-permissions/rebuild")
+        assert response.status_code == 200
+        assert {relation: self.accessible_ids(sample_user["id"], relation) for relation in relations} == maintained
+
+        requests.delete(f"{BASE_URL}/relationships/{grant['id']}")
+        assert sample_resource["id"] not in self.accessible_ids(sample_user["id"], "viewer")
+
+        requests.delete(f"{BASE_URL}/user-groups/{group['id']}")
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
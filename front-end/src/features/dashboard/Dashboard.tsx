@@ -1,11 +1,5 @@
 import { useState, useEffect } from 'react'
-import { 
-  userService, 
-  resourceService, 
-  relationshipService, 
-  userGroupService, 
-  resourceGroupService 
-} from '../../services'
+import { statsService } from '../../services'
 
 interface DashboardStats {
   users: number
@@ -31,20 +25,14 @@ export function Dashboard() {
 
   const loadStats = async () => {
     try {
-      const [users, resources, relationships, userGroups, resourceGroups] = await Promise.all([
-        userService.getUsers(),
-        resourceService.getResources(),
-        relationshipService.getRelationships(),
-        userGroupService.getUserGroups(),
-        resourceGroupService.getResourceGroups()
-      ])
+      const { counts } = await statsService.getStats()
 
       setStats({
-        users: users.length,
-        resources: resources.length,
-        relationships: relationships.length,
-        userGroups: userGroups.length,
-        resourceGroups: resourceGroups.length
+        users: counts.users,
+        resources: counts.resources,
+        relationships: counts.relationships,
+        userGroups: counts.user_groups,
+        resourceGroups: counts.resource_groups
       })
     } catch (error) {
       console.error('Failed to load stats:', error)
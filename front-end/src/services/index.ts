@@ -5,4 +5,5 @@ export { resourceService } from './resourceService'
 export { relationshipService } from './relationshipService'
 export { userGroupService } from './userGroupService'
 export { resourceGroupService } from './resourceGroupService'
+export { statsService } from './statsService'
 export { apiClient, API_BASE_URL } from './api'
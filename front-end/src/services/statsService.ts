@@ -0,0 +1,9 @@
+import { apiClient } from './api'
+import type { StatsSummary } from '../types/api'
+
+export const statsService = {
+  async getStats(): Promise<StatsSummary> {
+    const response = await apiClient.get<StatsSummary>('/stats')
+    return response.data
+  }
+}
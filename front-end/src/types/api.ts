@@ -116,6 +116,26 @@ export interface HealthCheckResponse {
   timestamp: string
 }
 
+export interface StatsSummary {
+  counts: {
+    users: number
+    resources: number
+    resource_groups: number
+    user_groups: number
+    user_group_members: number
+    relationships: number
+  }
+  resources_by_type: Record<string, number>
+  relationships_by_relation: Record<string, number>
+  recent: {
+    users: User[]
+    resources: Pick<Resource, 'id' | 'type' | 'name' | 'resource_group_id' | 'created_at'>[]
+    user_groups: Pick<UserGroup, 'id' | 'name' | 'description' | 'created_at'>[]
+    resource_groups: Pick<ResourceGroup, 'id' | 'name' | 'description' | 'created_at'>[]
+  }
+  generated_at: string
+}
+
 export interface ApiError {
   error: string
 }